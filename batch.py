@@ -0,0 +1,218 @@
+"""Traitement par lot des demandes de prêt.
+
+Les documents d'un répertoire (ou d'archives zip) passent par la chaîne
+extraction → solvabilité → évaluation → décision avec une concurrence bornée.
+Chaque résultat est écrit en JSON Lines et le point de reprise permet de
+relancer un lot interrompu sans retraiter les documents déjà terminés.
+Les entrées d'archive sont décompressées par blocs, avec une taille maximale
+par document et par archive (une archive piégée ne peut pas remplir la mémoire).
+
+Usage :
+    python batch.py <répertoire|archive.zip> -o resultats.jsonl [-c 4] [--retry-errors]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import ingestion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 32
+SUPPORTED_EXTENSIONS = ('.txt', '.docx', '.doc', '.pdf')
+# Taille maximale d'un document (même limite qu'un dépôt unitaire) et du contenu décompressé d'une archive
+MAX_DOCUMENT_BYTES = int(os.getenv('MAX_UPLOAD_MB', '10')) * 1024 * 1024
+MAX_ARCHIVE_BYTES = int(os.getenv('MAX_BATCH_UNZIPPED_MB', '500')) * 1024 * 1024
+
+
+def iter_documents(source, max_bytes=MAX_DOCUMENT_BYTES, max_archive_bytes=MAX_ARCHIVE_BYTES):
+    """Génère (nom, contenu) pour chaque document d'un répertoire ou d'une archive zip, sans tout charger.
+
+    Un document refusé (trop volumineux) est généré avec, au lieu de son contenu, l'exception UploadTooLarge.
+    """
+    if zipfile.is_zipfile(source):
+        yield from _iter_zip(source, max_bytes, max_archive_bytes)
+        return
+    for racine, _, fichiers in os.walk(source):
+        for nom in sorted(fichiers):
+            chemin = os.path.join(racine, nom)
+            if nom.lower().endswith('.zip'):
+                yield from _iter_zip(chemin, max_bytes, max_archive_bytes)
+            elif nom.lower().endswith(SUPPORTED_EXTENSIONS):
+                if os.path.getsize(chemin) > max_bytes:
+                    yield os.path.relpath(chemin, source), _trop_volumineux(max_bytes)
+                    continue
+                with open(chemin, 'rb') as f:
+                    yield os.path.relpath(chemin, source), f.read()
+
+
+def _trop_volumineux(max_bytes):
+    return ingestion.UploadTooLarge(f"Le fichier dépasse la taille maximale de {max_bytes // (1024 * 1024)} Mo")
+
+
+def _iter_zip(chemin, max_bytes, max_archive_bytes):
+    restant = max_archive_bytes
+    with zipfile.ZipFile(chemin) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                continue
+            nom = f"{os.path.basename(chemin)}:{info.filename}"
+            # Taille annoncée vérifiée d'abord, taille réelle contrôlée pendant la décompression
+            if info.file_size > max_bytes:
+                yield nom, _trop_volumineux(max_bytes)
+                continue
+            if info.file_size > restant:
+                logger.warning(f"Archive {chemin} : contenu décompressé supérieur à "
+                               f"{max_archive_bytes // (1024 * 1024)} Mo, documents suivants ignorés")
+                yield nom, ingestion.UploadTooLarge(
+                    f"L'archive dépasse la taille décompressée maximale de {max_archive_bytes // (1024 * 1024)} Mo")
+                return
+            fd, temporaire = tempfile.mkstemp(suffix=os.path.splitext(info.filename)[1])
+            os.close(fd)
+            try:
+                with archive.open(info) as flux:
+                    taille, _ = ingestion.copy_bounded(flux, temporaire, min(max_bytes, restant))
+                with open(temporaire, 'rb') as f:
+                    contenu = f.read()
+            except ingestion.UploadTooLarge as e:
+                yield nom, e
+                continue
+            finally:
+                if os.path.exists(temporaire):
+                    os.remove(temporaire)
+            restant -= taille
+            yield nom, contenu
+
+
+def load_checkpoint(checkpoint_path, retry_errors=False):
+    """Empreintes des documents déjà traités ; avec `retry_errors`, les documents en erreur sont rejoués."""
+    traites = set()
+    if not os.path.exists(checkpoint_path):
+        return traites
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        for ligne in f:
+            try:
+                entree = json.loads(ligne)
+            except ValueError:
+                continue  # dernière ligne tronquée par un arrêt brutal
+            if retry_errors and entree.get('status') == 'error':
+                traites.discard(entree['digest'])
+            else:
+                traites.add(entree['digest'])
+    return traites
+
+
+def _traiter(process, nom, digest, contenu):
+    debut = time.perf_counter()
+    record = {'document': nom, 'digest': digest}
+    suffixe = os.path.splitext(nom)[1]
+    fd, chemin = tempfile.mkstemp(suffix=suffixe)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contenu)
+        resultat = process(chemin)
+        record.update({
+            'status': 'ok',
+            'customerId': resultat['client_infos'].get('customerId'),
+            'solvabilite': resultat['solvabilite'],
+            'evaluation_propriete': resultat['evaluation_propriete'],
+            'decision': resultat['decision'],
+        })
+    except Exception as e:
+        logger.error(f"Échec du traitement de {nom}: {e}")
+        record.update({'status': 'error', 'error': str(e)})
+    finally:
+        os.remove(chemin)
+    record['duration_ms'] = round((time.perf_counter() - debut) * 1000, 1)
+    return record
+
+
+def run_batch(documents, process, output_path, checkpoint_path=None, concurrency=DEFAULT_CONCURRENCY,
+              retry_errors=False):
+    """Traite les documents avec au plus `concurrency` traitements en vol et génère chaque résultat.
+
+    Le résultat est écrit dans `output_path` avant d'être inscrit au point de reprise : après un arrêt
+    brutal, un document peut apparaître deux fois dans la sortie mais n'est jamais perdu. Un document
+    identique à un autre du même lot n'est pas retraité : sa ligne (`status` 'duplicate') désigne le
+    premier document dans `duplicate_of`. Un document refusé a une ligne d'erreur sans empreinte.
+    """
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    traites = load_checkpoint(checkpoint_path, retry_errors)
+    if traites:
+        logger.info(f"Reprise du lot : {len(traites)} documents déjà traités")
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as pool, \
+            open(output_path, 'a', encoding='utf-8') as sortie, \
+            open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+
+        def ecrire(record):
+            sortie.write(json.dumps(record, ensure_ascii=False) + '\n')
+            sortie.flush()
+            return record
+
+        def enregistrer(future):
+            record = ecrire(future.result())
+            checkpoint.write(json.dumps({'digest': record['digest'], 'status': record['status']}) + '\n')
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            return record
+
+        en_vol = set()
+        premiers = {}  # empreinte -> premier document du lot
+        for nom, contenu in documents:
+            if isinstance(contenu, Exception):
+                yield ecrire({'document': nom, 'digest': None, 'status': 'error', 'error': str(contenu)})
+                continue
+            digest = hashlib.sha256(contenu).hexdigest()
+            if digest in premiers:
+                yield ecrire({'document': nom, 'digest': digest, 'status': 'duplicate',
+                              'duplicate_of': premiers[digest]})
+                continue
+            if digest in traites:
+                continue
+            traites.add(digest)
+            premiers[digest] = nom
+            if len(en_vol) >= concurrency:
+                terminees, en_vol = wait(en_vol, return_when=FIRST_COMPLETED)
+                for future in terminees:
+                    yield enregistrer(future)
+            en_vol.add(pool.submit(_traiter, process, nom, digest, contenu))
+
+        while en_vol:
+            terminees, en_vol = wait(en_vol, return_when=FIRST_COMPLETED)
+            for future in terminees:
+                yield enregistrer(future)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Traitement par lot des demandes de prêt")
+    parser.add_argument('source', help="Répertoire ou archive zip contenant les lettres")
+    parser.add_argument('-o', '--output', default='resultats.jsonl', help="Fichier de résultats JSON Lines")
+    parser.add_argument('--checkpoint', help="Fichier de reprise (par défaut <output>.checkpoint)")
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--retry-errors', action='store_true', help="Rejoue les documents précédemment en erreur")
+    args = parser.parse_args(argv)
+
+    import composite
+
+    compteurs = {'ok': 0, 'error': 0, 'duplicate': 0}
+    debut = time.perf_counter()
+    for record in run_batch(iter_documents(args.source), composite.process_document, args.output,
+                            checkpoint_path=args.checkpoint, concurrency=min(args.concurrency, MAX_CONCURRENCY),
+                            retry_errors=args.retry_errors):
+        compteurs[record['status']] += 1
+    print(f"{compteurs['ok']} documents traités, {compteurs['error']} en erreur, {compteurs['duplicate']} en double "
+          f"en {time.perf_counter() - debut:.1f} s -> {args.output}")
+    return 0 if compteurs['error'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""Journal d'audit des décisions : débit d'écriture sous dépôts concurrents et coût des recherches.
+
+Chaque thread simule un worker qui enregistre des décisions (même forme que celles du composite,
+lettre de décision comprise) ; on mesure le temps passé dans `append()` côté requête, le débit
+jusqu'à l'écriture complète et le taux de compression. Le chemin synchrone (une ligne JSON et un
+fsync par décision, sous verrou) sert de référence.
+
+Les recherches (historique d'un client, plage d'une journée, lecture complète) sont mesurées sur un
+journal écrit dans l'ordre, les décisions étant réparties sur `--jours` jours : avec des instants fictifs,
+l'ordre d'écriture des threads mélangerait des jours que l'horloge réelle aurait séparés.
+
+Usage :
+    python benchmarks/bench_audit_log.py [--decisions 20000] [--threads 1 4 16] [--clients 2000] [--no-fsync]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import itertools
+import threading
+import statistics
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RACINE, 'services'))
+
+from utils.audit_log import AuditLog  # noqa: E402
+
+DEBUT = 1_780_000_000.0
+LETTRE = ("Cher Monsieur {nom},\n\nVotre demande de prêt immobilier a été APPROUVÉE.\n\nPoints clés :\n"
+          "• Valeur du bien adéquate\n• Absence de litiges\n• Score de crédit satisfaisant\n"
+          "• Capacité financière suffisante\n\nCordialement,\nL'équipe des prêts immobiliers")
+
+
+def decision(rng, clients, instant):
+    client = f"client-{rng.randrange(clients):05d}"
+    prix = rng.randrange(100, 900) * 1000
+    return {
+        'ts': instant, 'customer_id': client, 'source': 'composite', 'request_id': f'{rng.getrandbits(64):016x}',
+        'format_document': rng.choice(('pdf', 'docx', 'txt')), 'name': f'Client {client}', 'approved': True,
+        'inputs': {
+            'client_infos': {'customerId': client, 'name': f'Client {client}', 'propertyPrice': prix,
+                             'loanAmount': prix * 0.8, 'monthlyIncome': rng.randrange(2000, 9000),
+                             'description': {'surfaceArea': f'{rng.randrange(20, 300)}m2',
+                                             'address': {'town': 'Paris', 'completeAddress': '1 rue de Rivoli'}}},
+            'solvabilite': {'score': rng.randrange(0, 100), 'financial_cap': rng.randrange(-500, 3000)},
+            'evaluation_propriete': {'valeur': prix * rng.uniform(0.8, 1.2), 'litiges': False},
+        },
+        'decision': LETTRE.format(nom=client),
+    }
+
+
+def lot_de_decisions(n, clients, jours, seed):
+    rng = random.Random(seed)
+    pas = jours * 86400 / n
+    return [decision(rng, clients, DEBUT + i * pas) for i in range(n)]
+
+
+def ecrire(decisions, threads, append):
+    """Répartit les décisions entre `threads` threads ; retourne les durées de `append` en µs."""
+    suivant = itertools.count()  # next() est atomique : les décisions restent à peu près dans l'ordre
+    durees = [[] for _ in range(threads)]
+
+    def worker(mesures):
+        while True:
+            i = next(suivant)
+            if i >= len(decisions):
+                return
+            debut = time.perf_counter()
+            append(decisions[i])
+            mesures.append((time.perf_counter() - debut) * 1e6)
+
+    fils = [threading.Thread(target=worker, args=(mesures,)) for mesures in durees]
+    for f in fils:
+        f.start()
+    for f in fils:
+        f.join()
+    return sorted(d for mesures in durees for d in mesures)
+
+
+def synchrone(repertoire, fsync):
+    """Référence : une ligne JSON par décision, écrite et synchronisée dans la requête."""
+    fichier = open(os.path.join(repertoire, 'decisions.jsonl'), 'ab')
+    verrou = threading.Lock()
+
+    def append(record):
+        ligne = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with verrou:
+            fichier.write(ligne)
+            fichier.flush()
+            if fsync:
+                os.fsync(fichier.fileno())
+    return append, fichier
+
+
+def percentile(valeurs, p):
+    return valeurs[min(len(valeurs) - 1, int(len(valeurs) * p))]
+
+
+def chronometre(fonction, n):
+    durees = []
+    for _ in range(n):
+        debut = time.perf_counter()
+        resultat = fonction()
+        durees.append((time.perf_counter() - debut) * 1000)
+    return statistics.median(durees), resultat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--decisions', type=int, default=20000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16], help="Dépôts concurrents")
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--jours', type=int, default=30, help="Période couverte par les décisions")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--no-fsync', dest='fsync', action='store_false')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    decisions = lot_de_decisions(args.decisions, args.clients, args.jours, args.seed)
+    print(f"{args.decisions} décisions, {args.clients} clients sur {args.jours} jours, "
+          f"fsync {'oui' if args.fsync else 'non'}\n")
+    print(f"{'chemin':>12}{'threads':>9}{'append p50 (µs)':>17}{'p99 (µs)':>11}{'débit (déc./s)':>16}"
+          f"{'octets/déc.':>13}{'compression':>13}")
+
+    for threads in args.threads:
+        repertoire = tempfile.mkdtemp(prefix='bench-audit-')
+        append, fichier = synchrone(repertoire, args.fsync)
+        debut = time.perf_counter()
+        durees = ecrire(decisions, threads, append)
+        duree = time.perf_counter() - debut
+        fichier.close()
+        taille = os.path.getsize(fichier.name)
+        print(f"{'synchrone':>12}{threads:>9}{percentile(durees, 0.5):>17.1f}{percentile(durees, 0.99):>11.1f}"
+              f"{len(decisions) / duree:>16.0f}{taille / len(decisions):>13.0f}{'-':>13}")
+        shutil.rmtree(repertoire, ignore_errors=True)
+
+        repertoire = tempfile.mkdtemp(prefix='bench-audit-')
+        journal = AuditLog(repertoire, batch_size=args.batch_size, fsync=args.fsync,
+                           max_queue=len(decisions))
+        debut = time.perf_counter()
+        durees = ecrire(decisions, threads, journal.append)
+        journal.flush()
+        duree = time.perf_counter() - debut
+        stats = journal.stats()
+        print(f"{'journal':>12}{threads:>9}{percentile(durees, 0.5):>17.1f}{percentile(durees, 0.99):>11.1f}"
+              f"{len(decisions) / duree:>16.0f}{stats['stored_bytes'] / len(decisions):>13.0f}"
+              f"{stats['compression_ratio']:>12.1f}x")
+        journal.close()
+        shutil.rmtree(repertoire, ignore_errors=True)
+
+    repertoire = tempfile.mkdtemp(prefix='bench-audit-')
+    journal = AuditLog(repertoire, batch_size=args.batch_size, fsync=False, max_queue=len(decisions))
+    try:
+        for d in decisions:
+            journal.append(d)
+        journal.flush()
+        rng = random.Random(args.seed)
+        client = f"client-{rng.randrange(args.clients):05d}"
+        milieu = DEBUT + args.jours * 86400 / 2
+        print("\nRecherches (médiane de 20)")
+        complet, tout = chronometre(lambda: sum(1 for _ in journal.scan()), 20)
+        historique, lignes = chronometre(lambda: journal.history(client), 20)
+        attendu = sum(1 for d in decisions if d['customer_id'] == client)
+        assert len(lignes) == attendu, (len(lignes), attendu)
+        journee, n_journee = chronometre(lambda: sum(1 for _ in journal.scan(milieu, milieu + 86400)), 20)
+        print(f"{'lecture complète':>28}{complet:>10.2f} ms  {tout} décisions")
+        print(f"{'historique client':>28}{historique:>10.2f} ms  {len(lignes)} décisions")
+        print(f"{'plage 1 jour':>28}{journee:>10.2f} ms  {n_journee} décisions")
+    finally:
+        journal.close()
+        shutil.rmtree(repertoire, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
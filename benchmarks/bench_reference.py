@@ -0,0 +1,99 @@
+"""Index du registre des litiges : construction, mémoire et latence de recherche sur un registre synthétique.
+
+Mesure cinq cas : adresse présente à l'identique (graphie différente), adresse avec une faute
+de frappe, adresse sans sa ville (attendue trouvée), même voie dans une autre ville et adresse
+absente du registre (attendues absentes).
+
+Usage :
+    python benchmarks/bench_reference.py [-n 1000000] [--requetes 20000] [--seed 7]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RACINE, 'services'))
+
+from utils.reference_index import IndexAdresses  # noqa: E402
+
+VOIES = ['rue', 'avenue', 'boulevard', 'place', 'impasse', 'chemin', 'allée', 'quai']
+SYLLABES = ['ba', 'ber', 'cha', 'del', 'du', 'fon', 'gar', 'lan', 'mar', 'mon', 'ne', 'pi', 'ro', 'sal',
+            'tai', 'ven', 'vil', 'lie', 'bru', 'cour', 'gre', 'jo', 'leu', 'neuve', 'sau', 'tre']
+ARTICLES = ['de la', 'du', 'des', 'de', '']
+
+
+def _nom(rng, syllabes):
+    return ''.join(rng.choice(SYLLABES) for _ in range(syllabes)).capitalize()
+
+
+def registre(n, seed):
+    rng = random.Random(seed)
+    villes = [_nom(rng, rng.randint(2, 3)) for _ in range(2000)]
+    rues = [f"{rng.choice(VOIES)} {rng.choice(ARTICLES)} {_nom(rng, rng.randint(2, 4))}".replace('  ', ' ')
+            for _ in range(20000)]
+    for _ in range(n):
+        yield f"{rng.randint(1, 300)} {rng.choice(rues)}, {rng.randint(10000, 95999)} {rng.choice(villes)}"
+
+
+def faute(rng, adresse):
+    """Inverse deux lettres voisines dans le nom de la voie."""
+    debut = adresse.index(' ', adresse.index(' ') + 1) + 1
+    i = rng.randrange(debut, adresse.index(',') - 1)
+    if not (adresse[i].isalpha() and adresse[i + 1].isalpha()):
+        return adresse
+    return adresse[:i] + adresse[i + 1] + adresse[i] + adresse[i + 2:]
+
+
+def percentiles(durees):
+    durees = sorted(durees)
+    return {p: durees[min(len(durees) - 1, int(len(durees) * p / 100))] * 1e6 for p in (50, 99)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', type=int, default=1000000)
+    parser.add_argument('--requetes', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--memoire', action='store_true',
+                        help="Mesure la mémoire retenue avec tracemalloc (construction nettement plus lente)")
+    args = parser.parse_args(argv)
+
+    adresses = list(registre(args.n, args.seed))
+    if args.memoire:
+        tracemalloc.start()
+    debut = time.perf_counter()
+    index = IndexAdresses(adresses)
+    duree = time.perf_counter() - debut
+    print(f"{len(index)} adresses indexées en {duree:.1f} s")
+    if args.memoire:
+        memoire, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"mémoire retenue : {memoire / 2**20:.0f} Mio ({memoire / len(index):.0f} octets/adresse)")
+    print(f"tableaux indexés : {index.taille_memoire() / 2**20:.0f} Mio")
+
+    rng = random.Random(args.seed + 1)
+    echantillon = rng.sample(adresses, args.requetes)
+    cas = {
+        'présente': [a.upper().replace(',', '') for a in echantillon],
+        'faute de frappe': [faute(rng, a) for a in echantillon],
+        'sans ville': [a.split(',')[0] for a in echantillon],
+        'autre ville': [a.split(',')[0] + ',' + autre.split(',')[1].split(' ', 2)[2]
+                        for a, autre in zip(echantillon, echantillon[1:] + echantillon[:1])],
+        'absente': [a.replace(a.split(' ')[0], str(400 + i % 100), 1) for i, a in enumerate(echantillon)],
+    }
+    for nom, requetes in cas.items():
+        durees, trouvees = [], 0
+        for requete in requetes:
+            debut = time.perf_counter()
+            trouvees += index.contient(requete)
+            durees.append(time.perf_counter() - debut)
+        p = percentiles(durees)
+        print(f"{nom:16}: p50 {p[50]:7.1f} µs  p99 {p[99]:7.1f} µs  trouvées {trouvees / len(requetes):6.1%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
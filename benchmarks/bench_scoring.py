@@ -0,0 +1,86 @@
+"""Moteur de scoring vectorisé contre la boucle scalaire de ApprovalDecisionService.
+
+Vérifie que les deux chemins donnent des résultats identiques puis compare leur débit.
+
+Usage :
+    python benchmarks/bench_scoring.py [-n 1000000] [--seed 42]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RACINE, 'services'))
+
+from utils import risk_engine  # noqa: E402
+from aprobation_service import (CreditPolicies, RiskAnalyzer, LoanDecisionMaker,  # noqa: E402
+                                PRODUCTION_POLICY)
+
+
+def portefeuille(n, seed):
+    rng = np.random.default_rng(seed)
+    loan = rng.uniform(20000, 800000, n).round(-2)
+    return {
+        'credit_score': rng.integers(300, 851, n).astype(np.float64),
+        'debt_to_income_ratio': rng.uniform(0.05, 0.7, n).round(3),
+        'property_value': (loan * rng.uniform(0.8, 2.0, n)).round(-2),
+        'loan_amount': loan,
+    }
+
+
+def scalaire(cs, dti, pv, loan):
+    """Même enchaînement que ApprovalDecisionService.make_decision, sans la couche SOAP."""
+    meets_policies = CreditPolicies.meets_basic_requirements(cs, dti, pv, loan)
+    risk_score = RiskAnalyzer.calculate_risk_score(cs, dti, pv, loan)
+    default_probability = RiskAnalyzer.predict_default_probability(cs, dti)
+    approved, reason = LoanDecisionMaker.decide_approval(risk_score, meets_policies, default_probability)
+    terms = LoanDecisionMaker.determine_loan_terms(approved, loan, cs) if approved else None
+    return {"client_name": None, "approved": approved, "reason": reason, "risk_score": risk_score,
+            "default_probability": default_probability, "loan_terms": terms}
+
+
+def cas_limites():
+    """Valeurs de bien nulles ou négatives : refus pour risque trop élevé avec un risque de 100, jamais NaN."""
+    cas = [(800, 0.1, 0, 0), (800, 0.1, 0, 100000), (800, 0.1, -1000, 100000)]
+    result = risk_engine.score_batch(*(np.array(c, dtype=np.float64) for c in zip(*cas)), PRODUCTION_POLICY)
+    erreurs = [cas[i] for i, d in enumerate(risk_engine.iter_decisions(result))
+               if d['approved'] or d['risk_score'] != 100]
+    for c in erreurs:
+        print(f"cas limite incorrect : {c}")
+    return len(erreurs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    colonnes = portefeuille(args.n, args.seed)
+    lignes = list(zip(*(colonnes[c].tolist() for c in
+                        ('credit_score', 'debt_to_income_ratio', 'property_value', 'loan_amount'))))
+
+    debut = time.perf_counter()
+    attendu = [scalaire(*ligne) for ligne in lignes]
+    duree_boucle = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    result = risk_engine.score_batch(colonnes['credit_score'], colonnes['debt_to_income_ratio'],
+                                     colonnes['property_value'], colonnes['loan_amount'], PRODUCTION_POLICY)
+    duree_vecteur = time.perf_counter() - debut
+    obtenu = list(risk_engine.iter_decisions(result))
+    duree_conversion = time.perf_counter() - debut - duree_vecteur
+
+    differences = sum(1 for a, b in zip(attendu, obtenu) if a != b)
+    print(f"{args.n} demandes, {int(result['approved'].sum())} approuvées, {differences} différences")
+    print(f"boucle scalaire     : {duree_boucle:8.3f} s ({args.n / duree_boucle:12,.0f} demandes/s)")
+    print(f"moteur vectorisé    : {duree_vecteur:8.3f} s ({args.n / duree_vecteur:12,.0f} demandes/s)"
+          f"  x{duree_boucle / duree_vecteur:.0f}")
+    print(f"conversion en dicts : {duree_conversion:8.3f} s")
+    return 1 if differences or cas_limites() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Enveloppes SOAP et lecture des réponses : modèles précompilés et lecture incrémentale contre l'ancien chemin.
+
+L'ancien chemin construit l'enveloppe par f-string, sans échappement, et analyse toute la réponse
+avec `ET.fromstring`. Les lettres contiennent `<` et `&` : l'ancienne enveloppe n'est pas du XML valide.
+Les réponses mesurées contiennent le résultat suivi de `--elements` autres chaînes (réponse Iterable).
+
+Usage :
+    python benchmarks/bench_soap_codec.py [-n 200] [--tailles 2 200 5000] [--elements 20000]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+import soap_codec  # noqa: E402
+
+# Une page : quelques paragraphes, un `&` et un `<`, puis le saut de page laissé par pdftotext
+PAGE = ("Madame, Monsieur,\n\nLe prix d'achat de l'appartement est de 20 000. Je souhaiterais obtenir un pret "
+        "d'un montant de 12 000. Je percois un revenu mensuel de 3 700 et mes depenses mensuelles s'elevent a "
+        "2 400. Le bien est un appartement de 300 m2, situe dans le 6e arrondissement de Paris.\n\n" * 6
+        + "Apport personnel & epargne : < 10 % du prix.\n\f")
+RESULTAT = '{"name": "John Doe", "customerId": "client-001", "loanAmount": 12000}'
+
+
+def ancienne_enveloppe(method, params):
+    champs = ''.join(f'<spy:{nom}>{valeur}</spy:{nom}>' for nom, valeur in params.items())
+    return f'''\
+        <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:spy="spyne.examples.hello">
+            <soapenv:Header/>
+            <soapenv:Body>
+                <spy:{method}>{champs}</spy:{method}>
+            </soapenv:Body>
+        </soapenv:Envelope>'''
+
+
+def ancienne_lecture(data):
+    namespaces = {'soapenv': 'http://schemas.xmlsoap.org/soap/envelope/', 'tns': 'spyne.examples.hello'}
+    element = ET.fromstring(data).find('.//tns:string', namespaces)
+    return None if element is None else element.text
+
+
+def reponse(elements, taille_element):
+    autres = ''.join(f'<tns:string>{"x" * taille_element}</tns:string>' for _ in range(elements))
+    return (f'<?xml version="1.0" encoding="UTF-8"?><soap11env:Envelope '
+            f'xmlns:soap11env="http://schemas.xmlsoap.org/soap/envelope/" xmlns:tns="spyne.examples.hello">'
+            f'<soap11env:Body><tns:extraire_informationResponse><tns:extraire_informationResult>'
+            f'<tns:string>{RESULTAT.replace(chr(34), "&quot;")}</tns:string>{autres}'
+            f'</tns:extraire_informationResult></tns:extraire_informationResponse></soap11env:Body>'
+            f'</soap11env:Envelope>').encode('utf-8')
+
+
+def mesurer(fonction, n):
+    durees = []
+    for _ in range(n):
+        debut = time.perf_counter()
+        fonction()
+        durees.append((time.perf_counter() - debut) * 1e6)
+    durees.sort()
+    return statistics.fmean(durees), durees[len(durees) // 2]
+
+
+def memoire(fonction):
+    tracemalloc.start()
+    fonction()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pic / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', type=int, default=200, help="Répétitions par mesure")
+    parser.add_argument('--tailles', type=int, nargs='+', default=[2, 200, 5000], help="Tailles des lettres (Kio)")
+    parser.add_argument('--elements', type=int, default=20000, help="Chaînes suivant le résultat dans la réponse")
+    args = parser.parse_args(argv)
+
+    print("Enveloppe de la demande d'extraction")
+    print(f"{'lettre':>10}{'ancienne (µs)':>16}{'modèle (µs)':>14}{'ancienne valide':>18}{'aller-retour':>14}")
+    for taille in args.tailles:
+        lettre = (PAGE * (taille * 1024 // len(PAGE) + 1))[:taille * 1024]
+        params = {'demande': lettre, 'format_document': 'pdf'}
+        ancienne, _ = mesurer(lambda: ancienne_enveloppe('extraire_information', params), args.n)
+        nouvelle, _ = mesurer(lambda: soap_codec.build_envelope('extraire_information', params), args.n)
+        try:
+            ET.fromstring(ancienne_enveloppe('extraire_information', params))
+            valide = 'oui'
+        except ET.ParseError:
+            valide = 'non'
+        relue = ET.fromstring(soap_codec.build_envelope('extraire_information', params)).findtext(
+            './/{spyne.examples.hello}demande')
+        fidele = relue == lettre.replace('\f', ' ')
+        print(f"{taille:>7} Kio{ancienne:>16.1f}{nouvelle:>14.1f}{valide:>18}{'identique' if fidele else 'DIFFÉRENT':>14}")
+
+    print("\nLecture de la réponse")
+    print(f"{'réponse':>10}{'fromstring (µs)':>18}{'incrémentale (µs)':>20}{'mémoire (Kio)':>22}")
+    for elements, taille_element in ((0, 0), (args.elements // 10, 100), (args.elements, 250)):
+        data = reponse(elements, taille_element)
+        assert ancienne_lecture(data) == soap_codec.read_result(data) == RESULTAT
+        n = max(5, args.n // (1 + elements // 1000))
+        ancienne, _ = mesurer(lambda: ancienne_lecture(data), n)
+        nouvelle, _ = mesurer(lambda: soap_codec.read_result(data), n)
+        memoire_ancienne, memoire_nouvelle = memoire(lambda: ancienne_lecture(data)), memoire(
+            lambda: soap_codec.read_result(data))
+        print(f"{len(data) / 1024:>6.0f} Kio{ancienne:>18.1f}{nouvelle:>20.1f}"
+              f"{memoire_ancienne:>12.0f} -> {memoire_nouvelle:<7.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Démarrage à froid de chaque point d'entrée : imports, construction de l'application et première requête.
+
+Chaque mesure lance un interpréteur neuf qui importe `serve`, construit l'application d'une cible
+comme le fait un worker gunicorn (`serve.build_app`) puis lui envoie deux requêtes dans le processus
+(sans réseau) : la première paie les initialisations paresseuses, la seconde sert de référence.
+Le profil `-X importtime` du premier lancement donne les paquets les plus coûteux à importer, et
+l'on relève quelles dépendances lourdes ont été chargées.
+
+Avec `--avant REV`, les mêmes mesures sont faites sur une copie de travail de la révision REV
+(`git worktree`), pour comparer avant et après une modification.
+
+Usage :
+    python benchmarks/bench_startup.py [-n 5] [--cibles composite extraction] [--avant HEAD~1] [--profil 8]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CIBLES = ('composite', 'extraction', 'solvabilite', 'evaluation_propriete', 'approbation')
+DEPENDANCES_LOURDES = ('spyne', 'lxml', 'twisted', 'openai', 'textract', 'flask', 'numpy', 'requests')
+
+# Requête légère par cible : (méthode HTTP, chemin, méthode SOAP, paramètres, espace de noms)
+REQUETES = {
+    'composite': ('GET', '/', None, None, None),
+    'extraction': ('POST', '/extractInformationsService', 'statistiques_extraction', {}, 'spyne.examples.hello'),
+    'solvabilite': ('POST', '/solvabiliteService', 'statistiques_solvabilite', {}, 'spyne.examples.hello'),
+    'evaluation_propriete': ('POST', '/evaluationProprieteService', 'statut_referentiel', {},
+                             'spyne.examples.hello'),
+    'approbation': ('POST', '/', 'make_decision',
+                    {'client_name': 'John Doe', 'credit_score': 720, 'debt_to_income_ratio': 0.35,
+                     'property_value': 300000, 'loan_amount': 250000}, 'approval_decision'),
+}
+
+# Exécuté dans l'interpréteur neuf : argv = racine de l'arbre mesuré, cible, requête (JSON)
+SCRIPT = r'''
+import io, sys, json, time
+debut = time.perf_counter()
+racine, cible, requete = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+sys.path.insert(0, racine)
+import serve
+app = serve.build_app(cible)
+construction = time.perf_counter() - debut
+import soap_codec
+verbe, chemin, methode, params, tns = requete
+
+def envoyer():
+    corps = soap_codec.build_envelope(methode, params, tns).encode('utf-8') if methode else b''
+    environ = {
+        'REQUEST_METHOD': verbe, 'PATH_INFO': chemin, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'text/xml; charset=utf-8', 'CONTENT_LENGTH': str(len(corps)),
+        'wsgi.input': io.BytesIO(corps), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    statut = []
+    debut = time.perf_counter()
+    reponse = app(environ, lambda s, h, exc_info=None: statut.append(s))
+    b''.join(reponse)
+    if hasattr(reponse, 'close'):
+        reponse.close()
+    return time.perf_counter() - debut, statut[0] if statut else None
+
+premiere, statut = envoyer()
+seconde, _ = envoyer()
+lourdes = sorted({nom.split('.')[0] for nom in sys.modules} & set(sys.argv[4].split(',')))
+print('@@' + json.dumps({'construction': construction, 'premiere': premiere, 'seconde': seconde,
+                         'statut': statut, 'lourdes': lourdes}))
+'''
+
+
+def environnement(tmp):
+    """Variables isolant les fichiers créés au chargement (file de travaux, caches, journal d'audit)."""
+    env = dict(os.environ)
+    env.update({
+        'JOBS_DB': os.path.join(tmp, 'jobs.sqlite3'),
+        'SOLVENCY_INVALIDATIONS_DB': os.path.join(tmp, 'solvency_invalidations.sqlite3'),
+        'UPLOAD_STORE_DIR': os.path.join(tmp, 'store'),
+        'EXTRACTION_CACHE_DIR': os.path.join(tmp, 'cache'),
+        'AUDIT_LOG_DIR': os.path.join(tmp, 'audit'),
+        'BATCH_RUNS_DIR': os.path.join(tmp, 'batch_runs'),
+        'PROPERTY_REFERENCE_RELOAD_INTERVAL': '0',
+        'OPENAI_API_KEY': env.get('OPENAI_API_KEY', 'sk-bench'),
+    })
+    env.pop('TEXT_CACHE_DIR', None)
+    return env
+
+
+def lancer(racine, cible, env, profil=False):
+    """Un démarrage à froid ; retourne les mesures (s) et, avec `profil`, la sortie de -X importtime."""
+    commande = [sys.executable] + (['-X', 'importtime'] if profil else []) + [
+        '-c', SCRIPT, racine, cible, json.dumps(REQUETES[cible]), ','.join(DEPENDANCES_LOURDES)]
+    debut = time.perf_counter()
+    resultat = subprocess.run(commande, cwd=racine, env=env, capture_output=True, text=True, timeout=300)
+    duree = time.perf_counter() - debut
+    ligne = next((l for l in resultat.stdout.splitlines() if l.startswith('@@')), None)
+    if resultat.returncode != 0 or ligne is None:
+        raise RuntimeError(f"{cible} ({racine}) : échec du démarrage\n{resultat.stderr[-2000:]}")
+    mesures = json.loads(ligne[2:])
+    mesures['processus'] = duree
+    return mesures, resultat.stderr if profil else None
+
+
+def profil_imports(sortie, n):
+    """Paquets les plus coûteux : temps propre de leurs modules, à toute profondeur d'import (ms)."""
+    paquets = {}
+    for ligne in sortie.splitlines():
+        if not ligne.startswith('import time:') or 'cumulative' in ligne:
+            continue
+        propre, _, nom = ligne[len('import time:'):].split('|')
+        paquet = nom.strip().split('.')[0]
+        paquets[paquet] = paquets.get(paquet, 0) + int(propre) / 1000
+    return sorted(paquets.items(), key=lambda p: p[1], reverse=True)[:n]
+
+
+def mesurer(racine, cibles, n, profil):
+    resultats = {}
+    for cible in cibles:
+        tmp = tempfile.mkdtemp(prefix='bench-startup-')
+        try:
+            env = environnement(tmp)
+            premier, sortie = lancer(racine, cible, env, profil=profil > 0)
+            series = [premier] + [lancer(racine, cible, env)[0] for _ in range(n - 1)]
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        resultats[cible] = {
+            cle: statistics.median(s[cle] for s in series) * 1000
+            for cle in ('processus', 'construction', 'premiere', 'seconde')
+        }
+        resultats[cible]['statut'] = premier['statut']
+        resultats[cible]['lourdes'] = premier['lourdes']
+        resultats[cible]['profil'] = profil_imports(sortie, profil) if sortie else []
+    return resultats
+
+
+def copie_de_travail(revision):
+    repertoire = tempfile.mkdtemp(prefix='bench-startup-avant-')
+    subprocess.run(['git', 'worktree', 'add', '--detach', repertoire, revision], cwd=RACINE, check=True,
+                   capture_output=True)
+    return repertoire
+
+
+def afficher(version, resultats):
+    for cible, r in resultats.items():
+        print(f"{cible:<22}{version:<8}{r['processus']:>12.0f}{r['construction']:>14.0f}{r['premiere']:>12.1f}"
+              f"{r['seconde']:>11.1f}  {r['statut'] or '-':<18}{','.join(r['lourdes'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', type=int, default=5, help="Démarrages par cible (médiane)")
+    parser.add_argument('--cibles', nargs='+', choices=CIBLES, default=list(CIBLES))
+    parser.add_argument('--avant', metavar='REV', help="Révision de référence (ex. HEAD~1)")
+    parser.add_argument('--profil', type=int, default=8, help="Paquets affichés par cible (0 : pas de profil)")
+    args = parser.parse_args(argv)
+
+    versions = {}
+    avant = copie_de_travail(args.avant) if args.avant else None
+    try:
+        if avant:
+            versions[args.avant] = mesurer(avant, args.cibles, args.n, args.profil)
+        versions['actuel'] = mesurer(RACINE, args.cibles, args.n, args.profil)
+    finally:
+        if avant:
+            subprocess.run(['git', 'worktree', 'remove', '--force', avant], cwd=RACINE, capture_output=True)
+
+    print(f"Médiane de {args.n} démarrages (ms) ; première et seconde requête traitées dans le processus\n")
+    print(f"{'cible':<22}{'version':<8}{'processus':>12}{'imports+app':>14}{'1re req.':>12}{'2e req.':>11}"
+          f"  {'statut':<18}dépendances lourdes chargées")
+    for version, resultats in versions.items():
+        afficher(version[:7], resultats)
+
+    if args.profil:
+        for version, resultats in versions.items():
+            print(f"\nImports les plus coûteux ({version}, -X importtime, ms propres par paquet)")
+            for cible, r in resultats.items():
+                print(f"  {cible:<22}" + ', '.join(f"{nom} {ms:.0f}" for nom, ms in r['profil']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
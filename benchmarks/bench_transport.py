@@ -0,0 +1,101 @@
+"""Coût de sérialisation et d'analyse par appel : SOAP (enveloppe + lxml + repr) contre JSON.
+
+Les applications WSGI des services sont appelées dans le processus (sans réseau),
+afin de ne mesurer que l'encodage, le décodage et la validation de chaque transport.
+
+Usage :
+    python benchmarks/bench_transport.py [-n 2000]
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+sys.path.insert(0, os.path.join(RACINE, 'services'))
+
+# Le composite crée sa file de travaux et son stockage au chargement : on les isole
+_tmp = tempfile.mkdtemp(prefix='bench-transport-')
+os.environ.setdefault('JOBS_DB', os.path.join(_tmp, 'jobs.sqlite3'))
+os.environ.setdefault('SOLVENCY_INVALIDATIONS_DB', os.path.join(_tmp, 'solvency_invalidations.sqlite3'))
+os.environ.setdefault('UPLOAD_STORE_DIR', os.path.join(_tmp, 'store'))
+os.environ.setdefault('EXTRACTION_CACHE_DIR', os.path.join(_tmp, 'cache'))
+
+import composite  # noqa: E402
+import soap_codec  # noqa: E402
+import extract  # noqa: E402
+import verification_solvabilite_service  # noqa: E402
+import evaluation_propriete_service  # noqa: E402
+
+# Lettre au format du modèle : l'extraction passe par les règles, sans appel au modèle
+LETTRE = (
+    "John Doe\nLe prix dachat de lappartement est de 20 000. Je souhaiterais obtenir un prt dun montant de "
+    "12 000. Je perois un revenu mensuel de 3 700 et mes dpenses mensuelles slvent 2 400. Le bien est un "
+    "appartement de 300 m, situ dans le 6e arrondissement de Paris. Mon identifiant client : client-001\nJohn Doe")
+
+CAS = [
+    ('extraction', 'extraire_information', {'demande': LETTRE}, extract),
+    ('solvabilite', 'etudier_solvabilite', {'clientId': 'client-001'}, verification_solvabilite_service),
+    ('evaluation_propriete', 'evaluer_propriete',
+     {'ville': 'Paris', 'taille_logement': 300, 'adresse': '6e arrondissement de Paris'}, evaluation_propriete_service),
+]
+
+
+def appeler_wsgi(app, body, content_type):
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': '/', 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': False,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    return b''.join(app(environ, lambda status, headers, exc_info=None: None))
+
+
+def mesurer(fonction, n):
+    durees = []
+    for _ in range(n):
+        debut = time.perf_counter()
+        fonction()
+        durees.append((time.perf_counter() - debut) * 1e6)
+    durees.sort()
+    return {'mean_us': round(statistics.fmean(durees), 1), 'p50_us': round(durees[len(durees) // 2], 1),
+            'p95_us': round(durees[int(len(durees) * 0.95)], 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', type=int, default=2000, help="Nombre d'appels par cas")
+    args = parser.parse_args(argv)
+
+    resultats = {}
+    for nom, methode, params, module in CAS:
+        soap_app = module.wsgi_application
+
+        def aller_retour_soap():
+            enveloppe = soap_codec.build_envelope(methode, params).encode('utf-8')
+            reponse = appeler_wsgi(soap_app, enveloppe, 'text/xml; charset=utf-8')
+            return composite.SOAP_RESULT_PARSERS[nom](soap_codec.read_result(reponse))
+
+        def aller_retour_json():
+            corps = json.dumps({'method': methode, 'params': params}).encode('utf-8')
+            return json.loads(appeler_wsgi(module.json_application, corps, 'application/json'))['result']
+
+        assert aller_retour_soap() == aller_retour_json(), f"Résultats divergents pour {nom}"
+        resultats[nom] = {'soap': mesurer(aller_retour_soap, args.n), 'json': mesurer(aller_retour_json, args.n)}
+
+    print(f"{'service':<22}{'transport':<10}{'moyenne (µs)':>14}{'p50 (µs)':>12}{'p95 (µs)':>12}")
+    for nom, par_transport in resultats.items():
+        for transport, m in par_transport.items():
+            print(f"{nom:<22}{transport:<10}{m['mean_us']:>14}{m['p50_us']:>12}{m['p95_us']:>12}")
+        print(f"{'':<22}{'gain':<10}{par_transport['soap']['mean_us'] / par_transport['json']['mean_us']:>13.1f}x")
+    return resultats
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+"""Test de charge de la chaîne de traitement : composite (`/`) et services SOAP, avec un faux OpenAI.
+
+Lance `serve.py` (composite et services sur leurs ports habituels) en redirigeant les appels au
+modèle vers un serveur OpenAI factice local (`OPENAI_API_BASE`), génère des lettres synthétiques
+en TXT, DOCX et PDF de plusieurs tailles, puis envoie les requêtes avec la concurrence demandée.
+Pour chaque scénario : débit, latences p50/p95/p99 et mémoire résidente des serveurs (pic).
+
+Les résultats sont enregistrés en JSON (avec le commit courant) ; `--comparer` les confronte à
+un résultat précédent et signale les régressions (code de sortie 1).
+
+Usage :
+    python benchmarks/load_test.py [--requetes 100] [--concurrence 1 8] [--formats txt pdf]
+        [--tailles courte longue] [--services solvabilite] [--workers 2 --threads 8]
+        [--latence-modele 0.3] [--part-modele 0.5] [--comparer benchmarks/results/precedent.json]
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import zipfile
+import argparse
+import tempfile
+import threading
+import subprocess
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+from serve import SERVICES, COMPOSITE_PORT  # noqa: E402
+
+RESULTATS_DIR = os.path.join(RACINE, 'benchmarks', 'results')
+HOTE = '127.0.0.1'
+
+CLIENTS = [('John Doe', 'client-001'), ('Alice Smith', 'client-002'), ('Bob Johnson', 'client-003')]
+
+# Lettre au format du modèle de demande : extraite par les règles, sans appel au modèle
+LETTRE_REGLES = (
+    "{nom}\n\nLe prix d'achat de l'appartement est de 20 000. Je souhaiterais obtenir un prêt d'un montant de "
+    "12 000. Je perçois un revenu mensuel de 3 700 et mes dépenses mensuelles s'élèvent à 2 400. Le bien est un "
+    "appartement de 300 m², situé dans le 6e arrondissement de Paris. Mon identifiant client : {client}\n\n{nom}"
+)
+# Lettre rédigée librement : les règles ne suffisent pas, l'extraction passe par le modèle
+LETTRE_MODELE = (
+    "{nom}\n\nJe souhaite acquérir un appartement de 300 m² dans le 6e arrondissement de Paris, vendu 20 000 "
+    "euros, et vous sollicite pour un financement de 12 000 euros. Je gagne 3 700 euros par mois pour 2 400 "
+    "euros de charges. Mon identifiant client : {client}\n\n{nom}"
+)
+PARAGRAPHE = (
+    "Je me permets de vous présenter plus en détail mon projet. Installé dans le quartier depuis plusieurs "
+    "années, je souhaite aujourd'hui y devenir propriétaire. Ma situation professionnelle est stable et "
+    "j'ai constitué une épargne régulière en vue de cet achat. Je reste à votre disposition pour vous "
+    "transmettre toute pièce complémentaire utile à l'étude de mon dossier."
+)
+# Nombre de paragraphes ajoutés à la lettre (une page compte environ six paragraphes)
+TAILLES = {'courte': 0, 'moyenne': 18, 'longue': 120}
+
+# Réponse du faux modèle, au format du schéma demandé par le service d'extraction
+REPONSE_MODELE = {
+    "description": {
+        "accommodationType": "apartment",
+        "surfaceArea": "300m2",
+        "address": {"town": "Paris", "postalCode": "75006", "completeAddress": "6e arrondissement de Paris"},
+    },
+    "contact": {"phone": "+33 5 67784890", "email": "client@example.com"},
+    "loanAmount": 12000,
+    "monthlyIncome": 3700,
+    "monthlyExpenses": 2400,
+    "propertyPrice": 20000,
+}
+
+ENVELOPPE = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:spy="{tns}">'
+    '<soapenv:Header/><soapenv:Body><spy:{methode}>{champs}</spy:{methode}></soapenv:Body></soapenv:Envelope>'
+)
+SOAP_HEADERS = {'content-type': 'text/xml; charset=utf-8'}
+
+
+# --- Faux serveur OpenAI -------------------------------------------------------------------------
+
+class FauxOpenAI(BaseHTTPRequestHandler):
+    """Répond à /v1/chat/completions après `latence` secondes, avec l'identifiant client lu dans la lettre."""
+
+    latence = 0.0
+    appels = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        corps = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with self._lock:
+            FauxOpenAI.appels += 1
+        time.sleep(self.latence)
+        texte = ' '.join(m.get('content', '') for m in corps.get('messages', []))
+        trouve = re.search(r"\bclient-\d{3}\b", texte)
+        client = trouve.group(0) if trouve else 'client-001'
+        contenu = dict(REPONSE_MODELE, name={c: n for n, c in CLIENTS}.get(client, 'John Doe'), customerId=client)
+        reponse = json.dumps({
+            'id': f'chatcmpl-{uuid.uuid4().hex[:12]}', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': corps.get('model', 'gpt-3.5-turbo'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': json.dumps(contenu)}}],
+            'usage': {'prompt_tokens': len(texte) // 4, 'completion_tokens': 120,
+                      'total_tokens': len(texte) // 4 + 120},
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reponse)))
+        self.end_headers()
+        self.wfile.write(reponse)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def demarrer_faux_openai(latence):
+    FauxOpenAI.latence = latence
+    serveur = ThreadingHTTPServer((HOTE, 0), FauxOpenAI)
+    serveur.daemon_threads = True
+    threading.Thread(target=serveur.serve_forever, daemon=True, name='faux-openai').start()
+    return serveur
+
+
+# --- Documents synthétiques ----------------------------------------------------------------------
+
+def lettre(rng, taille, part_modele):
+    """Texte d'une lettre unique (référence de dossier aléatoire : le cache d'extraction ne sert pas)."""
+    nom, client = rng.choice(CLIENTS)
+    modele = LETTRE_MODELE if rng.random() < part_modele else LETTRE_REGLES
+    corps = modele.format(nom=nom, client=client)
+    paragraphes = [PARAGRAPHE] * TAILLES[taille]
+    return '\n\n'.join([corps.rsplit('\n\n', 1)[0], f"Référence du dossier : {uuid.UUID(int=rng.getrandbits(128))}"]
+                       + paragraphes + [nom])
+
+
+def en_txt(texte):
+    return texte.encode('utf-8')
+
+
+def en_docx(texte):
+    """DOCX minimal : un paragraphe Word par paragraphe du texte."""
+    def echapper(s):
+        return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+    paragraphes = ''.join(f'<w:p><w:r><w:t xml:space="preserve">{echapper(p)}</w:t></w:r></w:p>'
+                          for p in texte.split('\n\n'))
+    tampon = io.BytesIO()
+    with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml',
+                      '<?xml version="1.0" encoding="UTF-8"?>'
+                      '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                      '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                      '<Default Extension="xml" ContentType="application/xml"/>'
+                      '<Override PartName="/word/document.xml" ContentType="application/'
+                      'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>')
+        docx.writestr('_rels/.rels',
+                      '<?xml version="1.0" encoding="UTF-8"?>'
+                      '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                      '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                      'relationships/officeDocument" Target="word/document.xml"/></Relationships>')
+        docx.writestr('word/document.xml',
+                      '<?xml version="1.0" encoding="UTF-8"?>'
+                      '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                      f'<w:body>{paragraphes}</w:body></w:document>')
+    return tampon.getvalue()
+
+
+def en_pdf(texte, lignes_par_page=48, largeur=95):
+    """PDF minimal (Helvetica, texte ASCII) : les accents sont retirés, les lignes coupées à `largeur` caractères."""
+    ascii_ = unicodedata.normalize('NFKD', texte).encode('ascii', 'ignore').decode('ascii')
+    lignes = []
+    for paragraphe in ascii_.split('\n'):
+        while len(paragraphe) > largeur:
+            coupure = paragraphe.rfind(' ', 0, largeur) if ' ' in paragraphe[:largeur] else largeur
+            lignes.append(paragraphe[:coupure])
+            paragraphe = paragraphe[coupure:].lstrip()
+        lignes.append(paragraphe)
+    pages = [lignes[i:i + lignes_par_page] for i in range(0, len(lignes), lignes_par_page)] or [[]]
+
+    objets = [None, None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for page in pages:
+        flux = ['BT /F1 11 Tf 14 TL 50 800 Td']
+        for ligne in page:
+            flux.append('(' + ligne.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ") '")
+        flux.append('ET')
+        contenu = '\n'.join(flux).encode('latin-1')
+        objets.append(b'<< /Length %d >>\nstream\n' % len(contenu) + contenu + b'\nendstream')
+        objets.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> '
+                      b'/Contents %d 0 R >>' % (len(objets)))
+        kids.append(len(objets))
+    objets[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objets[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % k for k in kids), len(kids))
+
+    sortie = io.BytesIO()
+    sortie.write(b'%PDF-1.4\n')
+    positions = []
+    for numero, objet in enumerate(objets, 1):
+        positions.append(sortie.tell())
+        sortie.write(b'%d 0 obj\n' % numero + objet + b'\nendobj\n')
+    xref = sortie.tell()
+    sortie.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objets) + 1))
+    for position in positions:
+        sortie.write(b'%010d 00000 n \n' % position)
+    sortie.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objets) + 1, xref))
+    return sortie.getvalue()
+
+
+FORMATS = {'txt': en_txt, 'docx': en_docx, 'pdf': en_pdf}
+
+
+# --- Scénarios -----------------------------------------------------------------------------------
+
+def url_service(nom):
+    _, port, chemin = SERVICES[nom]
+    return f"http://{HOTE}:{port}/{chemin or ''}"
+
+
+def enveloppe(tns, methode, params):
+    champs = ''.join(f'<spy:{nom}>{valeur}</spy:{nom}>' for nom, valeur in params.items())
+    return ENVELOPPE.format(tns=tns, methode=methode, champs=champs).encode('utf-8')
+
+
+def requetes_service(nom, rng, n, part_modele):
+    """Corps SOAP des `n` requêtes d'un scénario de service."""
+    corps = []
+    for _ in range(n):
+        nom_client, client = rng.choice(CLIENTS)
+        if nom == 'extraction':
+            texte = lettre(rng, 'courte', part_modele).replace('&', '&amp;').replace('<', '&lt;')
+            corps.append(enveloppe('spyne.examples.hello', 'extraire_information', {'demande': texte}))
+        elif nom == 'solvabilite':
+            corps.append(enveloppe('spyne.examples.hello', 'etudier_solvabilite', {'clientId': client}))
+        elif nom == 'evaluation_propriete':
+            corps.append(enveloppe('spyne.examples.hello', 'evaluer_propriete', {
+                'ville': rng.choice(['Paris', 'Lyon', 'Marseille']), 'taille_logement': rng.randint(20, 300),
+                'adresse': f"{rng.randint(1, 200)} rue de la République"}))
+        else:
+            corps.append(enveloppe('approval_decision', 'make_decision', {
+                'client_name': nom_client, 'credit_score': rng.randint(300, 850),
+                'debt_to_income_ratio': round(rng.uniform(0.05, 0.6), 3),
+                'property_value': rng.randint(100, 800) * 1000, 'loan_amount': rng.randint(50, 600) * 1000,
+                'customer_id': client}))
+    return corps
+
+
+_sessions = threading.local()
+
+
+def session():
+    if not hasattr(_sessions, 'session'):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def envoyer_composite(charge):
+    nom_fichier, contenu = charge
+    reponse = session().post(f"http://{HOTE}:{COMPOSITE_PORT}/", files={'file': (nom_fichier, contenu)}, timeout=120)
+    return reponse.status_code == 200 and 'Traitement terminé' in reponse.text
+
+
+def envoyer_soap(url):
+    def envoyer(charge):
+        reponse = session().post(url, data=charge, headers=SOAP_HEADERS, timeout=120)
+        return reponse.status_code == 200 and b'Fault>' not in reponse.content
+    return envoyer
+
+
+# --- Mesures -------------------------------------------------------------------------------------
+
+def memoire_arbre(pid):
+    """Mémoire résidente (Mio) du processus `pid` et de ses descendants, lue dans /proc (Linux)."""
+    try:
+        enfants = {}
+        for entree in os.listdir('/proc'):
+            if entree.isdigit():
+                try:
+                    with open(f'/proc/{entree}/stat') as f:
+                        ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+                enfants.setdefault(ppid, []).append(int(entree))
+        total, a_voir = 0, [pid]
+        while a_voir:
+            courant = a_voir.pop()
+            a_voir.extend(enfants.get(courant, []))
+            try:
+                with open(f'/proc/{courant}/status') as f:
+                    for ligne in f:
+                        if ligne.startswith('VmRSS:'):
+                            total += int(ligne.split()[1])
+            except OSError:
+                pass
+        return total / 1024
+    except OSError:
+        return None
+
+
+class EchantillonneurMemoire:
+    """Relève la mémoire des serveurs pendant un scénario et en retient le pic."""
+
+    def __init__(self, pid, intervalle=0.2):
+        self.pid = pid
+        self.intervalle = intervalle
+        self.pic = None
+        self._arret = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._thread = threading.Thread(target=self._boucle, daemon=True)
+            self._thread.start()
+        return self
+
+    def _boucle(self):
+        while not self._arret.is_set():
+            self._relever()
+            self._arret.wait(self.intervalle)
+
+    def _relever(self):
+        valeur = memoire_arbre(self.pid)
+        if valeur is not None:
+            self.pic = max(self.pic or 0.0, valeur)
+
+    def __exit__(self, *exc):
+        self._arret.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._relever()
+
+
+def percentile(durees, p):
+    return durees[min(len(durees) - 1, int(len(durees) * p / 100))]
+
+
+def executer(envoyer, charges, concurrence, echauffement, pid):
+    """Envoie les charges avec `concurrence` clients simultanés ; retourne les mesures du scénario."""
+    with ThreadPoolExecutor(max_workers=concurrence) as pool:
+        list(pool.map(envoyer, charges[:echauffement]))
+
+        def chronometrer(charge):
+            debut = time.perf_counter()
+            try:
+                succes = envoyer(charge)
+            except requests.RequestException:
+                succes = False
+            return time.perf_counter() - debut, succes
+
+        with EchantillonneurMemoire(pid) as memoire:
+            debut = time.perf_counter()
+            mesures = list(pool.map(chronometrer, charges[echauffement:]))
+            duree = time.perf_counter() - debut
+
+    durees = sorted(d * 1000 for d, _ in mesures)
+    erreurs = sum(1 for _, succes in mesures if not succes)
+    return {
+        'requetes': len(mesures),
+        'erreurs': erreurs,
+        'concurrence': concurrence,
+        'duree_s': round(duree, 3),
+        'debit_rps': round(len(mesures) / duree, 2),
+        'latence_ms': {
+            'moyenne': round(sum(durees) / len(durees), 2),
+            'p50': round(percentile(durees, 50), 2),
+            'p95': round(percentile(durees, 95), 2),
+            'p99': round(percentile(durees, 99), 2),
+            'max': round(durees[-1], 2),
+        },
+        'memoire_pic_mio': round(memoire.pic, 1) if memoire.pic is not None else None,
+    }
+
+
+# --- Serveurs ------------------------------------------------------------------------------------
+
+def demarrer_serveurs(args, openai_base, tmp):
+    env = dict(os.environ,
+               OPENAI_API_BASE=openai_base,
+               OPENAI_API_KEY='sk-test-charge',
+               # Le quota ne doit pas brider la mesure : le faux modèle répond sans limite
+               OPENAI_REQUESTS_PER_MINUTE='1000000',
+               OPENAI_TOKENS_PER_MINUTE='1000000000',
+               OPENAI_MAX_CONCURRENCY=str(max(args.concurrence) * 2),
+               OPENAI_MAX_QUEUE=str(max(args.concurrence) * 4),
+               ASYNC_UPLOADS='0',
+               JOBS_DB=os.path.join(tmp, 'jobs.sqlite3'),
+               UPLOAD_STORE_DIR=os.path.join(tmp, 'store'),
+               EXTRACTION_CACHE_DIR=os.path.join(tmp, 'cache'),
+               BATCH_RUNS_DIR=os.path.join(tmp, 'batch_runs'),
+               PROPERTY_REFERENCE_RELOAD_INTERVAL='0')
+    commande = [sys.executable, os.path.join(RACINE, 'serve.py'), '--host', HOTE,
+                '--workers', str(args.workers), '--threads', str(args.threads)]
+    journal = open(os.path.join(tmp, 'serve.log'), 'wb')
+    processus = subprocess.Popen(commande, cwd=tmp, env=env, stdout=journal, stderr=subprocess.STDOUT)
+    ports = [port for _, port, _ in SERVICES.values()] + [COMPOSITE_PORT]
+    limite = time.monotonic() + args.delai_demarrage
+    while ports:
+        if processus.poll() is not None:
+            raise RuntimeError(f"serve.py s'est arrêté au démarrage (voir {journal.name})")
+        if time.monotonic() > limite:
+            arreter_serveurs(processus)
+            raise RuntimeError(f"Services non prêts après {args.delai_demarrage} s (voir {journal.name})")
+        try:
+            if requests.get(f"http://{HOTE}:{ports[0]}/health", timeout=1).status_code == 200:
+                ports.pop(0)
+                continue
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    return processus
+
+
+def arreter_serveurs(processus):
+    processus.send_signal(signal.SIGTERM)
+    try:
+        processus.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        processus.kill()
+
+
+# --- Résultats -----------------------------------------------------------------------------------
+
+def commit_courant():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RACINE, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        modifie = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RACINE,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('-modifie' if modifie else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparer(actuel, precedent, tolerance):
+    """Affiche l'évolution p95 et débit par scénario ; retourne le nombre de régressions."""
+    regressions = 0
+    print(f"\nComparaison avec {precedent.get('commit')} ({precedent.get('date')}), tolérance {tolerance:.0%}")
+    print(f"{'scénario':<34}{'p95 (ms)':>22}{'débit (req/s)':>24}")
+    for nom, mesure in actuel['scenarios'].items():
+        ancien = precedent.get('scenarios', {}).get(nom)
+        if ancien is None:
+            continue
+        p95, ancien_p95 = mesure['latence_ms']['p95'], ancien['latence_ms']['p95']
+        debit, ancien_debit = mesure['debit_rps'], ancien['debit_rps']
+        regression = p95 > ancien_p95 * (1 + tolerance) or debit < ancien_debit * (1 - tolerance)
+        regressions += regression
+        print(f"{nom:<34}{ancien_p95:>10.1f} -> {p95:<9.1f}{ancien_debit:>12.1f} -> {debit:<9.1f}"
+              f"{'  RÉGRESSION' if regression else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requetes', type=int, default=100, help="Requêtes mesurées par scénario")
+    parser.add_argument('--echauffement', type=int, default=5, help="Requêtes non mesurées avant chaque scénario")
+    parser.add_argument('--concurrence', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--formats', nargs='+', choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument('--tailles', nargs='+', choices=list(TAILLES), default=list(TAILLES))
+    parser.add_argument('--services', nargs='*', choices=list(SERVICES), default=list(SERVICES),
+                        help="Services appelés directement en SOAP (aucun : --services)")
+    parser.add_argument('--sans-composite', action='store_true', help="Ne charge pas le point d'entrée `/`")
+    parser.add_argument('--part-modele', type=float, default=0.5,
+                        help="Part des lettres rédigées librement, extraites par le modèle")
+    parser.add_argument('--latence-modele', type=float, default=0.3, help="Latence du faux OpenAI (s)")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--deja-lances', action='store_true',
+                        help="Utilise les services déjà lancés (le faux OpenAI n'est pas branché, pas de mesure mémoire)")
+    parser.add_argument('--delai-demarrage', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--sortie', help="Fichier JSON des résultats (par défaut benchmarks/results/)")
+    parser.add_argument('--comparer', help="Résultats JSON précédents à comparer")
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    n = args.requetes + args.echauffement
+    scenarios = []
+    if not args.sans_composite:
+        for format_document in args.formats:
+            for taille in args.tailles:
+                charges = [(f"lettre-{i}.{format_document}", FORMATS[format_document](lettre(rng, taille, args.part_modele)))
+                           for i in range(n)]
+                scenarios.append((f"composite/{format_document}/{taille}", envoyer_composite, charges))
+    for nom in args.services:
+        scenarios.append((f"soap/{nom}", envoyer_soap(url_service(nom)),
+                          requetes_service(nom, rng, n, args.part_modele)))
+
+    tmp = tempfile.mkdtemp(prefix='load-test-')
+    faux_openai = processus = None
+    if not args.deja_lances:
+        faux_openai = demarrer_faux_openai(args.latence_modele)
+        processus = demarrer_serveurs(args, f"http://{HOTE}:{faux_openai.server_port}/v1", tmp)
+        print(f"Services lancés ({args.workers} workers x {args.threads} threads), journaux : {tmp}/serve.log")
+
+    resultats = {
+        'commit': commit_courant(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'parametres': {k: v for k, v in vars(args).items() if k not in ('sortie', 'comparer')},
+        'scenarios': {},
+    }
+    try:
+        if processus is not None:
+            resultats['memoire_repos_mio'] = round(memoire_arbre(processus.pid) or 0, 1) or None
+        print(f"{'scénario':<34}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'erreurs':>9}{'mém. (Mio)':>12}")
+        for nom, envoyer, charges in scenarios:
+            for concurrence in args.concurrence:
+                cle = f"{nom}@{concurrence}"
+                mesure = executer(envoyer, charges, concurrence, args.echauffement,
+                                  processus.pid if processus is not None else None)
+                resultats['scenarios'][cle] = mesure
+                latence = mesure['latence_ms']
+                print(f"{cle:<34}{mesure['debit_rps']:>9.1f}{latence['p50']:>9.1f}{latence['p95']:>9.1f}"
+                      f"{latence['p99']:>9.1f}{mesure['erreurs']:>9}{mesure['memoire_pic_mio'] or '-':>12}")
+    finally:
+        if processus is not None:
+            arreter_serveurs(processus)
+        if faux_openai is not None:
+            resultats['appels_modele'] = FauxOpenAI.appels
+            faux_openai.shutdown()
+
+    sortie = args.sortie or os.path.join(RESULTATS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}-{resultats['commit'] or 'inconnu'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(sortie)), exist_ok=True)
+    with open(sortie, 'w', encoding='utf-8') as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=2)
+    print(f"\nRésultats enregistrés dans {sortie}")
+
+    if args.comparer:
+        with open(args.comparer, encoding='utf-8') as f:
+            return 1 if comparer(resultats, json.load(f), args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,32 @@
 import os
+import sys
 import ast
 import json
 import re
-import requests
-import textract
-import xml.etree.ElementTree as ET
-from flask import Flask, request, render_template, flash
+import hmac
+import time
+import uuid
+import datetime
+import shutil
+import itertools
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, render_template, flash, jsonify, Response
+from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import logging
+from soap_client import SoapClient, ServiceConfig, TransportNotSupported, CircuitOpen
+import soap_codec
+import batch
+from job_queue import JobQueue, JobDeferred
+import ingestion
+import text_cache
+
+# Utilitaires partagés avec les services (traçage)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'services'))
+from utils import tracing  # noqa: E402
+from utils.rule_extractor import RuleExtractor, MIN_CONFIDENCE as RULE_EXTRACTOR_MIN_CONFIDENCE  # noqa: E402
+from utils.audit_log import AuditLog  # noqa: E402
 
 # Configuration
 load_dotenv()
@@ -19,40 +38,161 @@ app.secret_key = os.urandom(24)  # Pour utiliser flash
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Identifiant de requête (en-tête X-Request-ID) propagé aux services, métriques sur /metrics
+tracing.configure('composite')
+app.wsgi_app = tracing.TracingMiddleware(app.wsgi_app, 'composite')
+
 # URLs des services
 SERVICE_EXTRACT_INFO_URL = "http://localhost:8002/extractInformationsService"
 SERVICE_SOLVABILITE_URL = "http://localhost:8003/solvabiliteService"
 SERVICE_EVAL_PROPRIETE_URL = "http://localhost:8004/evaluationProprieteService"
 
-
-def getResults(data):
-    try:
-        namespaces = {'soapenv': 'http://schemas.xmlsoap.org/soap/envelope/',
-                      'tns': 'spyne.examples.hello'}
-        root = ET.fromstring(data)
-        response_element = root.find('.//tns:string', namespaces)
-        if response_element is None:
-            logger.warning("Élément de réponse non trouvé dans le XML")
-            return None
-        return response_element.text
-    except ET.ParseError as e:
-        logger.error(f"Erreur lors de l'analyse XML: {e}")
+# Orchestration : "concurrent" lance solvabilité et évaluation en parallèle, "sequentiel" l'une après l'autre
+ORCHESTRATION_MODE = os.getenv('ORCHESTRATION_MODE', 'concurrent')
+ORCHESTRATION_WORKERS = int(os.getenv('ORCHESTRATION_WORKERS', '8'))
+executor = ThreadPoolExecutor(max_workers=ORCHESTRATION_WORKERS, thread_name_prefix='orchestration')
+
+# Client SOAP partagé (pools de connexions keep-alive par service)
+soap_client = SoapClient({
+    # Pas de seuil d'appel lent pour l'extraction : un appel au modèle dure normalement plusieurs secondes
+    'extraction': ServiceConfig.from_env('extraction', SERVICE_EXTRACT_INFO_URL),
+    'solvabilite': ServiceConfig.from_env('solvabilite', SERVICE_SOLVABILITE_URL, slow_call=5.0),
+    'evaluation_propriete': ServiceConfig.from_env('evaluation_propriete', SERVICE_EVAL_PROPRIETE_URL,
+                                                   slow_call=5.0),
+})
+
+# Transport vers les services : "auto" (JSON si le service l'expose, sinon SOAP), "json" ou "soap"
+SERVICE_TRANSPORT = os.getenv('SERVICE_TRANSPORT', 'auto')
+soap_only_services = set()
+
+# Services montés dans le même processus (serve.py --in-process) : appelés directement, sans réseau
+local_services = {}
+
+# Décodage du texte des réponses SOAP (JSON pour l'extraction, repr Python pour les autres services)
+SOAP_RESULT_PARSERS = {
+    'extraction': json.loads,
+    'solvabilite': ast.literal_eval,
+    'evaluation_propriete': ast.literal_eval,
+}
+
+# Résultats et points de reprise des traitements par lot
+BATCH_RUNS_DIR = os.getenv('BATCH_RUNS_DIR', 'batch_runs')
+
+# Dépôts asynchrones (ASYNC_UPLOADS=1) : le fichier est mis en file et traité par JOB_WORKERS workers ;
+# par défaut le formulaire reste synchrone et affiche la décision
+ASYNC_UPLOADS = os.getenv('ASYNC_UPLOADS', '0') == '1'
+JOBS_DB = os.getenv('JOBS_DB', 'jobs.sqlite3')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+# Bail d'un travail en cours : passé ce délai sans battement de cœur, un autre worker le reprend
+JOB_LEASE = float(os.getenv('JOB_LEASE', '60'))
+
+# Mode dégradé : un dépôt synchrone qui trouve un service indisponible (circuit ouvert) est mis en file
+# et repris à son rétablissement, au lieu d'échouer
+DEGRADED_QUEUE = os.getenv('DEGRADED_QUEUE', '0') == '1'
+PIPELINE_SERVICES = ('extraction', 'solvabilite', 'evaluation_propriete')
+
+# Stockage temporaire des dépôts (adressé par contenu, supprimé après traitement)
+UPLOAD_STORE_DIR = os.getenv('UPLOAD_STORE_DIR', os.path.join('uploads', 'store'))
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_MB', '10')) * 1024 * 1024
+# Taille totale d'un envoi au traitement par lot (archives comprises)
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv('MAX_BATCH_UPLOAD_MB', '200')) * 1024 * 1024
+upload_store = ingestion.UploadStore(UPLOAD_STORE_DIR, MAX_UPLOAD_BYTES)
+upload_store.sweep()
+
+# PDF lus page par page : la lecture s'arrête dès que les règles trouvent tous les champs de la demande
+# (le service d'extraction n'appellera alors pas le modèle) ; PDF_EARLY_STOP=0 pour lire toutes les pages
+PDF_EARLY_STOP = os.getenv('PDF_EARLY_STOP', '1') == '1'
+
+# Journal d'audit des décisions (écrit par un thread dédié, hors du chemin de la requête)
+AUDIT_LOG_DIR = os.getenv('AUDIT_LOG_DIR', 'audit_log')
+audit_log = AuditLog(AUDIT_LOG_DIR)
+# Consultation du journal (/audit) : désactivée sans jeton ; les données personnelles sont masquées
+# sauf avec `full=1`
+AUDIT_API_TOKEN = os.getenv('AUDIT_API_TOKEN')
+AUDIT_PERSONAL_FIELDS = ('name', 'inputs', 'decision')
+
+# Cache du texte extrait, indexé par l'empreinte du fichier (TEXT_CACHE_DIR active le tier disque)
+extracted_text_cache = text_cache.TextCache(int(os.getenv('TEXT_CACHE_MEMORY_MB', '64')) * 1024 * 1024,
+                                            disk_dir=os.getenv('TEXT_CACHE_DIR') or None)
+
+
+def call_soap(nom, method, params):
+    with tracing.span('enveloppe_soap'):
+        demande = soap_codec.build_envelope(method, params)
+    with tracing.span(f'reseau.{nom}'):
+        data = soap_client.post(nom, demande, headers=tracing.headers())
+    if not data:
         return None
+    with tracing.span('analyse_reponse'):
+        result = soap_codec.read_result(data)
+        if not result:
+            return None
+        try:
+            return SOAP_RESULT_PARSERS[nom](result)
+        except (ValueError, SyntaxError) as e:
+            logger.error(f"Réponse illisible du service {nom}: {e}")
+            return None
+
 
+def register_local_service(nom, handlers):
+    """Déclare les fonctions d'un service chargé dans ce processus ({méthode: fonction})."""
+    local_services[nom] = handlers
 
-def aproval(url, demande):
-    headers = {'content-type': 'application/soap+xml; charset=utf-8'}
+
+def call_local(nom, method, params):
     try:
-        response = requests.post(url, data=demande, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except requests.RequestException as e:
-        logger.error(f"Erreur lors de la requête au service {url}: {e}")
+        with tracing.span(f'local.{nom}'):
+            return local_services[nom][method](**params)
+    except Exception as e:
+        logger.error(f"Erreur lors de l'appel local au service {nom}: {e}")
         return None
 
 
+def call_service(nom, method, params):
+    """Appelle un service avec le transport négocié et retourne son résultat structuré (None en cas d'erreur).
+
+    En mode "auto", un service sans point d'accès JSON bascule définitivement en SOAP.
+    """
+    debut = time.perf_counter()
+    if nom in local_services:
+        transport = 'local'
+    elif SERVICE_TRANSPORT == 'soap' or nom in soap_only_services:
+        transport = 'soap'
+    else:
+        transport = 'json'
+    resultat = None
+    if transport == 'local':
+        resultat = call_local(nom, method, params)
+    elif transport == 'json':
+        try:
+            with tracing.span(f'reseau.{nom}'):
+                resultat = soap_client.post_json(nom, method, params, headers=tracing.headers())
+        except TransportNotSupported:
+            logger.warning(f"Le service {nom} n'expose pas de transport JSON")
+            if SERVICE_TRANSPORT == 'auto':
+                soap_only_services.add(nom)
+                transport = 'soap'
+    if transport == 'soap':
+        resultat = call_soap(nom, method, params)
+    logger.info(f"Appel au service {nom} ({transport}) terminé en {(time.perf_counter() - debut) * 1000:.1f} ms")
+    return resultat
+
+
+def fan_out(appels):
+    """Exécute des appels indépendants ({nom: (méthode, paramètres)}) et attend tous les résultats."""
+    if ORCHESTRATION_MODE == 'concurrent' and len(appels) > 1:
+        futures = {nom: executor.submit(tracing.run_in_context(call_service), nom, method, params)
+                   for nom, (method, params) in appels.items()}
+        return {nom: future.result() for nom, future in futures.items()}
+    return {nom: call_service(nom, method, params) for nom, (method, params) in appels.items()}
+
+
+def is_approved(valeur, propertyPrice, litiges, score, financial_cap):
+    return (valeur <= propertyPrice) and (not litiges) and (score > 50) and (financial_cap > 0)
+
+
 def decision(valeur, propertyPrice, litiges, score, financial_cap, name):
-    if (valeur <= propertyPrice) and (not litiges) and (score > 50) and (financial_cap > 0):
+    if is_approved(valeur, propertyPrice, litiges, score, financial_cap):
         return f"""Cher Monsieur {name},
 
 Votre demande de prêt immobilier a été APPROUVÉE.
@@ -101,10 +241,37 @@ Cordialement,
 L'équipe des prêts immobiliers"""
 
 
-def extract_text(file_path):
+def fields_complete(text):
+    """Vrai si les règles suffisent (même seuil que le service d'extraction) : les pages suivantes sont inutiles."""
+    _, confiance, _ = RuleExtractor.extraire(clean_text(text))
+    return confiance >= RULE_EXTRACTOR_MIN_CONFIDENCE
+
+
+def extract_text(file_path, digest=None, partial=PDF_EARLY_STOP):
+    """Texte nettoyé du fichier, mis en cache par empreinte.
+
+    Avec `partial`, la lecture d'un PDF s'arrête dès que les règles trouvent tous les champs. Un texte
+    ainsi tronqué est mis en cache sous une clé à part : il n'est jamais servi à qui demande le
+    document entier (`partial=False`).
+    """
     try:
-        text = textract.process(file_path).decode("utf-8")
-        return clean_text(text)
+        digest = digest or text_cache.file_digest(file_path)
+        text = extracted_text_cache.get(digest)
+        if text is None and partial:
+            text = extracted_text_cache.get(f'{digest}-partiel')
+        if text is None:
+            interrompue = []
+
+            def stop(texte):
+                if fields_complete(texte):
+                    interrompue.append(True)
+                    return True
+                return False
+
+            with tracing.span('extraction_texte'):
+                text = clean_text(ingestion.extract_raw_text(file_path, stop=stop if partial else None))
+            extracted_text_cache.set(f'{digest}-partiel' if interrompue else digest, text)
+        return text
     except Exception as e:
         logger.error(f"Erreur lors de l'extraction du texte: {e}")
         return None
@@ -115,6 +282,137 @@ def clean_text(text):
     return re.sub(pattern, '', text)
 
 
+class PipelineError(Exception):
+    """Erreur métier d'une étape du traitement ; le message est destiné à l'utilisateur."""
+
+
+def document_format(file_path):
+    """Format du document ('pdf', 'docx'...), transmis à l'extraction pour le suivi des coûts par format."""
+    return os.path.splitext(file_path)[1].lstrip('.').lower() or None
+
+
+def process_letter(letter_text, format_document=None):
+    """Enchaîne extraction, solvabilité, évaluation et décision pour le texte d'une lettre."""
+    # Extraction des informations
+    params = {'demande': letter_text}
+    if format_document:
+        params['format_document'] = format_document
+    client_infos = call_service('extraction', 'extraire_information', params)
+    if not client_infos:
+        raise PipelineError('Erreur lors de l\'extraction des informations')
+
+    # Validation des entrées de la solvabilité et de l'évaluation avant de lancer les appels
+    if 'customerId' not in client_infos:
+        raise PipelineError('ID client manquant dans les informations extraites')
+
+    if 'description' not in client_infos or 'address' not in client_infos['description']:
+        raise PipelineError('Informations sur la propriété manquantes')
+
+    address = client_infos['description']['address']
+    complete_address = address.get('completeAdress') or address.get('completeAddress')
+    if not complete_address:
+        raise PipelineError('Adresse complète manquante')
+
+    # Vérification de la solvabilité et évaluation de la propriété (indépendantes)
+    reponses = fan_out({
+        'solvabilite': ('etudier_solvabilite', {'clientId': client_infos['customerId']}),
+        'evaluation_propriete': ('evaluer_propriete', {
+            'ville': address['town'],
+            'taille_logement': int(client_infos['description']['surfaceArea'].split('m')[0]),
+            'adresse': complete_address,
+        }),
+    })
+
+    solvabilite_result = reponses['solvabilite']
+    if not solvabilite_result:
+        raise PipelineError('Erreur lors de la vérification de solvabilité')
+
+    evalPropriete_result = reponses['evaluation_propriete']
+    if not evalPropriete_result:
+        raise PipelineError('Erreur lors de l\'évaluation de la propriété')
+
+    # Prise de décision
+    with tracing.span('decision'):
+        decision_message = decision(
+            evalPropriete_result['valeur'],
+            client_infos['propertyPrice'],
+            evalPropriete_result['litiges'],
+            solvabilite_result['score'],
+            solvabilite_result['financial_cap'],
+            client_infos['name']
+        )
+
+    # Conservation de la décision et de ses entrées pour l'audit
+    audit_log.append({
+        'source': 'composite',
+        'request_id': tracing.request_id(),
+        'format_document': format_document,
+        'name': client_infos['name'],
+        'approved': is_approved(evalPropriete_result['valeur'], client_infos['propertyPrice'],
+                                evalPropriete_result['litiges'], solvabilite_result['score'],
+                                solvabilite_result['financial_cap']),
+        'inputs': {
+            'client_infos': client_infos,
+            'solvabilite': solvabilite_result,
+            'evaluation_propriete': evalPropriete_result,
+        },
+        'decision': decision_message,
+    }, customer_id=client_infos['customerId'])
+
+    return {
+        'client_infos': client_infos,
+        'solvabilite': solvabilite_result,
+        'evaluation_propriete': evalPropriete_result,
+        'decision': decision_message,
+    }
+
+
+def process_document(file_path):
+    """Traite un document déjà enregistré sur disque (utilisé par le mode batch)."""
+    letter_text = extract_text(file_path)
+    if not letter_text:
+        raise PipelineError('Impossible d\'extraire le texte du fichier')
+    return process_letter(letter_text, document_format(file_path))
+
+
+def process_job(file_path):
+    """Traitement d'un travail asynchrone ; le dépôt est libéré une fois traité.
+
+    Un travail qui trouve un service indisponible est reporté (et garde son dépôt) jusqu'au prochain essai.
+    """
+    reporte = False
+    try:
+        with tracing.request(service='composite'):
+            return process_document(file_path)
+    except CircuitOpen as e:
+        reporte = True
+        raise JobDeferred(max(e.retry_after, 1.0), str(e))
+    finally:
+        if not reporte:
+            upload_store.release(file_path)
+
+
+job_queue = JobQueue(JOBS_DB, process_job, workers=JOB_WORKERS, lease=JOB_LEASE)
+
+
+def degraded_upload(file_path, erreur):
+    """Réponse à un dépôt lorsqu'un service est indisponible ; le dépôt est libéré ou confié à la file."""
+    if DEGRADED_QUEUE:
+        job_id = job_queue.enqueue(file_path, delay=erreur.retry_after)
+        return render_template('upload.html', job_id=job_id,
+                               result=f"Service {erreur.nom} momentanément indisponible : demande enregistrée, "
+                                      f"elle sera traitée dès son rétablissement")
+    upload_store.release(file_path)
+    flash(str(erreur), 'error')
+    return render_template('upload.html')
+
+
+@app.before_request
+def start_job_workers():
+    # Démarrage paresseux : seul le processus qui sert les requêtes draine la file
+    job_queue.start()
+
+
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
     if request.method == 'POST':
@@ -127,113 +425,182 @@ def upload_file():
             flash('Aucun fichier n\'a été sélectionné', 'error')
             return render_template('upload.html')
 
-        if file:
-            file_path = os.path.join('uploads', file.filename)
-            file.save(file_path)
+        try:
+            file_path, digest = upload_store.save(file.stream, file.filename)
+        except ingestion.UploadTooLarge as e:
+            flash(str(e), 'error')
+            return render_template('upload.html')
+
+        if ASYNC_UPLOADS:
+            job_id = job_queue.enqueue(file_path)
+            return render_template('upload.html', result="Demande enregistrée, traitement en cours", job_id=job_id)
+
+        # Échec immédiat (ou mise en file) plutôt qu'une attente du délai de lecture d'un service en panne
+        indisponibles = soap_client.unavailable(PIPELINE_SERVICES)
+        if indisponibles:
+            nom, delai = max(indisponibles.items(), key=lambda item: item[1])
+            return degraded_upload(file_path, CircuitOpen(nom, delai))
 
-            letter_text = extract_text(file_path)
+        confie = False
+        try:
+            letter_text = extract_text(file_path, digest)
             if not letter_text:
                 flash('Impossible d\'extraire le texte du fichier', 'error')
                 return render_template('upload.html')
-
-            # Extraction des informations
-            extract_enveloppeSOAP = f'''\
-                <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:spy="spyne.examples.hello">
-                    <soapenv:Header/>
-                    <soapenv:Body>
-                        <spy:extraire_information>
-                            <spy:demande>{letter_text}</spy:demande>
-                        </spy:extraire_information>
-                    </soapenv:Body>
-                </soapenv:Envelope>'''
-
-            extract_data_result = aproval(SERVICE_EXTRACT_INFO_URL, extract_enveloppeSOAP)
-            if not extract_data_result:
-                flash('Erreur lors de l\'extraction des informations', 'error')
+            try:
+                resultat = process_letter(letter_text, document_format(file_path))
+            except PipelineError as e:
+                flash(str(e), 'error')
                 return render_template('upload.html')
+            except CircuitOpen as e:
+                confie = True
+                return degraded_upload(file_path, e)
+        finally:
+            if not confie:
+                upload_store.release(file_path)
 
-            result = getResults(extract_data_result)
-            if not result:
-                flash('Erreur lors du traitement des informations extraites', 'error')
-                return render_template('upload.html')
+        return render_template('upload.html', result="Traitement terminé avec succès",
+                               decision=resultat['decision'])
 
-            client_infos = json.loads(result)
+    return render_template('upload.html')
 
-            # Vérification de la solvabilité
-            if 'customerId' not in client_infos:
-                flash('ID client manquant dans les informations extraites', 'error')
-                return render_template('upload.html')
 
-            solvabilite_enveloppeSOAP = f'''\
-                <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:spy="spyne.examples.hello">
-                    <soapenv:Header/>
-                    <soapenv:Body>
-                        <spy:etudier_solvabilite>
-                            <spy:clientId>{client_infos['customerId']}</spy:clientId>
-                        </spy:etudier_solvabilite>
-                    </soapenv:Body>
-                </soapenv:Envelope>'''
-
-            solvabilite_data_result = aproval(SERVICE_SOLVABILITE_URL, solvabilite_enveloppeSOAP)
-            if not solvabilite_data_result:
-                flash('Erreur lors de la vérification de solvabilité', 'error')
-                return render_template('upload.html')
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'Aucun fichier n\'a été sélectionné'}), 400
+    try:
+        file_path, _ = upload_store.save(file.stream, file.filename)
+    except ingestion.UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    job_id = job_queue.enqueue(file_path)
+    return jsonify({'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
 
-            result = getResults(solvabilite_data_result)
-            if not result:
-                flash('Erreur lors du traitement des données de solvabilité', 'error')
-                return render_template('upload.html')
 
-            solvabilite_result = ast.literal_eval(result)
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Travail inconnu'}), 404
+    return jsonify(job)
 
-            # Évaluation de la propriété
-            if 'description' not in client_infos or 'address' not in client_infos['description']:
-                flash('Informations sur la propriété manquantes', 'error')
-                return render_template('upload.html')
 
-            address = client_infos['description']['address']
-            complete_address = address.get('completeAdress') or address.get('completeAddress')
-            if not complete_address:
-                flash('Adresse complète manquante', 'error')
-                return render_template('upload.html')
+@app.route('/batch', methods=['POST'])
+def batch_upload():
+    """Traitement par lot : une archive zip ou plusieurs fichiers, résultats renvoyés en JSON Lines.
 
-            evalPropriete_enveloppeSOAP = f'''\
-                <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:spy="spyne.examples.hello">
-                    <soapenv:Header/>
-                    <soapenv:Body>
-                        <spy:evaluer_propriete>
-                            <spy:ville>{address['town']}</spy:ville>
-                            <spy:taille_logement>{int(client_infos['description']['surfaceArea'].split('m')[0])}</spy:taille_logement>
-                            <spy:adresse>{complete_address}</spy:adresse>
-                        </spy:evaluer_propriete>
-                    </soapenv:Body>
-                </soapenv:Envelope>'''
-
-            evalPropriete_data_result = aproval(SERVICE_EVAL_PROPRIETE_URL, evalPropriete_enveloppeSOAP)
-            if not evalPropriete_data_result:
-                flash('Erreur lors de l\'évaluation de la propriété', 'error')
-                return render_template('upload.html')
+    Le paramètre `run_id` identifie le lot : un lot interrompu reprend là où il s'était arrêté.
+    """
+    fichiers = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not fichiers:
+        return jsonify({'error': 'Aucun fichier n\'a été fourni'}), 400
 
-            result = getResults(evalPropriete_data_result)
-            if not result:
-                flash('Erreur lors du traitement des données d\'évaluation de la propriété', 'error')
-                return render_template('upload.html')
+    run_id = secure_filename(request.form.get('run_id') or uuid.uuid4().hex)
+    try:
+        concurrency = int(request.form.get('concurrency', batch.DEFAULT_CONCURRENCY))
+    except ValueError:
+        return jsonify({'error': 'Le paramètre concurrency doit être un entier'}), 400
+    concurrency = max(1, min(concurrency, batch.MAX_CONCURRENCY))
+    staging_dir = tempfile.mkdtemp(prefix=f'batch-{run_id}-')
+    restant = MAX_BATCH_UPLOAD_BYTES
+    try:
+        for f in fichiers:
+            taille, _ = ingestion.copy_bounded(f.stream, os.path.join(staging_dir, secure_filename(f.filename)),
+                                               restant)
+            restant -= taille
+    except ingestion.UploadTooLarge:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return jsonify({'error': f"Le lot dépasse la taille maximale de {MAX_BATCH_UPLOAD_BYTES // (1024 * 1024)} Mo"}), 413
+
+    os.makedirs(BATCH_RUNS_DIR, exist_ok=True)
+    output_path = os.path.join(BATCH_RUNS_DIR, f'{run_id}.jsonl')
+
+    def generer():
+        try:
+            documents = batch.iter_documents(staging_dir, max_bytes=MAX_UPLOAD_BYTES)
+            for record in batch.run_batch(documents, process_document, output_path, concurrency=concurrency):
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    return Response(generer(), mimetype='application/x-ndjson', headers={'X-Batch-Run-Id': run_id})
+
+
+def audit_instant(valeur):
+    """Borne d'une recherche dans le journal d'audit : secondes epoch ou date ISO 8601 (UTC si sans fuseau)."""
+    if not valeur:
+        return None
+    try:
+        return float(valeur)
+    except ValueError:
+        instant = datetime.datetime.fromisoformat(valeur)
+        if instant.tzinfo is None:
+            instant = instant.replace(tzinfo=datetime.timezone.utc)
+        return instant.timestamp()
+
+
+def audit_autorise():
+    """Vrai si la requête présente le jeton AUDIT_API_TOKEN (en-tête `Authorization: Bearer <jeton>`)."""
+    schema, _, jeton = request.headers.get('Authorization', '').partition(' ')
+    return schema.lower() == 'bearer' and hmac.compare_digest(jeton.encode('utf-8'), AUDIT_API_TOKEN.encode('utf-8'))
+
+
+def audit_masque(record):
+    """Enregistrement sans nom, entrées ni lettre de décision (identifiant client et décision conservés)."""
+    masque = {cle: valeur for cle, valeur in record.items() if cle not in AUDIT_PERSONAL_FIELDS}
+    if isinstance(masque.get('result'), dict):
+        masque['result'] = {cle: valeur for cle, valeur in masque['result'].items() if cle != 'client_name'}
+    return masque
+
+
+@app.route('/audit', methods=['GET'])
+@app.route('/audit/<customer_id>', methods=['GET'])
+def audit(customer_id=None):
+    """Décisions enregistrées, par client ou par plage de dates (`start`, `end`, `limit`, `full`)."""
+    if not AUDIT_API_TOKEN:
+        return jsonify({'error': 'Consultation du journal d\'audit désactivée (AUDIT_API_TOKEN)'}), 404
+    if not audit_autorise():
+        return jsonify({'error': 'Jeton d\'accès au journal d\'audit manquant ou invalide'}), 401
+    try:
+        start, end = audit_instant(request.args.get('start')), audit_instant(request.args.get('end'))
+        limit = int(request.args.get('limit', '1000'))
+    except ValueError as e:
+        return jsonify({'error': f'Paramètre invalide : {e}'}), 400
+    if customer_id is not None:
+        records = audit_log.history(customer_id, start, end, limit)
+    else:
+        records = list(itertools.islice(audit_log.scan(start, end), limit))
+    if request.args.get('full') != '1':
+        records = [audit_masque(record) for record in records]
+    return jsonify({'records': records, 'count': len(records)})
 
-            evalPropriete_result = ast.literal_eval(result)
 
-            # Prise de décision
-            decision_message = decision(
-                evalPropriete_result['valeur'],
-                client_infos['propertyPrice'],
-                evalPropriete_result['litiges'],
-                solvabilite_result['score'],
-                solvabilite_result['financial_cap'],
-                client_infos['name']
-            )
+@app.route('/health', methods=['GET'])
+def health():
+    indisponibles = soap_client.unavailable()
+    return jsonify({'status': 'degraded' if indisponibles else 'ok', 'service': 'composite', 'pid': os.getpid(),
+                    'job_queue_depth': job_queue.depth(), 'unavailable_services': sorted(indisponibles)})
 
-            return render_template('upload.html', result="Traitement terminé avec succès", decision=decision_message)
 
-    return render_template('upload.html')
+@app.route('/stats/pool', methods=['GET'])
+def pool_stats():
+    return jsonify(soap_client.pool_stats())
+
+
+@app.route('/stats/circuits', methods=['GET'])
+def circuit_stats():
+    return jsonify(soap_client.circuit_stats())
+
+
+@app.route('/stats/audit', methods=['GET'])
+def audit_stats():
+    return jsonify(audit_log.stats())
+
+
+@app.route('/stats/extraction', methods=['GET'])
+def extraction_stats():
+    return jsonify({'formats': ingestion.extraction_stats.snapshot(), 'text_cache': extracted_text_cache.stats()})
 
 
 if __name__ == '__main__':
@@ -0,0 +1,292 @@
+"""Réception des fichiers déposés et extraction de leur texte.
+
+Les dépôts sont lus par blocs avec une taille maximale et stockés chacun dans
+son propre fichier (empreinte SHA-256 et suffixe unique), supprimé par le
+traitement qui l'a reçu : plusieurs workers peuvent partager le répertoire. Le texte des
+fichiers TXT et DOCX est extrait dans le processus ; les PDF sont lus page
+par page (pdftotext, plusieurs pages en parallèle) ; textract n'est lancé
+que pour les autres formats, et n'est importé qu'à ce moment.
+"""
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import zipfile
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Lecture des PDF : pages extraites en parallèle (un processus pdftotext par page), au plus PDF_MAX_PAGES pages
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(os.cpu_count() or 2)))
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '0')) or None
+PDF_PAGE_TIMEOUT = float(os.getenv('PDF_PAGE_TIMEOUT', '30'))
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class UploadTooLarge(Exception):
+    """Le fichier déposé dépasse la taille autorisée."""
+
+
+def copy_bounded(stream, path, max_bytes):
+    """Copie le flux par blocs dans `path` en contrôlant la taille ; retourne (octets copiés, empreinte SHA-256).
+
+    Au-delà de `max_bytes`, le fichier partiel est supprimé et UploadTooLarge est levée.
+    """
+    digest = hashlib.sha256()
+    taille = 0
+    try:
+        with open(path, 'wb') as f:
+            while True:
+                bloc = stream.read(CHUNK_SIZE)
+                if not bloc:
+                    break
+                taille += len(bloc)
+                if taille > max_bytes:
+                    raise UploadTooLarge(f"Le fichier dépasse la taille maximale de {max_bytes // (1024 * 1024)} Mo")
+                digest.update(bloc)
+                f.write(bloc)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return taille, digest.hexdigest()
+
+
+class UploadStore:
+    """Stockage temporaire des dépôts : un fichier par dépôt, nommé par son empreinte et un suffixe unique.
+
+    Deux dépôts identiques (reçus par le même worker ou non) ont chacun leur fichier : libérer l'un ne
+    touche pas l'autre. L'empreinte reste disponible pour les caches indexés par contenu.
+    """
+
+    def __init__(self, directory, max_bytes, ttl=24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, stream, filename):
+        """Copie le flux par blocs en contrôlant la taille ; retourne (chemin, empreinte)."""
+        extension = os.path.splitext(filename)[1].lower()
+        tmp_path = os.path.join(self.directory, f".upload-{uuid.uuid4().hex}")
+        _, digest = copy_bounded(stream, tmp_path, self.max_bytes)
+        path = os.path.join(self.directory, f"{digest}-{uuid.uuid4().hex[:12]}{extension}")
+        os.replace(tmp_path, path)
+        return path, digest
+
+    def release(self, path):
+        """Supprime le fichier d'un dépôt une fois son traitement terminé."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        """Supprime les fichiers plus vieux que `ttl` (restes d'un arrêt brutal)."""
+        limite = time.time() - self.ttl
+        supprimes = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < limite:
+                    os.remove(entry.path)
+                    supprimes += 1
+            except FileNotFoundError:
+                pass  # supprimé entre-temps par un autre worker
+        return supprimes
+
+
+def _read_txt(file_path):
+    with open(file_path, 'rb') as f:
+        contenu = f.read()
+    try:
+        return contenu.decode('utf-8')
+    except UnicodeDecodeError:
+        return contenu.decode('latin-1')
+
+
+def _read_docx(file_path):
+    """Texte d'un DOCX, dans le même format que textract (docx2txt) : paragraphes séparés par des lignes vides."""
+    morceaux = []
+    with zipfile.ZipFile(file_path) as docx:
+        noms = docx.namelist()
+        parties = ([n for n in noms if n.startswith('word/header')] + ['word/document.xml']
+                   + [n for n in noms if n.startswith('word/footer')])
+        for partie in parties:
+            if partie not in noms:
+                continue
+            for element in ET.fromstring(docx.read(partie)).iter():
+                if element.tag == f'{_W}t':
+                    morceaux.append(element.text or '')
+                elif element.tag == f'{_W}tab':
+                    morceaux.append('\t')
+                elif element.tag in (f'{_W}br', f'{_W}cr'):
+                    morceaux.append('\n')
+                elif element.tag == f'{_W}p':
+                    morceaux.append('\n\n')
+    return ''.join(morceaux)
+
+
+def _read_textract(file_path):
+    import textract  # lent à importer et inutile pour les formats lus dans le processus
+    return textract.process(file_path).decode('utf-8')
+
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _pool_pdf():
+    """Pool partagé par tous les documents : le nombre de pdftotext simultanés reste borné à PDF_WORKERS."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix='pdf')
+        return _pdf_pool
+
+
+def pdf_page_count(file_path):
+    """Nombre de pages d'un PDF (pdfinfo), ou None si pdfinfo est absent ou échoue."""
+    if shutil.which('pdfinfo') is None:
+        return None
+    try:
+        sortie = subprocess.run(['pdfinfo', file_path], capture_output=True, timeout=PDF_PAGE_TIMEOUT,
+                                check=True).stdout.decode('utf-8', 'replace')
+    except (OSError, subprocess.SubprocessError):
+        return None
+    for ligne in sortie.splitlines():
+        if ligne.startswith('Pages:'):
+            return int(ligne.split()[1])
+    return None
+
+
+def _pdf_page(file_path, numero):
+    debut = time.perf_counter()
+    sortie = subprocess.run(['pdftotext', '-f', str(numero), '-l', str(numero), file_path, '-'],
+                            capture_output=True, timeout=PDF_PAGE_TIMEOUT, check=True).stdout
+    # Même sortie que textract : texte UTF-8 de la page suivi d'un saut de page
+    return sortie.decode('utf-8'), (time.perf_counter() - debut) * 1000
+
+
+def iter_pdf_pages(file_path, workers=None, max_pages=None):
+    """Texte d'un PDF page par page, dans l'ordre : (numéro, nombre de pages lues, texte, durée en ms).
+
+    Au plus `workers` pages sont lues d'avance ; refermer le générateur annule les pages pas encore
+    commencées. Sans pdftotext ni pdfinfo, le document est lu d'un bloc par textract (une seule « page »).
+    """
+    pages = pdf_page_count(file_path) if shutil.which('pdftotext') else None
+    if pages is None:
+        debut = time.perf_counter()
+        yield 1, 1, _read_textract(file_path), (time.perf_counter() - debut) * 1000
+        return
+    pages = min(pages, max_pages or PDF_MAX_PAGES or pages)
+    avance = max(1, workers or PDF_WORKERS)
+    pool = _pool_pdf()
+    en_cours = deque()
+    suivante = 1
+    try:
+        while suivante <= pages or en_cours:
+            while suivante <= pages and len(en_cours) < avance:
+                en_cours.append((suivante, pool.submit(_pdf_page, file_path, suivante)))
+                suivante += 1
+            numero, future = en_cours.popleft()
+            texte, duree_ms = future.result()
+            yield numero, pages, texte, duree_ms
+    finally:
+        for _, future in en_cours:
+            future.cancel()
+
+
+def read_pdf(file_path, stop=None, workers=None, max_pages=None):
+    """Texte d'un PDF ; `stop(texte lu jusqu'ici)` peut interrompre la lecture avant la dernière page.
+
+    `stop` n'est pas consulté après la dernière page : s'il a répondu vrai, le texte est incomplet.
+    Retourne (texte, durées des pages lues en ms).
+    """
+    morceaux, durees = [], []
+    pages = iter_pdf_pages(file_path, workers, max_pages)
+    try:
+        for numero, total, texte, duree_ms in pages:
+            morceaux.append(texte)
+            durees.append(duree_ms)
+            logger.debug(f"Page {numero} de {os.path.basename(file_path)} extraite en {duree_ms:.1f} ms")
+            if stop is not None and numero < total and stop(''.join(morceaux)):
+                logger.info(f"Lecture de {os.path.basename(file_path)} arrêtée après la page {numero}")
+                break
+    finally:
+        pages.close()
+    return ''.join(morceaux), durees
+
+
+READERS = {
+    '.txt': _read_txt,
+    '.docx': _read_docx,
+}
+
+
+class ExtractionStats:
+    """Durée d'extraction du texte par format de fichier (et par page pour les PDF)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, extension, duree_ms, durees_pages=None):
+        with self._lock:
+            stats = self._stats.setdefault(extension, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['count'] += 1
+            stats['total_ms'] += duree_ms
+            stats['max_ms'] = max(stats['max_ms'], duree_ms)
+            if durees_pages:
+                stats['pages'] = stats.get('pages', 0) + len(durees_pages)
+                stats['page_total_ms'] = stats.get('page_total_ms', 0.0) + sum(durees_pages)
+                stats['page_max_ms'] = max(stats.get('page_max_ms', 0.0), max(durees_pages))
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for extension, s in self._stats.items():
+                snapshot[extension] = {
+                    'count': s['count'],
+                    'avg_ms': round(s['total_ms'] / s['count'], 2),
+                    'max_ms': round(s['max_ms'], 2),
+                }
+                if 'pages' in s:
+                    snapshot[extension].update(pages=s['pages'],
+                                               page_avg_ms=round(s['page_total_ms'] / s['pages'], 2),
+                                               page_max_ms=round(s['page_max_ms'], 2))
+            return snapshot
+
+
+extraction_stats = ExtractionStats()
+
+
+def extract_raw_text(file_path, stop=None):
+    """Extrait le texte brut d'un fichier en évitant textract pour les formats lisibles dans le processus.
+
+    Pour un PDF, `stop(texte lu jusqu'ici)` peut arrêter la lecture avant la dernière page.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    debut = time.perf_counter()
+    durees_pages = None
+    try:
+        if extension == '.pdf':
+            texte, durees_pages = read_pdf(file_path, stop)
+            return texte
+        return READERS.get(extension, _read_textract)(file_path)
+    finally:
+        duree_ms = (time.perf_counter() - debut) * 1000
+        extraction_stats.record(extension or 'inconnu', duree_ms, durees_pages)
+        if durees_pages:
+            logger.info(f"Extraction du texte ({extension}) en {duree_ms:.1f} ms, {len(durees_pages)} pages "
+                        f"(max {max(durees_pages):.1f} ms par page)")
+        else:
+            logger.info(f"Extraction du texte ({extension or 'inconnu'}) en {duree_ms:.1f} ms")
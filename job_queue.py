@@ -0,0 +1,242 @@
+"""File de traitements asynchrones persistée dans SQLite.
+
+Le dépôt d'un fichier crée un travail et rend la main immédiatement ; un pool
+de workers exécute la chaîne de traitement en arrière-plan. Les travaux
+survivent à un redémarrage. Chaque travail en cours porte son propriétaire
+(hôte, pid) et un bail renouvelé par un battement de cœur : il n'est remis en
+file que si son bail a expiré ou si son processus n'existe plus, ce qui permet
+à plusieurs workers gunicorn de partager la même base.
+Un travail qui lève JobDeferred (service indisponible par exemple) est remis
+en file et n'est repris qu'après le délai indiqué.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import socket
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    result TEXT,
+    error TEXT,
+    not_before REAL,
+    owner TEXT,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created);
+"""
+
+
+class JobDeferred(Exception):
+    """Le travail ne peut pas être traité maintenant : il est remis en file pour `delay` secondes."""
+
+    def __init__(self, delay, message=''):
+        super().__init__(message)
+        self.delay = delay
+
+
+class JobQueue:
+    """File de travaux SQLite drainée par `workers` threads appelant `process(file_path)`."""
+
+    def __init__(self, db_path, process, workers=2, poll_interval=1.0, lease=60.0):
+        self.db_path = db_path
+        self.process = process
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._owner = None
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+            # Bases créées avant l'ajout des reports
+            colonnes = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for colonne, type_sql in (('not_before', 'REAL'), ('owner', 'TEXT'), ('heartbeat', 'REAL')):
+                if colonne not in colonnes:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {colonne} {type_sql}')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @property
+    def owner(self):
+        """Propriétaire des travaux réservés par ce processus (fixé après un éventuel fork)."""
+        if self._owner is None or self._owner.split(':')[1] != str(os.getpid()):
+            self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        return self._owner
+
+    def start(self):
+        """Démarre les workers (idempotent) après avoir remis en file les travaux interrompus."""
+        with self._start_lock:
+            if self._threads:
+                return
+            self._recover()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _recover(self):
+        """Remet en file les travaux en cours dont le bail a expiré ou dont le processus (sur cet hôte) est mort.
+
+        Les travaux d'un autre worker vivant gardent leur bail et ne sont pas repris.
+        """
+        conn = self._connection()
+        expires = conn.execute(
+            'UPDATE jobs SET status = ?, started = NULL, owner = NULL, heartbeat = NULL '
+            'WHERE status = ? AND (heartbeat IS NULL OR heartbeat < ?)',
+            (QUEUED, RUNNING, time.time() - self.lease)).rowcount
+        orphelins = 0
+        for row in conn.execute('SELECT DISTINCT owner FROM jobs WHERE status = ? AND owner IS NOT NULL',
+                                (RUNNING,)).fetchall():
+            if not _owner_alive(row['owner']):
+                orphelins += conn.execute(
+                    'UPDATE jobs SET status = ?, started = NULL, owner = NULL, heartbeat = NULL '
+                    'WHERE status = ? AND owner = ?', (QUEUED, RUNNING, row['owner'])).rowcount
+        if expires + orphelins:
+            logger.info(f"{expires + orphelins} travaux interrompus remis en file")
+        return expires + orphelins
+
+    def _heartbeat(self):
+        """Renouvelle le bail des travaux en cours de ce processus ; reprend ceux des processus disparus."""
+        while not self._stop.wait(self.lease / 3):
+            try:
+                self._connection().execute('UPDATE jobs SET heartbeat = ? WHERE status = ? AND owner = ?',
+                                           (time.time(), RUNNING, self.owner))
+                self._recover()
+            except sqlite3.Error as e:
+                logger.error(f"Renouvellement des baux de la file de travaux impossible: {e}")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, file_path, delay=0):
+        """Ajoute un travail, traité au plus tôt dans `delay` secondes, et retourne son identifiant."""
+        job_id = uuid.uuid4().hex
+        maintenant = time.time()
+        self._connection().execute(
+            'INSERT INTO jobs (id, status, file_path, created, not_before) VALUES (?, ?, ?, ?, ?)',
+            (job_id, QUEUED, file_path, maintenant, maintenant + delay if delay else None))
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Statut d'un travail (et son résultat une fois terminé), ou None s'il est inconnu."""
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {'id': row['id'], 'status': row['status'], 'created': row['created'],
+               'started': row['started'], 'finished': row['finished']}
+        if row['status'] == DONE:
+            job['result'] = json.loads(row['result'])
+        elif row['status'] == ERROR:
+            job['error'] = row['error']
+        elif row['status'] == QUEUED:
+            job['position'] = self._connection().execute(
+                'SELECT COUNT(*) FROM jobs WHERE status = ? AND created < ?', (QUEUED, row['created'])).fetchone()[0]
+            if row['not_before'] is not None and row['not_before'] > time.time():
+                job['not_before'] = row['not_before']
+                job['reason'] = row['error']
+        return job
+
+    def depth(self):
+        return self._connection().execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (QUEUED,)).fetchone()[0]
+
+    def _claim(self):
+        """Réserve le plus ancien travail en attente ; la transaction IMMEDIATE le rend exclusif entre processus."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT id, file_path FROM jobs WHERE status = ? '
+                               'AND (not_before IS NULL OR not_before <= ?) ORDER BY created LIMIT 1',
+                               (QUEUED, time.time())).fetchone()
+            if row is not None:
+                maintenant = time.time()
+                conn.execute('UPDATE jobs SET status = ?, started = ?, owner = ?, heartbeat = ? WHERE id = ?',
+                             (RUNNING, maintenant, self.owner, maintenant, row['id']))
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+        return row
+
+    def _finish(self, job_id, status, result=None, error=None):
+        self._connection().execute(
+            'UPDATE jobs SET status = ?, finished = ?, result = ?, error = ?, owner = NULL, heartbeat = NULL '
+            'WHERE id = ? AND owner = ?', (status, time.time(), result, error, job_id, self.owner))
+
+    def _defer(self, job_id, delay, reason):
+        self._connection().execute(
+            'UPDATE jobs SET status = ?, started = NULL, not_before = ?, error = ?, owner = NULL, heartbeat = NULL '
+            'WHERE id = ? AND owner = ?', (QUEUED, time.time() + delay, reason, job_id, self.owner))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"Lecture de la file de travaux impossible: {e}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            try:
+                result = self.process(job['file_path'])
+                self._finish(job['id'], DONE, result=json.dumps(result, ensure_ascii=False))
+            except JobDeferred as e:
+                logger.warning(f"Travail {job['id']} reporté de {e.delay:.0f} s: {e}")
+                self._defer(job['id'], e.delay, str(e))
+            except Exception as e:
+                logger.error(f"Échec du travail {job['id']}: {e}")
+                self._finish(job['id'], ERROR, error=str(e))
+
+
+def _owner_alive(owner):
+    """Faux seulement si le propriétaire est un processus de cet hôte qui n'existe plus."""
+    hote, _, reste = owner.partition(':')
+    pid = reste.partition(':')[0]
+    if hote != socket.gethostname() or not pid.isdigit():
+        return True  # autre hôte : seul le bail fait foi
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
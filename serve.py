@@ -0,0 +1,196 @@
+"""Lanceur unifié du composite et des services SOAP.
+
+Chaque application est servie par gunicorn (workers gthread : plusieurs
+processus, plusieurs threads par processus) sur son port habituel, avec un
+point de santé `/health` et les métriques Prometheus sur `/metrics`. SIGTERM
+arrête proprement tous les serveurs : les requêtes en cours se terminent dans
+la limite de `--graceful-timeout`.
+
+En mode `--in-process`, le composite et tous les services sont montés dans un
+même serveur et le composite appelle les services directement, sans passer
+par le réseau local.
+
+Usage :
+    python serve.py [--workers 2] [--threads 8] [--in-process] [--only solvabilite evaluation_propriete]
+"""
+import os
+import sys
+import json
+import signal
+import logging
+import argparse
+import importlib
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+
+RACINE = os.path.dirname(os.path.abspath(__file__))
+SERVICES_DIR = os.path.join(RACINE, 'services')
+
+logger = logging.getLogger(__name__)
+
+# nom -> (module, port, chemin SOAP) ; le service d'approbation est servi à la racine
+SERVICES = {
+    'extraction': ('extract', 8002, 'extractInformationsService'),
+    'solvabilite': ('verification_solvabilite_service', 8003, 'solvabiliteService'),
+    'evaluation_propriete': ('evaluation_propriete_service', 8004, 'evaluationProprieteService'),
+    'approbation': ('aprobation_service', 8000, None),
+}
+COMPOSITE_PORT = 5000
+
+
+class PathDispatcher:
+    """Répartit les requêtes WSGI selon le préfixe du chemin et répond à `/health` et `/metrics`.
+
+    Avec `default_health`, `/health` est laissé à l'application par défaut, qui a sa propre route
+    (le composite y ajoute l'état des disjoncteurs et la profondeur de la file de travaux).
+    """
+
+    def __init__(self, name, routes, default=None, default_health=False):
+        self.name = name
+        self.routes = sorted(routes.items(), key=lambda route: len(route[0]), reverse=True)
+        self.default = default
+        self.default_health = default_health and default is not None
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '') or '/'
+        if path == '/health' and not self.default_health:
+            body = json.dumps({'status': 'ok', 'service': self.name, 'pid': os.getpid()}).encode('utf-8')
+            start_response('200 OK', [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+            return [body]
+        if path == '/metrics':
+            from utils import tracing
+            return tracing.metrics_app(environ, start_response)
+        for prefix, app in self.routes:
+            if path == prefix or path.startswith(prefix + '/'):
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + prefix
+                environ['PATH_INFO'] = path[len(prefix):]
+                return app(environ, start_response)
+        if self.default is not None:
+            return self.default(environ, start_response)
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not Found']
+
+
+def _import_service(nom):
+    if SERVICES_DIR not in sys.path:
+        sys.path.insert(0, SERVICES_DIR)
+    return importlib.import_module(SERVICES[nom][0])
+
+
+def service_routes(nom):
+    """Routes WSGI d'un service : application SOAP et, si elle existe, application JSON."""
+    module = _import_service(nom)
+    from utils import tracing
+    chemin = SERVICES[nom][2]
+    # Application WSGI construite à l'import du module, une fois par processus
+    soap_app = tracing.TracingMiddleware(module.wsgi_application, nom)
+    if chemin is None:
+        return {}, soap_app
+    routes = {f'/{chemin}': soap_app}
+    if hasattr(module, 'json_application'):
+        routes[f'/{chemin}Json'] = tracing.TracingMiddleware(module.json_application, nom)
+    return routes, None
+
+
+def build_app(cible):
+    """Construit l'application WSGI d'une cible : un service, 'composite' ou 'tout' (mode in-process)."""
+    if cible in SERVICES:
+        routes, default = service_routes(cible)
+        return PathDispatcher(cible, routes, default)
+
+    if RACINE not in sys.path:
+        sys.path.insert(0, RACINE)
+    import composite
+
+    if cible == 'composite':
+        return PathDispatcher('composite', {}, composite.app, default_health=True)
+
+    routes = {}
+    for nom in SERVICES:
+        service_routes_nom, racine = service_routes(nom)
+        routes.update(service_routes_nom)
+        if racine is not None:
+            routes[f'/{nom}'] = racine
+        module = _import_service(nom)
+        if hasattr(module, 'json_application'):
+            composite.register_local_service(nom, module.json_application.handlers)
+    return PathDispatcher('tout', routes, composite.app, default_health=True)
+
+
+class GunicornServer(BaseApplication):
+    """Serveur gunicorn dont l'application est construite dans chaque worker (pas de préchargement)."""
+
+    def __init__(self, cible, options):
+        self.cible = cible
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for cle, valeur in self.options.items():
+            self.cfg.set(cle, valeur)
+
+    def load(self):
+        app = build_app(self.cible)
+        # Après l'import des modules, qui configurent la journalisation
+        from utils import tracing
+        tracing.configure(self.cible)
+        return app
+
+
+def run_server(cible, bind, workers, threads, graceful_timeout):
+    GunicornServer(cible, {
+        'bind': bind,
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'graceful_timeout': graceful_timeout,
+        'proc_name': f'pret-{cible}',
+    }).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lance le composite et les services")
+    parser.add_argument('--host', default=os.getenv('SERVE_HOST', '0.0.0.0'))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVE_WORKERS', '2')))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('SERVE_THREADS', '8')))
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.getenv('SERVE_GRACEFUL_TIMEOUT', '30')))
+    parser.add_argument('--in-process', action='store_true',
+                        help="Monte tous les services dans le processus du composite (sans appels réseau)")
+    parser.add_argument('--only', nargs='+', choices=list(SERVICES) + ['composite'],
+                        help="Ne lance que les applications indiquées")
+    args = parser.parse_args(argv)
+
+    if args.in_process:
+        cibles = {'tout': COMPOSITE_PORT}
+    else:
+        cibles = {nom: port for nom, (_, port, _) in SERVICES.items()}
+        cibles['composite'] = COMPOSITE_PORT
+        if args.only:
+            cibles = {nom: port for nom, port in cibles.items() if nom in args.only}
+
+    processus = []
+    for cible, port in cibles.items():
+        p = multiprocessing.Process(target=run_server, name=cible,
+                                    args=(cible, f'{args.host}:{port}', args.workers, args.threads,
+                                          args.graceful_timeout))
+        p.start()
+        processus.append(p)
+        print(f"{cible} : http://{args.host}:{port} ({args.workers} workers x {args.threads} threads)")
+
+    def arreter(signum, frame):
+        # gunicorn termine les requêtes en cours sur SIGTERM avant de quitter
+        for p in processus:
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, arreter)
+    signal.signal(signal.SIGINT, arreter)
+
+    for p in processus:
+        p.join()
+    return max((p.exitcode or 0) for p in processus)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
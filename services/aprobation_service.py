@@ -1,7 +1,11 @@
+import os
 import json
-from spyne import Application, rpc, ServiceBase, Unicode, Float
+import threading
+from spyne import Application, rpc, ServiceBase, Unicode, Float, Array, Fault
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
+from utils import risk_engine, tracing
+from utils.audit_log import AuditLog
 
 
 class CreditPolicies:
@@ -40,65 +44,155 @@ class RiskAnalyzer:
 
 class LoanDecisionMaker:
     """Classe pour prendre une décision d'approbation basée sur le risque et les politiques."""
+    MAX_RISK_SCORE = 75
+    MAX_DEFAULT_PROBABILITY = 0.35
+    BASE_RATE = 0.03
+    TERM_YEARS = 30
 
-    @staticmethod
-    def decide_approval(risk_score, meets_policies, default_probability):
+    @classmethod
+    def decide_approval(cls, risk_score, meets_policies, default_probability):
         """Prend une décision d'approbation en fonction du score de risque et de la probabilité de défaut."""
         if not meets_policies:
             return False, "Les critères de base ne sont pas respectés"
-        if risk_score > 75:
+        if risk_score > cls.MAX_RISK_SCORE:
             return False, "Niveau de risque évalué trop élevé"
-        if default_probability > 0.35:
+        if default_probability > cls.MAX_DEFAULT_PROBABILITY:
             return False, "Probabilité de défaut élevée"
         return True, "Demande approuvée"
 
-    @staticmethod
-    def determine_loan_terms(approved, loan_amount, credit_score):
+    @classmethod
+    def determine_loan_terms(cls, approved, loan_amount, credit_score):
         """Définit les termes de prêt si la demande est approuvée."""
         if not approved:
             return None
-        base_rate = 0.03
+        base_rate = cls.BASE_RATE
         adjustment_factor = (750 - credit_score) / 1100
         interest_rate = base_rate + adjustment_factor
         return {
             "loan_amount": loan_amount,
             "interest_rate": round(interest_rate, 4),
-            "term_years": 30
+            "term_years": cls.TERM_YEARS
         }
 
 
-class ApprovalDecisionService(ServiceBase):
-    """Service SOAP pour l'évaluation de la demande de crédit."""
+# Politique courante pour le moteur vectorisé (mêmes seuils que le chemin scalaire)
+PRODUCTION_POLICY = risk_engine.PolicyParameters(
+    min_credit_score=CreditPolicies.MIN_CREDIT_SCORE,
+    max_debt_to_income_ratio=CreditPolicies.MAX_DEBT_TO_INCOME_RATIO,
+    min_property_value_to_loan_ratio=CreditPolicies.MIN_PROPERTY_VALUE_TO_LOAN_RATIO,
+    max_risk_score=LoanDecisionMaker.MAX_RISK_SCORE,
+    max_default_probability=LoanDecisionMaker.MAX_DEFAULT_PROBABILITY,
+    base_rate=LoanDecisionMaker.BASE_RATE,
+    term_years=LoanDecisionMaker.TERM_YEARS,
+)
 
-    @rpc(Unicode, Float, Float, Float, Float, _returns=Unicode)
-    def make_decision(ctx, client_name, credit_score, debt_to_income_ratio, property_value, loan_amount):
-        # Vérification des critères de base
-        meets_policies = CreditPolicies.meets_basic_requirements(
-            credit_score, debt_to_income_ratio, property_value, loan_amount
-        )
 
-        # Analyse des risques et probabilité de défaut
-        risk_score = RiskAnalyzer.calculate_risk_score(credit_score, debt_to_income_ratio, property_value, loan_amount)
-        default_probability = RiskAnalyzer.predict_default_probability(credit_score, debt_to_income_ratio)
+# Journal d'audit des décisions, partagé avec le composite (écrit hors du chemin de la requête).
+# Ouvert à la première décision : importer PRODUCTION_POLICY ne crée pas de répertoire
+_audit_log = None
+_audit_lock = threading.Lock()
+
+
+def audit_log():
+    global _audit_log
+    with _audit_lock:
+        if _audit_log is None:
+            _audit_log = AuditLog(os.getenv('AUDIT_LOG_DIR', 'audit_log'))
+        return _audit_log
+
+
+def audit_decision(result, credit_score, debt_to_income_ratio, property_value, loan_amount, customer_id=None):
+    """Enregistre une décision ; `customer_id` (identifiant client, pas le nom) sert aux recherches par client."""
+    audit_log().append({
+        'source': 'approbation',
+        'request_id': tracing.request_id(),
+        'name': result['client_name'],
+        'inputs': {
+            'credit_score': credit_score,
+            'debt_to_income_ratio': debt_to_income_ratio,
+            'property_value': property_value,
+            'loan_amount': loan_amount,
+        },
+        'result': result,
+    }, customer_id=customer_id)
+
+
+def evaluer_demande(client_name, credit_score, debt_to_income_ratio, property_value, loan_amount):
+    """Décision d'approbation d'une demande, sans enregistrement."""
+    # Vérification des critères de base
+    meets_policies = CreditPolicies.meets_basic_requirements(
+        credit_score, debt_to_income_ratio, property_value, loan_amount
+    )
 
-        # Décision d'approbation
-        approved, reason = LoanDecisionMaker.decide_approval(risk_score, meets_policies, default_probability)
+    # Analyse des risques et probabilité de défaut
+    risk_score = RiskAnalyzer.calculate_risk_score(credit_score, debt_to_income_ratio, property_value, loan_amount)
+    default_probability = RiskAnalyzer.predict_default_probability(credit_score, debt_to_income_ratio)
 
-        # Termes du prêt si approuvé
-        terms = LoanDecisionMaker.determine_loan_terms(approved, loan_amount, credit_score) if approved else None
+    # Décision d'approbation
+    approved, reason = LoanDecisionMaker.decide_approval(risk_score, meets_policies, default_probability)
 
-        # Compilation des résultats dans un dictionnaire JSON
-        result = {
-            "client_name": client_name,
-            "approved": approved,
-            "reason": reason,
-            "risk_score": risk_score,
-            "default_probability": default_probability,
-            "loan_terms": terms
-        }
+    # Termes du prêt si approuvé
+    terms = LoanDecisionMaker.determine_loan_terms(approved, loan_amount, credit_score) if approved else None
 
+    # Compilation des résultats dans un dictionnaire JSON
+    return {
+        "client_name": client_name,
+        "approved": approved,
+        "reason": reason,
+        "risk_score": risk_score,
+        "default_probability": default_probability,
+        "loan_terms": terms
+    }
+
+
+def verifier_colonnes(longueur=None, facultatives=False, **colonnes):
+    """Lève une faute client si une colonne manque ou n'a pas la même longueur que les autres.
+
+    Avec `facultatives`, une colonne absente est acceptée ; `longueur` impose la longueur attendue.
+    """
+    for nom, valeurs in colonnes.items():
+        if valeurs is None:
+            if facultatives:
+                continue
+            raise Fault('Client.InvalidInput', f"Colonne manquante : {nom}")
+        if longueur is None:
+            longueur = len(valeurs)
+        elif len(valeurs) != longueur:
+            raise Fault('Client.InvalidInput',
+                        f"La colonne {nom} contient {len(valeurs)} valeurs au lieu de {longueur}")
+
+
+class ApprovalDecisionService(ServiceBase):
+    """Service SOAP pour l'évaluation de la demande de crédit."""
+
+    @rpc(Unicode, Float, Float, Float, Float, Unicode, _returns=Unicode)
+    def make_decision(ctx, client_name, credit_score, debt_to_income_ratio, property_value, loan_amount,
+                      customer_id):
+        """`customer_id` (facultatif) : identifiant du client, sous lequel la décision est journalisée."""
+        result = evaluer_demande(client_name, credit_score, debt_to_income_ratio, property_value, loan_amount)
+        audit_decision(result, credit_score, debt_to_income_ratio, property_value, loan_amount, customer_id)
         return json.dumps(result)
 
+    @rpc(Array(Unicode), Array(Float), Array(Float), Array(Float), Array(Float), Array(Unicode), _returns=Unicode)
+    def make_decisions_batch(ctx, client_names, credit_scores, debt_to_income_ratios, property_values,
+                             loan_amounts, customer_ids):
+        """Évalue un lot de demandes (colonnes de même longueur) ; retourne une liste JSON de décisions.
+
+        `customer_ids` (facultatif) : identifiants des clients, dans le même ordre.
+        """
+        verifier_colonnes(credit_scores=credit_scores, debt_to_income_ratios=debt_to_income_ratios,
+                          property_values=property_values, loan_amounts=loan_amounts)
+        verifier_colonnes(len(credit_scores), client_names=client_names, customer_ids=customer_ids,
+                          facultatives=True)
+        result = risk_engine.score_batch(credit_scores, debt_to_income_ratios, property_values, loan_amounts,
+                                         PRODUCTION_POLICY)
+        decisions = list(risk_engine.iter_decisions(result, client_names))
+        customer_ids = customer_ids or [None] * len(decisions)
+        for decision, entrees, customer_id in zip(decisions, zip(credit_scores, debt_to_income_ratios,
+                                                                 property_values, loan_amounts), customer_ids):
+            audit_decision(decision, *entrees, customer_id=customer_id)
+        return json.dumps(decisions)
+
 
 # Configuration de l'application Spyne
 application = Application(
@@ -107,13 +201,15 @@ application = Application(
     in_protocol=Soap11(validator='lxml'),
     out_protocol=Soap11()
 )
+# Durées d'analyse, de traitement et de sérialisation des appels, exposées sur /metrics
+tracing.instrument_spyne(application, 'approbation')
+# Application WSGI construite une seule fois, partagée par serve.py et le lancement direct
+wsgi_application = WsgiApplication(application)
 
 
-# Fonction de test pour vérifier le fonctionnement du service
+# Fonction de test pour vérifier le fonctionnement du service (décision non journalisée)
 def test_service():
-    service = ApprovalDecisionService()
-    result = service.make_decision(
-        None,  # ctx
+    result = evaluer_demande(
         "John Doe",  # client_name
         720,  # credit score
         0.35,  # debt to income ratio
@@ -121,7 +217,7 @@ def test_service():
         250000  # loan amount
     )
     print("Résultat de la décision d'approbation :")
-    print(result)
+    print(json.dumps(result))
 
 
 if __name__ == '__main__':
@@ -129,7 +225,9 @@ if __name__ == '__main__':
     test_service()
 
     # Démarrer le serveur SOAP
-    wsgi_app = WsgiApplication(application)
+    tracing.configure('approbation')
+    # Le middleware sert aussi /metrics, le service étant monté à la racine
+    wsgi_app = tracing.TracingMiddleware(wsgi_application, 'approbation')
     from wsgiref.simple_server import make_server
 
     server = make_server('0.0.0.0', 8000, wsgi_app)
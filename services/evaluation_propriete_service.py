@@ -1,65 +1,77 @@
-from spyne.util.wsgi_wrapper import run_twisted
 from spyne.server.wsgi import WsgiApplication
 from spyne.protocol.soap import Soap11
 from spyne import Application, rpc, ServiceBase, Unicode, Integer, Iterable
+import os
 import sys
+import json
 import logging
+from utils import reference_index
+from utils import tracing
+from utils.json_transport import JsonApplication
 
 # Configuration de base du journal de débogage
 logging.basicConfig(level=logging.DEBUG)
 
+# Prix de référence et registre des litiges : indexés au démarrage, rechargés quand les fichiers changent
+referentiel = reference_index.ReferentielSurveille(
+    os.getenv('PROPERTY_REFERENCE_DIR') or None,
+    seuil=float(os.getenv('LITIGE_SEUIL_SIMILARITE', '0.85')),
+    intervalle=float(os.getenv('PROPERTY_REFERENCE_RELOAD_INTERVAL', '5'))
+)
+referentiel.demarrer()
+
 
 class LitigeVerifier:
     """Classe pour vérifier si une adresse est associée à des litiges."""
 
-    _adresses_avec_litiges = {
-        "45 boulevard de mousse, Neuilly-Plaisance",
-        "19 Rue de la republique, Versailles",
-        "11 rue des saints, Paris"
-    }
-
     @classmethod
-    def verifier(cls, adresse_logement):
-        """Vérifie si l'adresse fournie est dans la liste des adresses avec litiges."""
-        return adresse_logement in cls._adresses_avec_litiges
+    def verifier(cls, adresse_logement, instantane=None):
+        """Vérifie si l'adresse fournie (ou une graphie proche) figure au registre des litiges."""
+        return (instantane or referentiel.courant).litiges.contient(adresse_logement)
 
 
 class EstimationPropriete:
     """Classe pour estimer la valeur d'une propriété."""
 
-    _valeurs_reference = {
-        "Versailles": 300,
-        "Paris": 350,
-        "Bordeaux": 200
-    }
-
     def __init__(self, taille_logement, ville, adresse):
         self.taille_logement = taille_logement
         self.ville = ville
         self.adresse = adresse
+        # Un seul instantané pour toute l'estimation, même si un rechargement intervient entre-temps
+        self.referentiel = referentiel.courant
 
     def calculer_valeur(self):
         """Calcule la valeur estimée de la propriété."""
-        valeur_par_metre_carre = self._valeurs_reference.get(self.ville, 200)
+        valeur_par_metre_carre = self.referentiel.prix.prix_m2(self.ville, self.adresse)
         return self.taille_logement * valeur_par_metre_carre
 
     def generer_estimation(self):
         """Génère un dictionnaire avec la valeur estimée et le statut des litiges."""
         return {
             "valeur": self.calculer_valeur(),
-            "litiges": LitigeVerifier.verifier(self.adresse)
+            "litiges": LitigeVerifier.verifier(self.adresse, self.referentiel)
         }
 
 
+def estimer_propriete(ville, taille_logement, adresse):
+    """Retourne la valeur estimée de la propriété et le statut des litiges."""
+    estimation = EstimationPropriete(int(taille_logement), ville, adresse)
+    return estimation.generer_estimation()
+
+
 class EvaluationProprieteService(ServiceBase):
     """Service SOAP pour évaluer les propriétés."""
 
     @rpc(Unicode, Integer, Unicode, _returns=Iterable(Unicode))
     def evaluer_propriete(ctx, ville, taille_logement, adresse):
-        estimation = EstimationPropriete(taille_logement, ville, adresse)
-        valeur_estimee = estimation.generer_estimation()
+        valeur_estimee = estimer_propriete(ville, taille_logement, adresse)
         yield f"{valeur_estimee}"
 
+    @rpc(_returns=Unicode)
+    def statut_referentiel(ctx):
+        """Version, mode et durée du dernier chargement du référentiel."""
+        return json.dumps(referentiel.statut())
+
 
 # Configuration de l'application Spyne
 application = Application(
@@ -68,11 +80,26 @@ application = Application(
     in_protocol=Soap11(validator='lxml'),
     out_protocol=Soap11()
 )
+# Durées d'analyse, de traitement et de sérialisation des appels, exposées sur /metrics
+tracing.instrument_spyne(application, 'evaluation_propriete')
+# Application WSGI construite une seule fois, partagée par serve.py et le lancement direct
+wsgi_application = WsgiApplication(application)
+
+# Transport JSON : mêmes traitements, résultats structurés
+json_application = JsonApplication({
+    'evaluer_propriete': estimer_propriete,
+    'statut_referentiel': referentiel.statut,
+})
 
 if __name__ == '__main__':
     # Création et démarrage de l'application WSGI
-    wsgi_app = WsgiApplication(application)
-    twisted_apps = [(wsgi_app, b'evaluationProprieteService')]
+    tracing.configure('evaluation_propriete')
+    wsgi_app = tracing.TracingMiddleware(wsgi_application, 'evaluation_propriete')
+    twisted_apps = [(wsgi_app, b'evaluationProprieteService'),
+                    (tracing.TracingMiddleware(json_application, 'evaluation_propriete'),
+                     b'evaluationProprieteServiceJson'),
+                    (tracing.metrics_app, b'metrics')]
 
     # Démarrage du serveur sur le port 8004
+    from spyne.util.wsgi_wrapper import run_twisted
     sys.exit(run_twisted(twisted_apps, 8004))
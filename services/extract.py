@@ -1,68 +1,209 @@
 from xml.sax.saxutils import escape
-from spyne.util.wsgi_wrapper import run_twisted
 from spyne.server.wsgi import WsgiApplication
 from spyne.protocol.soap import Soap11
 from spyne import Application, rpc, ServiceBase, Unicode, Integer, Iterable
+from spyne.model.fault import Fault
 import sys
-import openai
+import json
+import time
+import logging
+import threading
+import functools
 import os
 import re
 from dotenv import load_dotenv
+from utils import extraction_cache, prompt_budget, rule_extractor
+from utils.rule_extractor import RuleExtractor
+from utils.llm_client import LLMClient, FileSaturee, ReponseIncomplete
+from utils import tracing
+from utils.json_transport import JsonApplication
 load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
-openai.api_key = OPENAI_API_KEY
-
-
-def getLoanInformations(letter):
-    print(letter)
-
-    assistant_prompt = 'You are a helpful assistant.'
-
-    user_request = f"""I need to extract details regarding the tenant from this letter, 
-        including their name, customer ID, the description of the property they intend to purchase, 
-        address, monthly income and expenses, property price, etc. 
-        Here’s the text: {letter}. The extracted result should be formatted as JSON. For the keys, 
-        please apply camelCase formatting. In the description, for instance, format as JSON with the accommodation type 
-        (e.g., home or apartment), the area size (e.g., 300m2), and address information such as town, postal code, 
-        and any additional relevant property details.
-        Do not return any text with the result.
-        Only return JSON containing these elements.
-        Here’s the schema you should follow for the response:
-          {{{{"name": "John Doe",
-            "customerId": "client-00X",
-            "description": {{
-                "accommodationType": "apartment",
-                "surfaceArea": "300m2",
-                "address": {{
-                "town": "Paris",
-                "postalCode": "75015",
-                "completeAddress":"6e arrondissement de Paris"
-                }}
-            }},
-            "contact": {{
-                "phone": "+33 5 67784890",
-                "email": "johndoe@gmail.com"
-            }},
-            "loanAmount": 12000,
-            "monthlyIncome": 3700,
-            "monthlyExpenses": 2400,
-            "propertyPrice": 20000
-            }}}}"""
-
-    response = openai.ChatCompletion.create(model="gpt-3.5-turbo",
-                                            messages=[{"role": "system", "content": assistant_prompt},
-                                                      {"role": "user", "content": user_request}])
+# Toute modification du prompt doit incrémenter PROMPT_VERSION pour invalider le cache d'extraction
+PROMPT_VERSION = "2"
+MODEL = "gpt-3.5-turbo"
+
+cache = extraction_cache.ExtractionCache(
+    PROMPT_VERSION, MODEL,
+    cache_dir=os.getenv('EXTRACTION_CACHE_DIR', extraction_cache.DEFAULT_CACHE_DIR),
+    max_memory_entries=int(os.getenv('EXTRACTION_CACHE_MEMORY_ENTRIES', '512')),
+    max_disk_bytes=int(os.getenv('EXTRACTION_CACHE_DISK_BYTES', str(50 * 1024 * 1024))),
+    ttl=int(os.getenv('EXTRACTION_CACHE_TTL', str(7 * 24 * 3600)))
+)
+
+# En dessous de ce niveau de confiance, l'extraction par règles cède la place au modèle
+RULE_EXTRACTOR_MIN_CONFIDENCE = rule_extractor.MIN_CONFIDENCE
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def _openai():
+    """Module openai, importé au premier appel au modèle : les lettres lues par les règles ou le cache s'en passent."""
+    import openai
+    openai.api_key = OPENAI_API_KEY
+    return openai
+
+
+def _chat_completion(**payload):
+    return _openai().ChatCompletion.create(**payload)
+
+
+def _erreurs_reessayables():
+    erreurs = _openai().error
+    return (erreurs.RateLimitError, erreurs.APIError, erreurs.Timeout, erreurs.ServiceUnavailableError,
+            erreurs.APIConnectionError)
+
+
+def _erreur_modele(e):
+    """Vrai si `e` vient de l'API OpenAI (authentification, quota, panne) ; openai n'est importé qu'au besoin."""
+    openai = sys.modules.get('openai')
+    return openai is not None and isinstance(e, openai.error.OpenAIError)
+
+
+# Quota OpenAI du compte : les appels au-delà attendent (dans la limite de la file) ou sont refusés
+llm = LLMClient(
+    _chat_completion,
+    requests_per_minute=int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', '60')),
+    tokens_per_minute=int(os.getenv('OPENAI_TOKENS_PER_MINUTE', '90000')),
+    max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', '8')),
+    max_queue=int(os.getenv('OPENAI_MAX_QUEUE', '64')),
+    queue_timeout=float(os.getenv('OPENAI_QUEUE_TIMEOUT', '30')),
+    retries=int(os.getenv('OPENAI_RETRIES', '3')),
+    retry_on=_erreurs_reessayables
+)
+OPENAI_REQUEST_TIMEOUT = float(os.getenv('OPENAI_REQUEST_TIMEOUT', '60'))
+# Budget de jetons de la lettre envoyée au modèle et plafond de la réponse (la réponse attendue fait ~150 jetons)
+LETTER_TOKEN_BUDGET = int(os.getenv('EXTRACTION_LETTER_TOKEN_BUDGET', '1500'))
+MAX_COMPLETION_TOKENS = int(os.getenv('EXTRACTION_MAX_COMPLETION_TOKENS', '500'))
+count_tokens = prompt_budget.CompteurJetons(MODEL)
+usage = prompt_budget.SuiviUsage()
+
+_paths_lock = threading.Lock()
+extraction_paths = {"regles": 0, "cache": 0, "llm": 0}
+
+
+ASSISTANT_PROMPT = 'You are a helpful assistant.'
+
+# Exemple de réponse attendue, envoyé en JSON compact pour économiser des jetons
+RESPONSE_SCHEMA = json.dumps({
+    "name": "John Doe",
+    "customerId": "client-00X",
+    "description": {
+        "accommodationType": "apartment",
+        "surfaceArea": "300m2",
+        "address": {"town": "Paris", "postalCode": "75015", "completeAddress": "6e arrondissement de Paris"},
+    },
+    "contact": {"phone": "+33 5 67784890", "email": "johndoe@gmail.com"},
+    "loanAmount": 12000,
+    "monthlyIncome": 3700,
+    "monthlyExpenses": 2400,
+    "propertyPrice": 20000,
+}, ensure_ascii=False, separators=(',', ':'))
+
+USER_REQUEST = (
+    "I need to extract details regarding the tenant from this letter, including their name, customer ID, "
+    "the description of the property they intend to purchase, address, monthly income and expenses, "
+    "property price, etc. Here’s the text: {letter}. The extracted result should be formatted as JSON. "
+    "For the keys, please apply camelCase formatting. In the description, for instance, format as JSON with "
+    "the accommodation type (e.g., home or apartment), the area size (e.g., 300m2), and address information "
+    "such as town, postal code, and any additional relevant property details. Do not return any text with "
+    "the result. Only return JSON containing these elements. "
+    "Here’s the schema you should follow for the response: {schema}"
+)
+
+
+def getLoanInformations(letter, format_document=None):
+    # Lettres longues : en-têtes répétés et formules retirés, puis passages utiles gardés dans le budget
+    lettre, jetons_lettre, jetons_envoyes = prompt_budget.preparer_lettre(letter, LETTER_TOKEN_BUDGET, count_tokens)
+    user_request = USER_REQUEST.format(letter=lettre, schema=RESPONSE_SCHEMA)
+    jetons_prompt = count_tokens(ASSISTANT_PROMPT) + count_tokens(user_request)
+
+    debut = time.perf_counter()
+    # Les lettres identiques en cours d'extraction partagent un seul appel
+    with tracing.span('appel_modele'):
+        response = llm.appeler(cache.key(letter),
+                               cout=jetons_prompt + MAX_COMPLETION_TOKENS,
+                               model=MODEL,
+                               messages=[{"role": "system", "content": ASSISTANT_PROMPT},
+                                         {"role": "user", "content": user_request}],
+                               max_tokens=MAX_COMPLETION_TOKENS,
+                               request_timeout=OPENAI_REQUEST_TIMEOUT)
+    duree = time.perf_counter() - debut
+
+    consommation = response.get("usage") or {}
+    prompt_tokens = consommation.get("prompt_tokens", jetons_prompt)
+    completion_tokens = consommation.get("completion_tokens", 0)
+    usage.enregistrer(format_document, prompt_tokens, completion_tokens, duree,
+                      reduite=jetons_envoyes < jetons_lettre)
+    logger.info(f"Appel au modèle ({format_document or 'format inconnu'}) : {prompt_tokens} jetons de prompt "
+                f"(lettre {jetons_lettre} -> {jetons_envoyes}), {completion_tokens} jetons de réponse, "
+                f"{duree * 1000:.0f} ms")
+
     status_code = response["choices"][0]["finish_reason"]
-    assert status_code == "stop", f"The status code was {status_code}."
+    if status_code != "stop":
+        raise ReponseIncomplete(f"The status code was {status_code}.")
     return response["choices"][0]["message"]["content"]
 
 
+def extractLoanInformations(letter, format_document=None):
+    """Extrait les informations de la lettre par le chemin le moins coûteux disponible.
+
+    Ordre : règles déterministes (lettres au format de notre modèle), cache d'extraction, puis modèle.
+    Seules les réponses JSON valides du modèle sont mises en cache. Retourne (infos, chemin).
+    """
+    debut = time.perf_counter()
+    with tracing.span('extraction_regles'):
+        infos, confiance, manquants = RuleExtractor.extraire(letter)
+    if confiance >= RULE_EXTRACTOR_MIN_CONFIDENCE:
+        chemin, infos = "regles", json.dumps(infos, ensure_ascii=False)
+    else:
+        infos = cache.get(letter)
+        chemin = "cache"
+        if infos is None:
+            chemin = "llm"
+            infos = getLoanInformations(letter, format_document)
+            try:
+                json.loads(infos)
+                cache.set(letter, infos)
+            except ValueError:
+                pass
+    with _paths_lock:
+        extraction_paths[chemin] += 1
+    logger.info(f"Extraction par le chemin '{chemin}' en {(time.perf_counter() - debut) * 1000:.1f} ms "
+                f"(confiance des règles {confiance:.2f}, champs manquants: {manquants})")
+    return infos, chemin
+
+
+def extraire_informations(demande, format_document=None):
+    """Variante structurée de l'extraction pour le transport JSON."""
+    infos, _ = extractLoanInformations(demande, format_document)
+    return json.loads(infos)
+
+
 class extractInformationsService(ServiceBase):
-    @rpc(Unicode, _returns=Iterable(Unicode))
-    def extraire_information(ctx, demande):
-        infos = escape(getLoanInformations(demande))
-        yield f'''{infos}'''
+    @rpc(Unicode, Unicode, _returns=Iterable(Unicode))
+    def extraire_information(ctx, demande, format_document):
+        # Pas de générateur : une erreur levée pendant la sérialisation échapperait à Spyne (page 500 brute)
+        try:
+            infos, _ = extractLoanInformations(demande, format_document)
+        except FileSaturee as e:
+            raise Fault('Server.Overloaded', str(e))
+        except ReponseIncomplete as e:
+            raise Fault('Client.IncompleteExtraction', str(e))
+        except Exception as e:
+            if not _erreur_modele(e):
+                raise
+            logger.error(f"Modèle indisponible : {e}")
+            raise Fault('Server.LLMUnavailable', str(e))
+        return [escape(infos)]
+
+    @rpc(_returns=Unicode)
+    def statistiques_extraction(ctx):
+        with _paths_lock:
+            chemins = dict(extraction_paths)
+        return json.dumps({"paths": chemins, "cache": cache.stats(), "llm": llm.stats(), "usage": usage.stats()})
 
 
 application = Application([extractInformationsService],
@@ -70,14 +211,26 @@ application = Application([extractInformationsService],
                           in_protocol=Soap11(validator='lxml'),
                           out_protocol=Soap11()
                           )
+# Durées d'analyse, de traitement et de sérialisation des appels, exposées sur /metrics
+tracing.instrument_spyne(application, 'extraction')
+# Application WSGI construite une seule fois, partagée par serve.py et le lancement direct
+wsgi_application = WsgiApplication(application)
+
+# Transport JSON : mêmes traitements, résultats structurés
+json_application = JsonApplication({'extraire_information': extraire_informations})
 
 
 if __name__ == '__main__':
 
-    wsgi_app = WsgiApplication(application)
+    tracing.configure('extraction')
+    wsgi_app = tracing.TracingMiddleware(wsgi_application, 'extraction')
 
     twisted_apps = [
         (wsgi_app, b'extractInformationsService'),
+        (tracing.TracingMiddleware(json_application, 'extraction'), b'extractInformationsServiceJson'),
+        (tracing.metrics_app, b'metrics'),
     ]
 
+    # Twisted n'est chargé que pour le lancement direct : serve.py passe par gunicorn
+    from spyne.util.wsgi_wrapper import run_twisted
     sys.exit(run_twisted(twisted_apps, 8002))
\ No newline at end of file
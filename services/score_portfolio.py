@@ -0,0 +1,82 @@
+"""Re-scoring d'un portefeuille : CSV ou Parquet en entrée, décisions en JSON Lines en sortie.
+
+Colonnes attendues : credit_score, debt_to_income_ratio, property_value, loan_amount
+(client_name optionnelle). Le fichier est traité par blocs pour borner la mémoire.
+
+Usage :
+    python score_portfolio.py portefeuille.csv -o decisions.jsonl [--chunk-size 200000]
+"""
+import sys
+import csv
+import json
+import time
+import argparse
+import numpy as np
+from utils import risk_engine
+from aprobation_service import PRODUCTION_POLICY
+
+COLONNES = ('credit_score', 'debt_to_income_ratio', 'property_value', 'loan_amount')
+
+
+def iter_csv(path, chunk_size):
+    with open(path, newline='', encoding='utf-8') as f:
+        lecteur = csv.DictReader(f)
+        manquantes = [c for c in COLONNES if c not in (lecteur.fieldnames or [])]
+        if manquantes:
+            raise SystemExit(f"Colonnes manquantes dans {path}: {', '.join(manquantes)}")
+        avec_noms = 'client_name' in lecteur.fieldnames
+        bloc = []
+        for ligne in lecteur:
+            bloc.append(ligne)
+            if len(bloc) == chunk_size:
+                yield _colonnes_csv(bloc, avec_noms)
+                bloc = []
+        if bloc:
+            yield _colonnes_csv(bloc, avec_noms)
+
+
+def _colonnes_csv(lignes, avec_noms):
+    colonnes = {c: np.array([ligne[c] for ligne in lignes], dtype=np.float64) for c in COLONNES}
+    colonnes['client_name'] = [ligne['client_name'] for ligne in lignes] if avec_noms else None
+    return colonnes
+
+
+def iter_parquet(path, chunk_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("La lecture Parquet nécessite pyarrow : pip install pyarrow")
+    fichier = pq.ParquetFile(path)
+    avec_noms = 'client_name' in fichier.schema_arrow.names
+    for lot in fichier.iter_batches(batch_size=chunk_size,
+                                    columns=list(COLONNES) + (['client_name'] if avec_noms else [])):
+        colonnes = {c: lot.column(c).to_numpy(zero_copy_only=False).astype(np.float64) for c in COLONNES}
+        colonnes['client_name'] = lot.column('client_name').to_pylist() if avec_noms else None
+        yield colonnes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-scoring vectorisé d'un portefeuille de demandes")
+    parser.add_argument('source', help="Fichier .csv ou .parquet")
+    parser.add_argument('-o', '--output', default='decisions.jsonl')
+    parser.add_argument('--chunk-size', type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    lecteur = iter_parquet if args.source.endswith('.parquet') else iter_csv
+    total = approuves = 0
+    debut = time.perf_counter()
+    with open(args.output, 'w', encoding='utf-8') as sortie:
+        for colonnes in lecteur(args.source, args.chunk_size):
+            result = risk_engine.score_batch(colonnes['credit_score'], colonnes['debt_to_income_ratio'],
+                                             colonnes['property_value'], colonnes['loan_amount'], PRODUCTION_POLICY)
+            for decision in risk_engine.iter_decisions(result, colonnes['client_name']):
+                sortie.write(json.dumps(decision) + '\n')
+            total += len(result['approved'])
+            approuves += int(result['approved'].sum())
+    duree = time.perf_counter() - debut
+    print(f"{total} demandes évaluées ({approuves} approuvées) en {duree:.1f} s -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Stress test d'un portefeuille : rejoue toutes les demandes sous une grille de politiques de crédit.
+
+Le portefeuille (CSV ou Parquet, mêmes colonnes que score_portfolio.py) est chargé une fois en colonnes
+NumPy ; risque et probabilité de défaut, qui ne dépendent pas de la politique, sont calculés une seule fois.
+Les scénarios sont répartis entre plusieurs processus qui partagent le portefeuille (fichiers .npy
+projetés en mémoire). Pour chaque scénario : taux d'approbation, taux d'intérêt moyen et défaut attendu,
+avec leur écart à la politique de production, en JSON Lines.
+
+Chaque paramètre de la grille prend une liste de valeurs (`650,680,700`) ou un intervalle (`600:720:20`,
+bornes incluses) ; les paramètres absents gardent leur valeur de production.
+
+Usage :
+    python stress_test.py portefeuille.parquet -o scenarios.jsonl \
+        --grille min_credit_score=600:720:20 max_debt_to_income_ratio=0.36,0.43,0.5 [--workers 4]
+    python stress_test.py --synthetique 1000000 --grille min_credit_score=600:699:1
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils import risk_engine
+from aprobation_service import PRODUCTION_POLICY
+from score_portfolio import iter_csv, iter_parquet
+
+_book = None
+
+
+def charger(source, chunk_size):
+    """Colonnes du portefeuille, lues par blocs puis concaténées."""
+    lecteur = iter_parquet if source.endswith('.parquet') else iter_csv
+    blocs = list(lecteur(source, chunk_size))
+    if not blocs:
+        raise SystemExit(f"Portefeuille vide : {source}")
+    return [np.concatenate([bloc[c] for bloc in blocs]) for c in
+            ('credit_score', 'debt_to_income_ratio', 'property_value', 'loan_amount')]
+
+
+def synthetique(n, seed):
+    """Portefeuille aléatoire de `n` demandes (mêmes distributions que benchmarks/bench_scoring.py)."""
+    rng = np.random.default_rng(seed)
+    loan = rng.uniform(20000, 800000, n).round(-2)
+    return [rng.integers(300, 851, n).astype(np.float64), rng.uniform(0.05, 0.7, n).round(3),
+            (loan * rng.uniform(0.8, 2.0, n)).round(-2), loan]
+
+
+def valeurs(spec, conversion):
+    """`a,b,c` ou `debut:fin:pas` (fin incluse) -> liste de valeurs."""
+    if ':' in spec:
+        debut, fin, pas = (float(v) for v in spec.split(':'))
+        nombre = int(round((fin - debut) / pas)) + 1
+        return [conversion(round(debut + i * pas, 10)) for i in range(max(nombre, 0))]
+    return [conversion(v) for v in spec.split(',')]
+
+
+def grille(specs):
+    """Politiques du produit cartésien des valeurs données pour chaque paramètre."""
+    axes = {}
+    for spec in specs:
+        nom, _, liste = spec.partition('=')
+        if nom not in risk_engine.PolicyParameters._fields:
+            raise SystemExit(f"Paramètre inconnu : {nom} (attendus : {', '.join(risk_engine.PolicyParameters._fields)})")
+        # Les paramètres entiers en production (score minimal, durée...) restent entiers quand c'est possible
+        entier = isinstance(getattr(PRODUCTION_POLICY, nom), int)
+        axes[nom] = valeurs(liste, lambda v: int(float(v)) if entier and float(v).is_integer() else float(v))
+    noms = list(axes)
+    return [PRODUCTION_POLICY._replace(**dict(zip(noms, combinaison)))
+            for combinaison in itertools.product(*(axes[nom] for nom in noms))]
+
+
+def _initialiser(repertoire):
+    global _book
+    _book = {c: np.load(os.path.join(repertoire, f'{c}.npy'), mmap_mode='r') for c in risk_engine.BOOK_COLUMNS}
+
+
+def _evaluer(policy):
+    return risk_engine.evaluate_policy(_book, policy)
+
+
+def ecarts(resultat, reference):
+    ligne = dict(resultat)
+    for cle in ('approval_rate', 'avg_interest_rate', 'avg_default_probability', 'expected_default_amount'):
+        if resultat[cle] is not None and reference[cle] is not None:
+            ligne[f'{cle}_delta'] = resultat[cle] - reference[cle]
+    return ligne
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stress test du portefeuille sous une grille de politiques")
+    parser.add_argument('source', nargs='?', help="Fichier .csv ou .parquet")
+    parser.add_argument('--synthetique', type=int, help="Portefeuille aléatoire de N demandes au lieu d'un fichier")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--grille', nargs='+', default=[], metavar='PARAMETRE=VALEURS')
+    parser.add_argument('-o', '--output', default='scenarios.jsonl')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=200000)
+    args = parser.parse_args(argv)
+    if not args.source and not args.synthetique:
+        parser.error("indiquez un portefeuille ou --synthetique N")
+
+    debut = time.perf_counter()
+    colonnes = synthetique(args.synthetique, args.seed) if args.synthetique else charger(args.source, args.chunk_size)
+    book = risk_engine.prepare_book(*colonnes)
+    del colonnes
+    scenarios = grille(args.grille)
+    reference = risk_engine.evaluate_policy(book, PRODUCTION_POLICY)
+    print(f"{len(book['credit_score'])} demandes préparées en {time.perf_counter() - debut:.1f} s, "
+          f"{len(scenarios)} scénarios, approbation en production {reference['approval_rate']:.2%}")
+
+    debut = time.perf_counter()
+    if args.workers > 1 and len(scenarios) > 1:
+        # Les processus projettent le portefeuille en mémoire au lieu d'en recevoir chacun une copie
+        repertoire = tempfile.mkdtemp(prefix='stress-test-')
+        try:
+            for c in risk_engine.BOOK_COLUMNS:
+                np.save(os.path.join(repertoire, f'{c}.npy'), book[c])
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_initialiser,
+                                     initargs=(repertoire,)) as pool:
+                resultats = list(pool.map(_evaluer, scenarios,
+                                          chunksize=max(1, len(scenarios) // (args.workers * 4))))
+        finally:
+            shutil.rmtree(repertoire, ignore_errors=True)
+    else:
+        resultats = [risk_engine.evaluate_policy(book, policy) for policy in scenarios]
+    duree = time.perf_counter() - debut
+
+    with open(args.output, 'w', encoding='utf-8') as sortie:
+        for numero, (policy, resultat) in enumerate(zip(scenarios, resultats)):
+            sortie.write(json.dumps(dict(scenario=numero, policy=policy._asdict(),
+                                         **ecarts(resultat, reference))) + '\n')
+    print(f"{len(scenarios)} scénarios évalués en {duree:.1f} s "
+          f"({len(scenarios) * len(book['credit_score']) / max(duree, 1e-9) / 1e6:.0f} M demandes/s) -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
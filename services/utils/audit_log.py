@@ -0,0 +1,303 @@
+"""Journal d'audit des décisions : écriture en ajout seul, par blocs compressés, avec index.
+
+`append()` ne fait que mettre l'enregistrement en file ; un thread d'écriture les regroupe en blocs
+(JSON Lines compressé par zlib, avec longueur et CRC32) ajoutés à la fin du segment courant du
+processus. Chaque processus écrit ses propres segments (plusieurs workers gunicorn partagent le même
+répertoire), le segment change au-delà de `segment_bytes`. Un index SQLite associe chaque bloc à son
+intervalle de dates et aux clients qu'il contient : l'historique d'un client ou une plage de dates ne
+lit que les blocs concernés.
+
+Les blocs d'un processus arrêté brutalement après l'écriture mais avant l'indexation sont indexés au
+démarrage suivant ; le segment actif d'un processus vivant est protégé par un verrou (flock).
+"""
+import os
+import json
+import time
+import uuid
+import zlib
+import fcntl
+import queue
+import socket
+import struct
+import atexit
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'AUD1'
+_ENTETE = struct.Struct('>4sII')  # marqueur, longueur compressée, CRC32 des données compressées
+_SUFFIXE = '.seg'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    min_ts REAL NOT NULL,
+    max_ts REAL NOT NULL,
+    UNIQUE (segment, offset)
+);
+CREATE INDEX IF NOT EXISTS idx_blocks_time ON blocks (min_ts, max_ts);
+CREATE TABLE IF NOT EXISTS block_customers (
+    customer_id TEXT NOT NULL,
+    block_id INTEGER NOT NULL,
+    min_ts REAL NOT NULL,
+    max_ts REAL NOT NULL,
+    PRIMARY KEY (customer_id, block_id)
+) WITHOUT ROWID;
+"""
+
+
+class AuditLog:
+    """Journal d'audit d'un répertoire : écriture asynchrone par lots, lecture par client ou par dates."""
+
+    def __init__(self, directory, batch_size=500, max_delay=0.5, segment_bytes=64 * 1024 * 1024,
+                 max_queue=10000, put_timeout=5.0, compression_level=6, fsync=True):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.segment_bytes = segment_bytes
+        self.put_timeout = put_timeout
+        self.compression_level = compression_level
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._compteurs = {'records': 0, 'blocks': 0, 'raw_bytes': 0, 'stored_bytes': 0, 'dropped': 0}
+        self._ecrivain = None
+        self._sequence = 0
+        self._segment = None
+        self._fichier = None
+        self._thread = None
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+        self._recover()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, 'index.sqlite3'), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    # --- Écriture -------------------------------------------------------------------------------
+
+    def start(self):
+        """Démarre le thread d'écriture (idempotent)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def append(self, record, customer_id=None):
+        """Met un enregistrement en file (horodaté s'il n'a pas de champ `ts`) ; n'attend pas l'écriture.
+
+        Si la file est pleine, attend au plus `put_timeout` secondes puis abandonne l'enregistrement
+        (compté dans `dropped` et journalisé).
+        """
+        self.start()
+        record = dict(record)
+        record.setdefault('ts', time.time())
+        if customer_id is not None:
+            record['customer_id'] = customer_id
+        if record.get('customer_id') is not None:
+            record['customer_id'] = str(record['customer_id'])
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._compteurs['dropped'] += 1
+            logger.error(f"File du journal d'audit pleine, enregistrement perdu: {record.get('customer_id')}")
+
+    def flush(self):
+        """Attend que les enregistrements en file soient écrits et indexés."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.flush()
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._fichier is not None:
+            self._fichier.close()
+            self._fichier = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                premier = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            lot = [premier]
+            limite = time.monotonic() + self.max_delay
+            while len(lot) < self.batch_size:
+                restant = limite - time.monotonic()
+                if restant <= 0:
+                    break
+                try:
+                    lot.append(self._queue.get(timeout=restant))
+                except queue.Empty:
+                    break
+            try:
+                self._write_block(lot)
+            except Exception as e:
+                logger.error(f"Écriture du journal d'audit impossible ({len(lot)} enregistrements): {e}")
+            finally:
+                for _ in lot:
+                    self._queue.task_done()
+
+    def _segment_courant(self, taille_bloc):
+        if self._fichier is not None and self._fichier.tell() + taille_bloc > self.segment_bytes \
+                and self._fichier.tell() > 0:
+            self._fichier.close()
+            self._fichier = None
+        if self._fichier is None:
+            if self._ecrivain is None:
+                # Préfixe propre au processus (fixé après un éventuel fork) : plusieurs écrivains partagent
+                # le répertoire sans partager de segment
+                self._ecrivain = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            self._sequence += 1
+            self._segment = f"{self._ecrivain}-{self._sequence:06d}{_SUFFIXE}"
+            self._fichier = open(os.path.join(self.directory, self._segment), 'ab')
+            fcntl.flock(self._fichier, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return self._fichier
+
+    def _write_block(self, lot):
+        brut = '\n'.join(json.dumps(r, ensure_ascii=False, separators=(',', ':')) for r in lot).encode('utf-8')
+        donnees = zlib.compress(brut, self.compression_level)
+        bloc = _ENTETE.pack(_MAGIC, len(donnees), zlib.crc32(donnees)) + donnees
+        fichier = self._segment_courant(len(bloc))
+        offset = fichier.tell()
+        fichier.write(bloc)
+        fichier.flush()
+        if self.fsync:
+            os.fsync(fichier.fileno())
+        self._index_block(self._segment, offset, len(bloc), lot)
+        with self._lock:
+            self._compteurs['records'] += len(lot)
+            self._compteurs['blocks'] += 1
+            self._compteurs['raw_bytes'] += len(brut)
+            self._compteurs['stored_bytes'] += len(bloc)
+
+    def _index_block(self, segment, offset, longueur, lot):
+        clients = {}
+        for r in lot:
+            client = r.get('customer_id')
+            if client is not None:
+                bornes = clients.setdefault(client, [r['ts'], r['ts']])
+                bornes[0], bornes[1] = min(bornes[0], r['ts']), max(bornes[1], r['ts'])
+        instants = [r['ts'] for r in lot]
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            curseur = conn.execute(
+                'INSERT OR IGNORE INTO blocks (segment, offset, length, records, min_ts, max_ts) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (segment, offset, longueur, len(lot), min(instants), max(instants)))
+            if curseur.rowcount:
+                conn.executemany('INSERT OR IGNORE INTO block_customers VALUES (?, ?, ?, ?)',
+                                 [(client, curseur.lastrowid, debut, fin) for client, (debut, fin) in clients.items()])
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _recover(self):
+        """Indexe les blocs écrits mais pas indexés des segments dont l'écrivain n'est plus actif."""
+        conn = self._connection()
+        fins = dict(conn.execute('SELECT segment, MAX(offset + length) FROM blocks GROUP BY segment'))
+        for nom in sorted(os.listdir(self.directory)):
+            if not nom.endswith(_SUFFIXE):
+                continue
+            chemin = os.path.join(self.directory, nom)
+            debut = fins.get(nom, 0)
+            if os.path.getsize(chemin) <= debut:
+                continue
+            with open(chemin, 'rb') as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # segment actif d'un autre processus
+                f.seek(debut)
+                recuperes = 0
+                for offset, longueur, lot in _iter_blocks(f):
+                    self._index_block(nom, offset, longueur, lot)
+                    recuperes += len(lot)
+                if recuperes:
+                    logger.warning(f"{recuperes} enregistrements d'audit non indexés récupérés dans {nom}")
+
+    # --- Lecture --------------------------------------------------------------------------------
+
+    def _read_block(self, segment, offset, longueur, motif=None):
+        """Enregistrements d'un bloc ; avec `motif`, seules les lignes qui le contiennent sont décodées."""
+        with open(os.path.join(self.directory, segment), 'rb') as f:
+            f.seek(offset)
+            contenu = f.read(longueur)
+        marqueur, taille, crc = _ENTETE.unpack_from(contenu)
+        donnees = contenu[_ENTETE.size:_ENTETE.size + taille]
+        if marqueur != _MAGIC or zlib.crc32(donnees) != crc:
+            raise ValueError(f"Bloc d'audit corrompu : {segment} à l'offset {offset}")
+        return [json.loads(ligne) for ligne in zlib.decompress(donnees).split(b'\n')
+                if motif is None or motif in ligne]
+
+    def history(self, customer_id, start=None, end=None, limit=None):
+        """Enregistrements d'un client, du plus ancien au plus récent (bornes `start`/`end` en secondes epoch)."""
+        debut, fin = _bornes(start, end)
+        client = str(customer_id)
+        # Les lignes sont écrites sans espaces : le champ du client se repère sans décoder le JSON
+        motif = b'"customer_id":' + json.dumps(client, ensure_ascii=False).encode('utf-8')
+        blocs = self._connection().execute(
+            'SELECT b.segment, b.offset, b.length FROM block_customers c JOIN blocks b ON b.id = c.block_id '
+            'WHERE c.customer_id = ? AND c.max_ts >= ? AND c.min_ts <= ? ORDER BY c.min_ts',
+            (client, debut, fin)).fetchall()
+        resultats = [r for bloc in blocs for r in self._read_block(*bloc, motif)
+                     if r.get('customer_id') == client and debut <= r['ts'] <= fin]
+        resultats.sort(key=lambda r: r['ts'])
+        return resultats[:limit] if limit else resultats
+
+    def scan(self, start=None, end=None):
+        """Enregistrements d'une plage de dates, bloc par bloc (ordre approximatif entre écrivains)."""
+        debut, fin = _bornes(start, end)
+        blocs = self._connection().execute(
+            'SELECT segment, offset, length FROM blocks WHERE min_ts <= ? AND max_ts >= ? ORDER BY min_ts',
+            (fin, debut)).fetchall()
+        for bloc in blocs:
+            for r in self._read_block(*bloc):
+                if debut <= r['ts'] <= fin:
+                    yield r
+
+    def stats(self):
+        with self._lock:
+            compteurs = dict(self._compteurs)
+        compteurs['queue'] = self._queue.qsize()
+        if compteurs['raw_bytes']:
+            compteurs['compression_ratio'] = round(compteurs['raw_bytes'] / compteurs['stored_bytes'], 2)
+        return compteurs
+
+
+def _bornes(start, end):
+    return (float('-inf') if start is None else start), (float('inf') if end is None else end)
+
+
+def _iter_blocks(f):
+    """Blocs complets et intègres à partir de la position courante : (offset, longueur, enregistrements)."""
+    while True:
+        offset = f.tell()
+        entete = f.read(_ENTETE.size)
+        if len(entete) < _ENTETE.size:
+            return
+        marqueur, taille, crc = _ENTETE.unpack(entete)
+        donnees = f.read(taille)
+        if marqueur != _MAGIC or len(donnees) < taille or zlib.crc32(donnees) != crc:
+            return  # fin d'écriture interrompue
+        yield offset, _ENTETE.size + taille, [json.loads(l) for l in zlib.decompress(donnees).split(b'\n')]
@@ -0,0 +1,257 @@
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Cache mémoire borné (éviction LRU) avec durée de vie optionnelle par entrée."""
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # clé -> (expiration, valeur)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Retourne la valeur associée à `key`, ou `default` si absente ou expirée."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expire_at, value = entry
+            if expire_at is not None and expire_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Enregistre une valeur ; `ttl` (secondes) remplace la durée de vie par défaut."""
+        ttl = self.ttl if ttl is None else ttl
+        expire_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expire_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Supprime une entrée ; retourne True si elle était présente."""
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SharedInvalidations:
+    """Invalidations partagées entre les processus d'un même hôte, par une table SQLite.
+
+    Chaque invalidation est une ligne numérotée (`cle` NULL : tout le cache). Un cache la publie
+    puis chaque processus applique les lignes publiées depuis son dernier passage, au plus une fois
+    toutes les `poll_interval` secondes : une requête indexée sur le numéro, faite par un seul thread
+    pendant que les autres continuent de lire. Les lignes plus anciennes que `retention` secondes
+    sont purgées ; un processus qui en aurait manqué vide tout son cache.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS invalidations (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        cle TEXT,
+        instant REAL NOT NULL
+    );
+    """
+
+    def __init__(self, db_path, poll_interval=0.1, retention=86400.0):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def last_seq(self):
+        return self._connection().execute('SELECT COALESCE(MAX(seq), 0) FROM invalidations').fetchone()[0]
+
+    def publish(self, keys=None):
+        """Publie l'invalidation de `keys` (de tout le cache si None)."""
+        maintenant = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if keys is None:
+                conn.execute('INSERT INTO invalidations (cle, instant) VALUES (NULL, ?)', (maintenant,))
+            else:
+                conn.executemany('INSERT INTO invalidations (cle, instant) VALUES (?, ?)',
+                                 ((str(key), maintenant) for key in keys))
+            conn.execute('DELETE FROM invalidations WHERE instant < ?', (maintenant - self.retention,))
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+
+    def since(self, seq):
+        """(dernier numéro, clés invalidées depuis `seq`) ; clés None si tout le cache doit être vidé."""
+        conn = self._connection()
+        rows = conn.execute('SELECT seq, cle FROM invalidations WHERE seq > ? ORDER BY seq', (seq,)).fetchall()
+        if not rows:
+            return seq, set()
+        # Numéros manquants : lignes purgées avant d'avoir été lues, on ne sait plus quelles clés ont changé
+        if rows[0][0] > seq + 1 or any(cle is None for _, cle in rows):
+            return rows[-1][0], None
+        return rows[-1][0], {cle for _, cle in rows}
+
+
+class ReadThroughCache:
+    """Cache en lecture seule devant une source lente : `loader(clé)` n'est appelé qu'en cas d'absence.
+
+    Mesure le nombre et la durée cumulée des lectures servies par le cache et par la source.
+    Avec `invalidations` (SharedInvalidations), une invalidation faite dans un processus s'applique
+    aux caches de tous les processus qui partagent la table, dans les `poll_interval` secondes.
+
+    Une valeur chargée pendant une invalidation n'est pas mise en cache : la génération, incrémentée
+    à chaque invalidation, est relevée avant le chargement et comparée avant l'écriture.
+    """
+
+    def __init__(self, loader, max_entries=1024, ttl=None, invalidations=None):
+        self.loader = loader
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self._latency = {'hit': [0, 0.0], 'miss': [0, 0.0]}  # nombre, durée cumulée (s)
+        self.invalidations = invalidations
+        self._seq = invalidations.last_seq() if invalidations is not None else 0
+        self._prochain_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self._generation = 0
+        self._generation_lock = threading.Lock()
+        self.shared_invalidations = 0
+
+    def _sync(self):
+        """Applique les invalidations publiées par les autres processus, au plus toutes les `poll_interval` s."""
+        if self.invalidations is None or time.monotonic() < self._prochain_sync:
+            return
+        # Un seul thread interroge la table ; les autres lisent le cache sans attendre
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._seq, keys = self.invalidations.since(self._seq)
+            self._prochain_sync = time.monotonic() + self.invalidations.poll_interval
+        finally:
+            self._sync_lock.release()
+        if keys is None:
+            self._invalider_local(None)
+            self.shared_invalidations += 1
+        elif keys:
+            self.shared_invalidations += self._invalider_local(keys)
+
+    def _invalider_local(self, keys):
+        """Supprime les clés (toutes si None) et change de génération ; retourne le nombre d'entrées supprimées."""
+        with self._generation_lock:
+            self._generation += 1
+            if keys is None:
+                self.cache.clear()
+                return 0
+            return sum(1 for key in keys if self.cache.invalidate(key))
+
+    def _stocker(self, values, generation):
+        """Met les valeurs en cache sauf si une invalidation a eu lieu depuis `generation`."""
+        with self._generation_lock:
+            if self._generation != generation:
+                return
+            for key, value in values.items():
+                self.cache.set(key, value)
+
+    def _record(self, kind, count, duration):
+        with self._lock:
+            self._latency[kind][0] += count
+            self._latency[kind][1] += duration
+
+    def get(self, key):
+        self._sync()
+        debut = time.perf_counter()
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            self._record('hit', 1, time.perf_counter() - debut)
+            return value
+        generation = self._generation
+        value = self.loader(key)
+        self._stocker({key: value}, generation)
+        self._record('miss', 1, time.perf_counter() - debut)
+        return value
+
+    def get_many(self, keys, bulk_loader):
+        """Lecture groupée : les absents sont chargés en un seul appel à `bulk_loader(clés)` -> {clé: valeur}."""
+        self._sync()
+        debut = time.perf_counter()
+        values, absents = {}, []
+        for key in dict.fromkeys(keys):
+            value = self.cache.get(key, _MISSING)
+            if value is _MISSING:
+                absents.append(key)
+            else:
+                values[key] = value
+        self._record('hit', len(values), time.perf_counter() - debut)
+        if absents:
+            debut = time.perf_counter()
+            generation = self._generation
+            charges = bulk_loader(absents)
+            self._stocker(charges, generation)
+            values.update(charges)
+            self._record('miss', len(absents), time.perf_counter() - debut)
+        return values
+
+    def invalidate(self, keys):
+        """Invalide les clés données ; retourne le nombre d'entrées supprimées."""
+        keys = list(keys)
+        if self.invalidations is not None:
+            self.invalidations.publish(keys)
+        return self._invalider_local(keys)
+
+    def invalidate_all(self):
+        if self.invalidations is not None:
+            self.invalidations.publish()
+        self._invalider_local(None)
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self._lock:
+            for kind, (count, total) in self._latency.items():
+                stats[f'{kind}_avg_us'] = round(total / count * 1e6, 1) if count else 0.0
+        if self.invalidations is not None:
+            stats['shared_invalidations'] = self.shared_invalidations
+        return stats
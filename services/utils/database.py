@@ -1,3 +1,9 @@
+import os
+import sys
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+from collections import namedtuple
 from spyne import Application, rpc, ServiceBase, ComplexModel, Unicode
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
@@ -44,3 +50,131 @@ class clientFinancialDatabase:
         revenu_mensuel = client_data.get("revenu_mensuel", 0)
         depense_mensuel = client_data.get("depense_mensuel", 0)
         return revenu_mensuel, depense_mensuel
+
+
+# Enregistrement combiné : (dettes, retards, faillite), revenu mensuel, dépense mensuelle
+ClientRecord = namedtuple('ClientRecord', ['credit_data', 'revenu_mensuel', 'depense_mensuel'])
+
+DEFAULT_CREDIT_DATA = (0, 0, False)
+
+
+class CreditStore(ABC):
+    """Accès aux données de crédit et financières d'un client, en une seule lecture."""
+
+    @abstractmethod
+    def get(self, client_id):
+        """Retourne le ClientRecord d'un client (valeurs par défaut s'il est inconnu)."""
+
+    def get_many(self, client_ids):
+        """Retourne {client_id: ClientRecord} pour un lot de clients."""
+        return {client_id: self.get(client_id) for client_id in client_ids}
+
+
+class InMemoryCreditStore(CreditStore):
+    """Données d'exemple des classes CreditBureauDatabase et clientFinancialDatabase."""
+
+    def get(self, client_id):
+        revenu_mensuel, depense_mensuel = clientFinancialDatabase.get_client_financial_data(client_id)
+        return ClientRecord(CreditBureauDatabase.get_client_credit_data(client_id), revenu_mensuel, depense_mensuel)
+
+
+class SQLiteCreditStore(CreditStore):
+    """Stockage SQLite indexé sur l'identifiant client, avec une connexion par thread de worker.
+
+    Les données ne sont jamais chargées en mémoire : chaque lecture est une requête indexée,
+    ce qui permet de servir des millions de clients.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS credit_bureau (
+        client_id TEXT PRIMARY KEY,
+        dettes NUMERIC NOT NULL,
+        retards INTEGER NOT NULL,
+        faillite INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS client_financial (
+        client_id TEXT PRIMARY KEY,
+        nom TEXT,
+        adresse TEXT,
+        revenu_mensuel NUMERIC NOT NULL,
+        depense_mensuel NUMERIC NOT NULL
+    ) WITHOUT ROWID;
+    """
+
+    # Une seule requête pour les deux tables ; les jointures externes conservent les clients inconnus
+    _SELECT = """
+    SELECT k.client_id, c.dettes, c.retards, c.faillite, f.revenu_mensuel, f.depense_mensuel
+    FROM ({keys}) AS k
+    LEFT JOIN credit_bureau AS c ON c.client_id = k.client_id
+    LEFT JOIN client_financial AS f ON f.client_id = k.client_id
+    """
+    _BATCH_SIZE = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with sqlite3.connect(path) as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute('PRAGMA query_only = ON')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _record(row):
+        _, dettes, retards, faillite, revenu, depense = row
+        credit_data = DEFAULT_CREDIT_DATA if dettes is None else (dettes, retards, bool(faillite))
+        return ClientRecord(credit_data, revenu or 0, depense or 0)
+
+    def get(self, client_id):
+        row = self._connection().execute(self._SELECT.format(keys='SELECT ? AS client_id'), (client_id,)).fetchone()
+        return self._record(row)
+
+    def get_many(self, client_ids):
+        client_ids = list(dict.fromkeys(client_ids))
+        records = {}
+        for i in range(0, len(client_ids), self._BATCH_SIZE):
+            lot = client_ids[i:i + self._BATCH_SIZE]
+            keys = 'SELECT ? AS client_id' + ' UNION ALL SELECT ?' * (len(lot) - 1)
+            for row in self._connection().execute(self._SELECT.format(keys=keys), lot):
+                records[row[0]] = self._record(row)
+        return records
+
+    def load(self, credit_rows, financial_rows):
+        """Charge ou met à jour des données en masse.
+
+        credit_rows : (client_id, dettes, retards, faillite) ;
+        financial_rows : (client_id, nom, adresse, revenu_mensuel, depense_mensuel).
+        """
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany('INSERT OR REPLACE INTO credit_bureau VALUES (?, ?, ?, ?)', credit_rows)
+            conn.executemany('INSERT OR REPLACE INTO client_financial VALUES (?, ?, ?, ?, ?)', financial_rows)
+
+    def load_samples(self):
+        """Importe les données d'exemple des classes en mémoire."""
+        self.load(
+            ((client_id, *valeurs) for client_id, valeurs in CreditBureauDatabase.data.items()),
+            ((client_id, d["nom"], d["adresse"], d["revenu_mensuel"], d["depense_mensuel"])
+             for client_id, d in clientFinancialDatabase.data.items()),
+        )
+
+
+_default_store = None
+
+
+def default_store():
+    """Stockage configuré par CREDIT_DB_PATH (SQLite), sinon données d'exemple en mémoire."""
+    global _default_store
+    if _default_store is None:
+        path = os.getenv('CREDIT_DB_PATH')
+        _default_store = SQLiteCreditStore(path) if path else InMemoryCreditStore()
+    return _default_store
+
+
+if __name__ == '__main__':
+    # Crée une base SQLite avec les données d'exemple : python utils/database.py credit.sqlite3
+    SQLiteCreditStore(sys.argv[1]).load_samples()
@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'extracted_info', 'cache')
+
+
+def normalize_letter(letter):
+    """Normalise le texte d'une lettre pour que deux extractions du même document aient la même clé."""
+    letter = unicodedata.normalize('NFKC', letter or '')
+    return re.sub(r'\s+', ' ', letter).strip()
+
+
+class ExtractionCache:
+    """Cache persistant des extractions LLM : tier mémoire LRU puis tier disque (un fichier JSON par clé).
+
+    La clé combine le texte normalisé, la version du prompt et le modèle : changer l'un des deux
+    invalide naturellement les entrées existantes.
+    """
+
+    def __init__(self, prompt_version, model, cache_dir=DEFAULT_CACHE_DIR, max_memory_entries=512,
+                 max_disk_bytes=50 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.prompt_version = prompt_version
+        self.model = model
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_memory_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self._disk_index = {}  # clé -> (mtime, taille)
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    def key(self, letter):
+        contenu = f"{self.prompt_version}\0{self.model}\0{normalize_letter(letter)}"
+        return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_disk_index(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                self._disk_index[entry.name[:-5]] = (stat.st_mtime, stat.st_size)
+
+    def get(self, letter):
+        """Retourne le résultat mis en cache pour cette lettre, ou None."""
+        key = self.key(letter)
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+        result = self._read_disk(key)
+        if result is not None:
+            self.disk_hits += 1
+            self.memory.set(key, result)
+        return result
+
+    def set(self, letter, result):
+        key = self.key(letter)
+        self.memory.set(key, result)
+        self._write_disk(key, result)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl and time.time() - entry.get('created', 0) > self.ttl:
+            self._remove_disk(key)
+            return None
+        now = time.time()
+        os.utime(path, (now, now))
+        with self._lock:
+            if key in self._disk_index:
+                self._disk_index[key] = (now, self._disk_index[key][1])
+        return entry.get('result')
+
+    def _write_disk(self, key, result):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'created': time.time(), 'result': result}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Écriture du cache d'extraction impossible: {e}")
+            return
+        stat = os.stat(path)
+        with self._lock:
+            self._disk_index[key] = (stat.st_mtime, stat.st_size)
+        self._evict_disk()
+
+    def _remove_disk(self, key):
+        with self._lock:
+            self._disk_index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        """Supprime les entrées les moins récemment utilisées tant que le budget disque est dépassé."""
+        with self._lock:
+            total = sum(size for _, size in self._disk_index.values())
+            if total <= self.max_disk_bytes:
+                return
+            victims = []
+            for key, (_, size) in sorted(self._disk_index.items(), key=lambda item: item[1][0]):
+                if total <= self.max_disk_bytes:
+                    break
+                total -= size
+                victims.append(key)
+        for key in victims:
+            self._remove_disk(key)
+            self.disk_evictions += 1
+
+    def stats(self):
+        memory = self.memory.stats()
+        requests = memory['hits'] + memory['misses']
+        hits = memory['hits'] + self.disk_hits
+        with self._lock:
+            disk_entries = len(self._disk_index)
+            disk_bytes = sum(size for _, size in self._disk_index.values())
+        return {
+            "memory": memory,
+            "disk": {
+                "entries": disk_entries,
+                "bytes": disk_bytes,
+                "max_bytes": self.max_disk_bytes,
+                "hits": self.disk_hits,
+                "evictions": self.disk_evictions,
+            },
+            "requests": requests,
+            "hit_rate": round(hits / requests, 4) if requests else 0.0,
+        }
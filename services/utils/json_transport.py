@@ -0,0 +1,63 @@
+import json
+import logging
+from utils import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceUnavailable(Exception):
+    """Traitement temporairement impossible (surcharge) : répondu en 503 pour que l'appelant réessaie."""
+
+
+class RequeteRefusee(Exception):
+    """La demande ne peut pas être traitée telle quelle : répondu en 422, ce n'est pas une panne du service."""
+
+
+class JsonApplication:
+    """Application WSGI légère exposant les fonctions d'un service en JSON sur HTTP.
+
+    Requête : POST {"method": "<nom>", "params": {...}}
+    Réponse : {"result": <résultat structuré>} ou {"error": "<message>"}
+    Elle est montée à côté de l'application SOAP, qui reste disponible pour la compatibilité.
+    """
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+    @staticmethod
+    def _respond(start_response, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json; charset=utf-8'),
+                                ('Content-Length', str(len(body)))])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') != 'POST':
+            return self._respond(start_response, '405 Method Not Allowed', {'error': 'POST attendu'})
+        try:
+            with tracing.span('json_analyse'):
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+                payload = json.loads(environ['wsgi.input'].read(length))
+                method = payload['method']
+                params = payload.get('params') or {}
+        except (ValueError, KeyError, TypeError):
+            return self._respond(start_response, '400 Bad Request', {'error': 'Requête JSON invalide'})
+
+        handler = self.handlers.get(method)
+        if handler is None:
+            return self._respond(start_response, '404 Not Found', {'error': f'Méthode inconnue: {method}'})
+        try:
+            with tracing.span('logique_metier'):
+                result = handler(**params)
+        except TypeError as e:
+            return self._respond(start_response, '400 Bad Request', {'error': str(e)})
+        except RequeteRefusee as e:
+            logger.warning(f"Appel JSON {method} refusé : {e}")
+            return self._respond(start_response, '422 Unprocessable Entity', {'error': str(e)})
+        except ServiceUnavailable as e:
+            logger.warning(f"Appel JSON {method} refusé : {e}")
+            return self._respond(start_response, '503 Service Unavailable', {'error': str(e)})
+        except Exception as e:
+            logger.exception(f"Erreur lors de l'appel JSON {method}")
+            return self._respond(start_response, '500 Internal Server Error', {'error': str(e)})
+        return self._respond(start_response, '200 OK', {'result': result})
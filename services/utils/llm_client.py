@@ -0,0 +1,175 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import Future
+from utils.json_transport import ServiceUnavailable, RequeteRefusee
+
+logger = logging.getLogger(__name__)
+
+
+class FileSaturee(ServiceUnavailable):
+    """Trop de demandes attendent déjà le modèle : la demande est refusée plutôt que mise en attente."""
+
+
+class ReponseIncomplete(RequeteRefusee):
+    """Le modèle n'a pas terminé sa réponse (finish_reason différent de "stop") : la lettre est en cause."""
+
+
+class TokenBucket:
+    """Seau à jetons : `rate` jetons par seconde, au plus `capacity` jetons accumulés."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._jetons = capacity
+        self._mise_a_jour = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1, timeout=None):
+        """Prélève `n` jetons en attendant si nécessaire ; retourne False si `timeout` serait dépassé."""
+        n = min(n, self.capacity)
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                maintenant = time.monotonic()
+                self._jetons = min(self.capacity, self._jetons + (maintenant - self._mise_a_jour) * self.rate)
+                self._mise_a_jour = maintenant
+                if self._jetons >= n:
+                    self._jetons -= n
+                    return True
+                attente = (n - self._jetons) / self.rate
+            if limite is not None and maintenant + attente > limite:
+                return False
+            time.sleep(attente)
+
+
+class LLMClient:
+    """Appels au modèle limités au quota, dédoublonnés et réessayés.
+
+    - quota : un seau de requêtes par minute et un seau de jetons par minute (coût estimé par l'appelant) ;
+    - au plus `max_concurrency` appels simultanés ;
+    - au plus `max_queue` demandes en attente de quota : au-delà, FileSaturee est levée immédiatement,
+      et une demande qui attend plus de `queue_timeout` secondes est elle aussi refusée ;
+    - une demande identique (même clé) à une demande en cours attend son résultat au lieu de rappeler le modèle ;
+    - les erreurs `retry_on` sont réessayées avec un délai exponentiel aléatoire (en respectant Retry-After) ;
+      `retry_on` peut être une fonction qui retourne ces erreurs, appelée à la première erreur (import paresseux).
+    """
+
+    def __init__(self, call, requests_per_minute=60, tokens_per_minute=90000, max_concurrency=8, max_queue=64,
+                 queue_timeout=30.0, retries=3, backoff_base=1.0, backoff_max=20.0, retry_on=()):
+        self.call = call
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._retry_on = retry_on if callable(retry_on) else tuple(retry_on)
+        self._requetes = TokenBucket(requests_per_minute / 60.0, max(1, requests_per_minute // 6))
+        self._jetons = TokenBucket(tokens_per_minute / 60.0, max(1, tokens_per_minute // 6))
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._en_cours = {}  # clé -> Future partagée par les demandes identiques
+        self._compteurs = {'appels': 0, 'coalescees': 0, 'rejetees': 0, 'reessais': 0, 'erreurs': 0}
+        self._file = 0
+        self._file_max = 0
+        self._attente = [0, 0.0, 0.0]  # nombre, total (s), maximum (s)
+
+    def appeler(self, cle, cout=1, **payload):
+        """Appelle le modèle avec `payload` ; `cout` est le nombre de jetons estimé de l'échange."""
+        meneur = False
+        with self._lock:
+            future = self._en_cours.get(cle)
+            if future is not None:
+                self._compteurs['coalescees'] += 1
+            else:
+                if self._file >= self.max_queue:
+                    self._compteurs['rejetees'] += 1
+                    raise FileSaturee(f"File d'attente du modèle pleine ({self.max_queue} demandes), réessayez plus tard")
+                future = self._en_cours[cle] = Future()
+                self._file += 1
+                self._file_max = max(self._file_max, self._file)
+                meneur = True
+        if not meneur:
+            return future.result()
+        try:
+            future.set_result(self._executer(cout, payload))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._en_cours[cle]
+        return future.result()
+
+    @property
+    def retry_on(self):
+        if callable(self._retry_on):
+            self._retry_on = tuple(self._retry_on())
+        return self._retry_on
+
+    def _attendre_quota(self, cout):
+        debut = time.monotonic()
+        try:
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                raise FileSaturee(f"Aucun appel au modèle disponible après {self.queue_timeout:.0f} s")
+            restant = self.queue_timeout - (time.monotonic() - debut)
+            if not (self._requetes.acquire(1, timeout=restant) and self._jetons.acquire(cout, timeout=restant)):
+                self._slots.release()
+                raise FileSaturee(f"Quota du modèle épuisé pendant plus de {self.queue_timeout:.0f} s")
+        except FileSaturee:
+            with self._lock:
+                self._compteurs['rejetees'] += 1
+            raise
+        finally:
+            attente = time.monotonic() - debut
+            with self._lock:
+                self._file -= 1
+                self._attente[0] += 1
+                self._attente[1] += attente
+                self._attente[2] = max(self._attente[2], attente)
+
+    def _delai(self, tentative, erreur):
+        headers = getattr(erreur, 'headers', None) or {}
+        try:
+            return min(self.backoff_max, float(headers.get('retry-after')))
+        except (TypeError, ValueError):
+            return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** tentative))
+
+    def _executer(self, cout, payload):
+        self._attendre_quota(cout)
+        try:
+            tentative = 0
+            while True:
+                with self._lock:
+                    self._compteurs['appels'] += 1
+                try:
+                    return self.call(**payload)
+                except self.retry_on as e:  # évalué seulement lorsqu'une exception est levée
+                    if tentative >= self.retries:
+                        with self._lock:
+                            self._compteurs['erreurs'] += 1
+                        raise
+                    delai = self._delai(tentative, e)
+                    logger.warning(f"Appel au modèle en échec ({type(e).__name__}: {e}), "
+                                   f"nouvel essai dans {delai:.1f} s")
+                    with self._lock:
+                        self._compteurs['reessais'] += 1
+                    time.sleep(delai)
+                    tentative += 1
+                    self._requetes.acquire(1)
+                except Exception:
+                    with self._lock:
+                        self._compteurs['erreurs'] += 1
+                    raise
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            nombre, total, maximum = self._attente
+            return dict(self._compteurs,
+                        file=self._file,
+                        file_max=self._file_max,
+                        en_cours=len(self._en_cours),
+                        attente_moyenne_ms=round(total / nombre * 1000, 1) if nombre else 0.0,
+                        attente_max_ms=round(maximum * 1000, 1))
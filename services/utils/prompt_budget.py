@@ -0,0 +1,197 @@
+import re
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Lignes sans intérêt pour l'extraction : numéros de page et formules de politesse
+# (les accents peuvent avoir été retirés en amont : "agréer" arrive parfois sous la forme "agrer").
+# Un numéro de page s'annonce ("page 2", "page 2 sur 5") ou se donne sous la forme "2/5" ; un nombre
+# seul ("2", "- 2 -") n'en est un qu'en limite de page, autour d'un saut de page.
+_NUMERO_PAGE = re.compile(r"^page\s*\d{1,3}(?:\s*(?:/|sur|of)\s*\d{1,3})?$|^(\d{1,3})\s*/\s*(\d{1,3})$",
+                          re.IGNORECASE)
+_NUMERO_SEUL = re.compile(r"^-?\s*\d{1,3}\s*-?$")
+_POLITESSE = re.compile(r"^\s*(?:veuillez|je vous prie|dans l.attente|en vous remerciant|(?:bien\s+)?cordialement"
+                        r"|(?:mes\s+)?(?:sinc\w*res\s+)?salutations|respectueusement)\b", re.IGNORECASE)
+# Indices de passages utiles : montants, surface, adresse, identifiant client, coordonnées
+_PERTINENCE = re.compile(r"client-\d+|montant|pr\w?t\b|revenu|salaire|d\w{0,2}penses|prix|achat|m2\b|m²|surface"
+                         r"|superficie|adresse|situ|appartement|maison|logement|ville|\b\d{5}\b|t\w?l\w?phone|@",
+                         re.IGNORECASE)
+# Au-delà, une ligne d'en-tête ou de pied de page répétée n'en est sans doute pas une
+_LONGUEUR_MAX_REPETEE = 120
+# Les formules de politesse ne sont cherchées que dans les dernières lignes, signature comprise
+_LIGNES_FIN = 8
+_LONGUEUR_SIGNATURE = 60
+_TAILLE_MORCEAU = 600
+
+
+class CompteurJetons:
+    """Compte les jetons d'un texte avec tiktoken s'il est installé, sinon ~4 caractères par jeton."""
+
+    def __init__(self, model):
+        self.encodage = None
+        if tiktoken is not None:
+            try:
+                self.encodage = tiktoken.encoding_for_model(model)
+            except Exception:
+                self.encodage = None
+
+    def __call__(self, texte):
+        if self.encodage is not None:
+            return len(self.encodage.encode(texte))
+        return -(-len(texte) // 4)
+
+
+def _lignes(texte):
+    """Lignes du texte et indices de celles en limite de page (première et dernière ligne non vide
+    de part et d'autre d'un saut de page `\\f`)."""
+    pages = texte.replace('\r\n', '\n').replace('\r', '\n').split('\f')
+    lignes, limites = [], set()
+    for i, page in enumerate(pages):
+        debut = len(lignes)
+        lignes.extend(ligne.rstrip() for ligne in page.split('\n'))
+        non_vides = [j for j in range(debut, len(lignes)) if lignes[j].strip()]
+        if non_vides and i > 0:
+            limites.add(non_vides[0])
+        if non_vides and i < len(pages) - 1:
+            limites.add(non_vides[-1])
+    return lignes, limites
+
+
+def _numero_page(cle, en_limite):
+    m = _NUMERO_PAGE.match(cle)
+    if m:
+        # "2/5" : numéro au plus égal au nombre de pages (une fraction ou une date n'en est pas un)
+        return m.group(1) is None or 0 < int(m.group(1)) <= int(m.group(2))
+    return en_limite and _NUMERO_SEUL.match(cle) is not None
+
+
+def _formules_finales(lignes, ignorees):
+    """Indices des formules de politesse de la fin de la lettre : on remonte depuis la dernière ligne
+    (signature comprise) et l'on s'arrête au corps de la lettre, ligne longue ou pertinente."""
+    formules, examinees = set(), 0
+    for i in range(len(lignes) - 1, -1, -1):
+        cle = lignes[i].strip()
+        if not cle or i in ignorees:
+            continue
+        if _POLITESSE.match(cle):
+            formules.add(i)
+        elif len(cle) > _LONGUEUR_SIGNATURE or _PERTINENCE.search(cle):
+            break
+        examinees += 1
+        if examinees >= _LIGNES_FIN:
+            break
+    return formules
+
+
+def nettoyer_lettre(texte):
+    """Retire les numéros de page, les formules de politesse finales et les répétitions des en-têtes et pieds de page.
+
+    La première occurrence d'une ligne répétée est conservée : l'en-tête contient souvent le nom du demandeur.
+    """
+    lignes, limites = _lignes(texte)
+    occurrences = {}
+    for ligne in lignes:
+        cle = ligne.strip()
+        if cle and len(cle) <= _LONGUEUR_MAX_REPETEE:
+            occurrences[cle] = occurrences.get(cle, 0) + 1
+    retirees = {i for i, ligne in enumerate(lignes) if ligne.strip() and _numero_page(ligne.strip(), i in limites)}
+    repetees = {i for i, ligne in enumerate(lignes) if occurrences.get(ligne.strip(), 0) >= 3}
+    retirees |= _formules_finales(lignes, retirees | repetees)
+    gardees, vues = [], set()
+    for i, ligne in enumerate(lignes):
+        cle = ligne.strip()
+        if cle and (cle in vues or i in retirees):
+            continue
+        if i in repetees:
+            vues.add(cle)
+        gardees.append(re.sub(r"[ \t]{2,}", ' ', ligne))
+    return re.sub(r"\n{3,}", "\n\n", '\n'.join(gardees)).strip()
+
+
+def _morceaux(texte):
+    """Paragraphes du texte, les plus longs étant coupés en morceaux de lignes d'environ `_TAILLE_MORCEAU` caractères."""
+    morceaux = []
+    for paragraphe in re.split(r"\n\s*\n", texte):
+        courant = []
+        for ligne in paragraphe.split('\n'):
+            if courant and sum(len(l) for l in courant) + len(ligne) > _TAILLE_MORCEAU:
+                morceaux.append('\n'.join(courant))
+                courant = []
+            courant.append(ligne)
+        if any(l.strip() for l in courant):
+            morceaux.append('\n'.join(courant))
+    return morceaux
+
+
+def reduire(texte, budget, compter):
+    """Ramène le texte à `budget` jetons en gardant l'en-tête puis les passages les plus pertinents, dans l'ordre."""
+    if compter(texte) <= budget:
+        return texte
+    morceaux = _morceaux(texte)
+    couts = [compter(m) for m in morceaux]
+    scores = [len(_PERTINENCE.findall(m)) for m in morceaux]
+    # L'en-tête (nom et coordonnées du demandeur) est toujours conservé
+    gardes, total, vus = {0}, couts[0], {morceaux[0]}
+    for i in sorted(range(1, len(morceaux)), key=lambda i: (-scores[i], i)):
+        if scores[i] == 0:
+            break
+        if morceaux[i] not in vus and total + couts[i] <= budget:
+            gardes.add(i)
+            vus.add(morceaux[i])
+            total += couts[i]
+    reduit = '\n\n'.join(morceaux[i] for i in sorted(gardes))
+    if total > budget:
+        reduit = reduit[:budget * 4]
+    return reduit
+
+
+def preparer_lettre(texte, budget, compter):
+    """Nettoyage puis réduction au budget ; retourne (texte, jetons avant, jetons après).
+
+    Une lettre qui tient déjà dans le budget est envoyée telle quelle.
+    """
+    avant = compter(texte)
+    if avant <= budget:
+        return texte, avant, avant
+    prepare = reduire(nettoyer_lettre(texte), budget, compter)
+    return prepare, avant, compter(prepare)
+
+
+class SuiviUsage:
+    """Jetons consommés et latence des appels au modèle, cumulés par format de document."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._par_format = {}
+
+    def enregistrer(self, format_document, prompt_tokens, completion_tokens, duree, reduite=False):
+        with self._lock:
+            stats = self._par_format.setdefault(format_document or 'inconnu', {
+                'appels': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'lettres_reduites': 0,
+                'latence_totale_s': 0.0, 'latence_max_s': 0.0,
+            })
+            stats['appels'] += 1
+            stats['prompt_tokens'] += prompt_tokens
+            stats['completion_tokens'] += completion_tokens
+            stats['lettres_reduites'] += int(reduite)
+            stats['latence_totale_s'] += duree
+            stats['latence_max_s'] = max(stats['latence_max_s'], duree)
+
+    def stats(self):
+        with self._lock:
+            return {
+                format_document: {
+                    'appels': s['appels'],
+                    'prompt_tokens': s['prompt_tokens'],
+                    'completion_tokens': s['completion_tokens'],
+                    'prompt_tokens_moyen': round(s['prompt_tokens'] / s['appels']),
+                    'completion_tokens_moyen': round(s['completion_tokens'] / s['appels']),
+                    'lettres_reduites': s['lettres_reduites'],
+                    'latence_moyenne_ms': round(s['latence_totale_s'] / s['appels'] * 1000, 1),
+                    'latence_max_ms': round(s['latence_max_s'] * 1000, 1),
+                }
+                for format_document, s in self._par_format.items()
+            }
@@ -0,0 +1,515 @@
+import os
+import re
+import csv
+import sys
+import time
+import logging
+import hashlib
+import threading
+import unicodedata
+from datetime import datetime
+from array import array
+from bisect import bisect_left, bisect_right
+from difflib import SequenceMatcher
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+PRIX_FILENAME = 'prix_reference.csv'
+LITIGES_FILENAME = 'litiges.csv'
+
+# Prix au m² appliqué quand ni le code postal ni la ville ne sont connus
+DEFAULT_PRIX_M2 = 200
+
+ABREVIATIONS = {
+    'bd': 'boulevard', 'bld': 'boulevard', 'blvd': 'boulevard', 'av': 'avenue', 'ave': 'avenue',
+    'r': 'rue', 'pl': 'place', 'imp': 'impasse', 'all': 'allee', 'ch': 'chemin', 'chem': 'chemin',
+    'rte': 'route', 'fg': 'faubourg', 'fbg': 'faubourg', 'sq': 'square', 'st': 'saint', 'ste': 'sainte',
+}
+MOTS_VIDES = {'de', 'du', 'des', 'la', 'le', 'les', 'l', 'd', 'et', 'a', 'au', 'aux', 'en'}
+# Trop fréquents pour discriminer : conservés pour la similarité, absents de l'index inversé
+TYPES_VOIE = {'rue', 'boulevard', 'avenue', 'place', 'impasse', 'allee', 'chemin', 'route', 'quai',
+              'square', 'faubourg', 'cours', 'passage', 'voie', 'saint', 'sainte'}
+SUFFIXES_NUMERO = {'bis': 1, 'ter': 2, 'quater': 3}
+_NOMS_SUFFIXES = {code: nom for nom, code in SUFFIXES_NUMERO.items()}
+
+_CODE_POSTAL = re.compile(r"^\d{5}$")
+_SEPARATEURS = re.compile(r"[^a-z0-9]+")
+
+
+def normaliser(texte):
+    """Minuscules, sans accents ni ponctuation : 'Rue de la République' -> ['rue', 'de', 'la', 'republique']."""
+    texte = unicodedata.normalize('NFKD', texte or '').encode('ascii', 'ignore').decode('ascii').lower()
+    return _SEPARATEURS.sub(' ', texte).split()
+
+
+def analyser_adresse(adresse):
+    """Décompose une adresse en (clé de numéro, mots significatifs, code postal).
+
+    La clé de numéro vaut 0 sans numéro et encode les suffixes bis/ter/quater ;
+    le code postal est retiré des mots pour ne pas pénaliser les adresses qui l'omettent.
+    """
+    mots = normaliser(adresse)
+    numero, code_postal = 0, None
+    if mots and mots[0].isdigit() and len(mots[0]) <= 4:
+        numero = int(mots.pop(0)) * 4 + 4
+        if mots and mots[0] in SUFFIXES_NUMERO:
+            numero += SUFFIXES_NUMERO[mots.pop(0)]
+    significatifs = []
+    for mot in mots:
+        if _CODE_POSTAL.match(mot):
+            code_postal = code_postal or mot
+            continue
+        mot = ABREVIATIONS.get(mot, mot)
+        if mot not in MOTS_VIDES:
+            significatifs.append(mot)
+    return numero, tuple(significatifs), code_postal
+
+
+def decomposer_adresse(adresse, localites=frozenset()):
+    """Sépare la voie de la localité : (clé de numéro, mots de la voie, localité ou None, code postal).
+
+    La localité suit la première virgule ('19 rue de la République, Versailles') ; sans virgule, les
+    derniers mots ne sont pris pour la localité que s'ils figurent dans `localites` (localités connues)
+    et qu'il reste un nom de voie ('rue de Paris' garde 'paris').
+    """
+    voie, virgule, reste = (adresse or '').partition(',')
+    numero, mots, code_postal = analyser_adresse(voie if virgule else adresse)
+    localite = None
+    if virgule:
+        _, mots_localite, code_localite = analyser_adresse(reste)
+        code_postal = code_postal or code_localite
+        localite = ' '.join(mots_localite) or None
+    else:
+        for n in (3, 2, 1):
+            if len(mots) > n and ' '.join(mots[-n:]) in localites and set(mots[:-n]) - TYPES_VOIE:
+                localite, mots = ' '.join(mots[-n:]), mots[:-n]
+                break
+    return numero, mots, localite, code_postal
+
+
+def _mots_complets(mots_voie, localite):
+    return mots_voie + tuple(localite.split()) if localite else mots_voie
+
+
+def _forme_canonique(numero, mots):
+    if not numero:
+        return ' '.join(mots)
+    valeur, suffixe = divmod(numero - 4, 4)
+    return ' '.join((str(valeur),) + ((_NOMS_SUFFIXES[suffixe],) if suffixe else ()) + mots)
+
+
+def _empreinte(forme):
+    return int.from_bytes(hashlib.blake2b(forme.encode('ascii'), digest_size=8).digest(), 'little')
+
+
+def empreinte_adresse(adresse):
+    """Empreinte 64 bits de la forme canonique d'une adresse (None si elle ne contient aucun mot)."""
+    numero, mots_voie, localite, _ = decomposer_adresse(adresse)
+    mots = _mots_complets(mots_voie, localite)
+    return _empreinte(_forme_canonique(numero, mots)) if mots else None
+
+
+def _variantes(mot):
+    """Le mot et ses variantes à une lettre supprimée : deux mots à une faute près en partagent une."""
+    return {mot} | {mot[:i] + mot[i + 1:] for i in range(len(mot))}
+
+
+def trigrammes(texte):
+    texte = f" {texte} "
+    return {texte[i:i + 3] for i in range(len(texte) - 2)}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class IndexAdresses:
+    """Registre d'adresses indexé pour la recherche exacte et approchée.
+
+    - recherche exacte : empreintes 64 bits des formes canoniques, triées dans un `array('Q')` (bisect) ;
+    - recherche approchée : index inversé (numéro, mot de la voie) -> adresses, stocké en deux tableaux
+      triés, préfiltre par similarité de Jaccard sur les trigrammes, puis ratio de `difflib` (>= `seuil`)
+      calculé sur la voie seule. Le numéro doit être identique, la localité et le code postal aussi
+      lorsque les deux adresses les indiquent : une même rue dans une autre ville est un autre bien.
+      Les mots inconnus du vocabulaire (fautes de frappe) sont rapprochés des mots connus à une faute près.
+
+    Les formes canoniques sont concaténées dans une seule chaîne ASCII avec un tableau d'offsets,
+    ce qui évite un objet Python par adresse.
+    """
+
+    def __init__(self, adresses=(), seuil=0.85):
+        self.seuil = seuil
+        empreintes = set()
+        formes, offsets = [], array('I', [0])
+        self._vocabulaire = {}
+        self._localites = {}  # localité normalisée -> identifiant (0 : localité inconnue)
+        self._localite_adresse = array('I')
+        self._code_postal_adresse = array('I')
+        postings = []
+        position = 0
+        adresses = list(adresses)
+        decompositions = [decomposer_adresse(adresse) for adresse in adresses]
+        # Localités citées après une virgule : reconnues en fin d'adresse lorsque la virgule manque
+        for _, _, localite, _ in decompositions:
+            if localite:
+                self._localites.setdefault(localite, len(self._localites) + 1)
+        for adresse, decomposition in zip(adresses, decompositions):
+            if decomposition[2] is None and self._localites:
+                decomposition = decomposer_adresse(adresse, self._localites)
+            numero, mots_voie, localite, code_postal = decomposition
+            mots = _mots_complets(mots_voie, localite)
+            if not mots_voie:
+                continue
+            empreinte = _empreinte(_forme_canonique(numero, mots))
+            if empreinte in empreintes:
+                continue
+            empreintes.add(empreinte)
+            identifiant = len(formes)
+            forme = _forme_canonique(numero, mots_voie)
+            formes.append(forme)
+            position += len(forme)
+            offsets.append(position)
+            self._localite_adresse.append(self._localites.get(localite, 0))
+            self._code_postal_adresse.append(int(code_postal) if code_postal else 0)
+            for mot in set(mots_voie) - TYPES_VOIE:
+                mot_id = self._vocabulaire.setdefault(mot, len(self._vocabulaire))
+                postings.append(((numero << 32 | mot_id) << 32) | identifiant)
+
+        self._empreintes = array('Q', sorted(empreintes))
+        self._texte = ''.join(formes)
+        self._offsets = offsets
+        postings.sort()
+        self._cles = array('Q', (p >> 32 for p in postings))
+        self._adresses = array('I', (p & 0xFFFFFFFF for p in postings))
+
+        # Rapprochement des mots mal orthographiés (distance d'édition 1, façon SymSpell) :
+        # empreinte de chaque variante obtenue en supprimant une lettre -> identifiant du mot
+        variantes = []
+        for mot, mot_id in self._vocabulaire.items():
+            if len(mot) > 3:
+                variantes.extend((_empreinte(v) << 32) | mot_id for v in _variantes(mot))
+        variantes.sort()
+        self._variantes_cles = array('Q', (v >> 32 for v in variantes))
+        self._variantes_mots = array('I', (v & 0xFFFFFFFF for v in variantes))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def forme(self, identifiant):
+        """Forme canonique de la voie d'une adresse indexée."""
+        return self._texte[self._offsets[identifiant]:self._offsets[identifiant + 1]]
+
+    def _localite(self, identifiant):
+        localite_id = self._localite_adresse[identifiant]
+        if not localite_id:
+            return None
+        if not hasattr(self, '_noms_localites'):
+            self._noms_localites = {v: k for k, v in self._localites.items()}
+        return self._noms_localites[localite_id]
+
+    def _compatible(self, identifiant, localite, code_postal):
+        """Vrai si la localité et le code postal de l'adresse indexée ne contredisent pas ceux demandés."""
+        code = self._code_postal_adresse[identifiant]
+        if code_postal and code and int(code_postal) != code:
+            return False
+        localite_id = self._localite_adresse[identifiant]
+        if localite and localite_id and self._localites.get(localite) != localite_id:
+            return False
+        return True
+
+    def _mots_proches(self, mot, limite=5):
+        mot_id = self._vocabulaire.get(mot)
+        if mot_id is not None:
+            return [mot_id]
+        if len(mot) <= 3:
+            return []
+        proches = []
+        for variante in _variantes(mot):
+            cle = _empreinte(variante)
+            debut = bisect_left(self._variantes_cles, cle)
+            proches.extend(self._variantes_mots[debut:bisect_right(self._variantes_cles, cle, debut)])
+        return list(dict.fromkeys(proches))[:limite]
+
+    def empreintes(self):
+        return self._empreintes
+
+    def contient_empreinte(self, empreinte):
+        i = bisect_left(self._empreintes, empreinte)
+        return i < len(self._empreintes) and self._empreintes[i] == empreinte
+
+    def rechercher(self, adresse, exclus=frozenset()):
+        """Retourne (forme canonique trouvée, score) pour l'adresse la plus proche, ou None.
+
+        `exclus` : empreintes d'adresses retirées du registre depuis la construction de l'index.
+        """
+        numero, mots_voie, localite, code_postal = decomposer_adresse(adresse, self._localites)
+        if not mots_voie:
+            return None
+        forme = _forme_canonique(numero, _mots_complets(mots_voie, localite))
+        empreinte = _empreinte(forme)
+        if self.contient_empreinte(empreinte) and empreinte not in exclus:
+            return forme, 1.0
+
+        # Recherche approchée sur la voie seule, parmi les adresses de la même localité (ou sans localité)
+        forme = _forme_canonique(numero, mots_voie)
+        votes = Counter()
+        for mot in set(mots_voie) - TYPES_VOIE:
+            candidats = set()
+            for mot_id in self._mots_proches(mot):
+                cle = numero << 32 | mot_id
+                debut = bisect_left(self._cles, cle)
+                candidats.update(self._adresses[debut:bisect_right(self._cles, cle, debut)])
+            votes.update(candidats)
+        if not votes:
+            return None
+
+        # Préfiltre par trigrammes, puis similarité d'édition sur les meilleurs candidats (tolère les inversions)
+        cible = trigrammes(forme)
+        prefiltre = []
+        for identifiant, _ in votes.most_common(20):
+            if not self._compatible(identifiant, localite, code_postal):
+                continue
+            candidat = self.forme(identifiant)
+            complete = ' '.join(filter(None, (candidat, self._localite(identifiant))))
+            if exclus and _empreinte(complete) in exclus:
+                continue
+            score = jaccard(cible, trigrammes(candidat))
+            if score >= 0.4:
+                prefiltre.append((score, candidat, complete))
+        meilleur = None
+        for _, candidat, complete in sorted(prefiltre, reverse=True)[:5]:
+            score = SequenceMatcher(None, forme, candidat, autojunk=False).ratio()
+            if score >= self.seuil and (meilleur is None or score > meilleur[1]):
+                meilleur = (complete, round(score, 4))
+        return meilleur
+
+    def contient(self, adresse):
+        return self.rechercher(adresse) is not None
+
+    def taille_memoire(self):
+        """Estimation en octets des structures indexées (hors vocabulaire des mots)."""
+        tableaux = (self._empreintes, self._offsets, self._cles, self._adresses,
+                    self._variantes_cles, self._variantes_mots, self._localite_adresse, self._code_postal_adresse)
+        return sum(t.itemsize * len(t) for t in tableaux) + sys.getsizeof(self._texte)
+
+
+class IndexPrix:
+    """Prix de référence au m² par code postal, puis par ville normalisée."""
+
+    def __init__(self, lignes=(), defaut=DEFAULT_PRIX_M2):
+        self.defaut = defaut
+        self._par_code_postal = {}
+        self._par_ville = {}
+        for code_postal, ville, prix in lignes:
+            if code_postal:
+                self._par_code_postal[code_postal] = prix
+            if ville:
+                self._par_ville.setdefault(' '.join(normaliser(ville)), prix)
+
+    def __len__(self):
+        return len(self._par_code_postal) + len(self._par_ville)
+
+    def prix_m2(self, ville, adresse=None):
+        if adresse:
+            code_postal = analyser_adresse(adresse)[2]
+            if code_postal in self._par_code_postal:
+                return self._par_code_postal[code_postal]
+        return self._par_ville.get(' '.join(normaliser(ville)), self.defaut)
+
+
+class RegistreLitiges:
+    """Registre des litiges : index de base immuable, complété par les adresses ajoutées et retirées depuis.
+
+    Une mise à jour ne modifie jamais un registre existant : `appliquer` en construit un nouveau qui
+    partage l'index de base et ne réindexe que les ajouts (copie sur écriture).
+    """
+
+    def __init__(self, base, ajouts=None, retraits=frozenset()):
+        self.base = base
+        self.ajouts = ajouts or {}  # empreinte -> adresse telle que lue dans le fichier
+        self.retraits = frozenset(retraits)
+        self._index_ajouts = IndexAdresses(self.ajouts.values(), seuil=base.seuil) if self.ajouts else None
+
+    def __len__(self):
+        return len(self.base) - len(self.retraits) + len(self.ajouts)
+
+    def rechercher(self, adresse):
+        resultats = [self.base.rechercher(adresse, exclus=self.retraits)]
+        if self._index_ajouts is not None:
+            resultats.append(self._index_ajouts.rechercher(adresse))
+        resultats = [r for r in resultats if r is not None]
+        return max(resultats, key=lambda r: r[1]) if resultats else None
+
+    def contient(self, adresse):
+        return self.rechercher(adresse) is not None
+
+    def taille_delta(self):
+        return len(self.ajouts) + len(self.retraits)
+
+    def appliquer(self, adresses):
+        """Nouveau registre reflétant `adresses` (contenu complet du fichier), sans réindexer la base."""
+        nouvelles = {}
+        for adresse in adresses:
+            empreinte = empreinte_adresse(adresse)
+            if empreinte is not None:
+                nouvelles.setdefault(empreinte, adresse)
+        ajouts = {e: a for e, a in nouvelles.items() if not self.base.contient_empreinte(e)}
+        retraits = {e for e in self.base.empreintes() if e not in nouvelles}
+        return RegistreLitiges(self.base, ajouts, retraits)
+
+    def taille_memoire(self):
+        taille = self.base.taille_memoire()
+        return taille + self._index_ajouts.taille_memoire() if self._index_ajouts is not None else taille
+
+
+class Referentiel:
+    """Instantané immuable des prix de référence et du registre des litiges."""
+
+    def __init__(self, prix, litiges, source=None):
+        self.prix = prix
+        self.litiges = litiges
+        self.source = source
+
+    def stats(self):
+        return {
+            'source': self.source,
+            'prix': len(self.prix),
+            'litiges': len(self.litiges),
+            'litiges_delta': self.litiges.taille_delta(),
+            'memoire_litiges_octets': self.litiges.taille_memoire(),
+        }
+
+
+def lire_prix(path):
+    """Lit un CSV `code_postal,ville,prix_m2` (l'une des deux premières colonnes peut être vide)."""
+    with open(path, newline='', encoding='utf-8') as f:
+        for ligne in csv.DictReader(f):
+            prix = float(ligne['prix_m2'])
+            yield (ligne.get('code_postal') or '').strip(), (ligne.get('ville') or '').strip(), \
+                int(prix) if prix.is_integer() else prix
+
+
+def lire_litiges(path):
+    """Lit un CSV avec une colonne `adresse`."""
+    with open(path, newline='', encoding='utf-8') as f:
+        for ligne in csv.DictReader(f):
+            yield ligne['adresse']
+
+
+class ReferentielSurveille:
+    """Référentiel rechargé à chaud quand ses fichiers changent.
+
+    Un thread vérifie les fichiers toutes les `intervalle` secondes. Le rechargement se fait à côté
+    de l'instantané courant, puis `courant` est remplacé d'une seule affectation : une requête qui a
+    lu `courant` garde un référentiel complet et cohérent jusqu'à sa fin. Les litiges modifiés sont
+    appliqués en delta sur l'index existant ; l'index est reconstruit entièrement (toujours en
+    arrière-plan) quand le delta dépasse `ratio_compactage` de sa taille.
+
+    Pour éviter de lire un fichier à moitié écrit, le remplacer par renommage (`mv`). Un fichier
+    illisible est ignoré : l'instantané courant est conservé et l'erreur exposée dans `statut()`.
+    """
+
+    FICHIERS = (PRIX_FILENAME, LITIGES_FILENAME)
+
+    def __init__(self, data_dir=None, seuil=0.85, intervalle=5.0, ratio_compactage=0.1):
+        self.data_dir = data_dir or DEFAULT_DATA_DIR
+        self.seuil = seuil
+        self.intervalle = intervalle
+        self.ratio_compactage = ratio_compactage
+        self.courant = None
+        self.version = 0
+        self._signatures = {}
+        self._signatures_en_echec = None  # fichiers déjà tentés sans succès : pas de nouvel essai tant qu'ils ne changent pas
+        self._statut = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.recharger()
+
+    def _path(self, nom):
+        return os.path.join(self.data_dir, nom)
+
+    def _signature(self, nom):
+        st = os.stat(self._path(nom))
+        return st.st_mtime_ns, st.st_size
+
+    def recharger(self, force=False):
+        """Applique les fichiers modifiés depuis le dernier chargement ; retourne True si l'instantané a changé."""
+        with self._lock:
+            try:
+                signatures = {nom: self._signature(nom) for nom in self.FICHIERS}
+            except OSError as e:
+                return self._echec(e)
+            modifies = [nom for nom in self.FICHIERS if force or signatures[nom] != self._signatures.get(nom)]
+            if not modifies or (signatures == self._signatures_en_echec and not force):
+                return False
+
+            debut = time.perf_counter()
+            courant = self.courant
+            mode = 'incremental' if courant is not None and not force else 'complet'
+            try:
+                if mode == 'incremental' and PRIX_FILENAME not in modifies:
+                    prix = courant.prix
+                else:
+                    prix = IndexPrix(lire_prix(self._path(PRIX_FILENAME)))
+                litiges = None
+                if mode == 'incremental':
+                    if LITIGES_FILENAME not in modifies:
+                        litiges = courant.litiges
+                    else:
+                        litiges = courant.litiges.appliquer(lire_litiges(self._path(LITIGES_FILENAME)))
+                        if litiges.taille_delta() > max(1000, self.ratio_compactage * len(litiges.base)):
+                            litiges, mode = None, 'complet'
+                if litiges is None:
+                    base = IndexAdresses(lire_litiges(self._path(LITIGES_FILENAME)), seuil=self.seuil)
+                    litiges = RegistreLitiges(base)
+            except (OSError, ValueError, KeyError, csv.Error) as e:
+                self._signatures_en_echec = signatures
+                return self._echec(e)
+
+            self.courant = Referentiel(prix, litiges, source=self.data_dir)
+            self.version += 1
+            self._signatures = signatures
+            self._statut = {
+                'mode': mode,
+                'fichiers_modifies': modifies,
+                'duree_rechargement_ms': round((time.perf_counter() - debut) * 1000, 1),
+                'charge_le': datetime.now().isoformat(timespec='seconds'),
+                'derniere_erreur': None,
+            }
+            logger.info("Référentiel v%d chargé (%s) en %.1f ms", self.version, mode,
+                        self._statut['duree_rechargement_ms'])
+            return True
+
+    def _echec(self, erreur):
+        if self.courant is None:
+            raise erreur
+        message = f"{type(erreur).__name__}: {erreur}"
+        logger.error("Rechargement du référentiel impossible, version %d conservée : %s", self.version, message)
+        self._statut['derniere_erreur'] = message
+        return False
+
+    def demarrer(self):
+        """Lance la surveillance des fichiers (sans effet si `intervalle` vaut 0 ou si elle tourne déjà)."""
+        if self.intervalle <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._surveiller, name='referentiel-watcher', daemon=True)
+        self._thread.start()
+
+    def arreter(self):
+        self._stop.set()
+
+    def _surveiller(self):
+        while not self._stop.wait(self.intervalle):
+            try:
+                self.recharger()
+            except Exception:
+                logger.exception("Erreur inattendue pendant le rechargement du référentiel")
+
+    def statut(self):
+        courant = self.courant
+        return dict(courant.stats(), version=self.version, intervalle=self.intervalle, **self._statut)
+
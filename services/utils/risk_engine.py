@@ -0,0 +1,163 @@
+from collections import namedtuple
+import numpy as np
+
+# Paramètres d'une politique de crédit ; les valeurs de production viennent de aprobation_service
+PolicyParameters = namedtuple('PolicyParameters', [
+    'min_credit_score',
+    'max_debt_to_income_ratio',
+    'min_property_value_to_loan_ratio',
+    'max_risk_score',
+    'max_default_probability',
+    'base_rate',
+    'term_years',
+])
+
+# Codes de raison, dans l'ordre des contrôles de LoanDecisionMaker.decide_approval
+APPROVED, POLICY_NOT_MET, RISK_TOO_HIGH, DEFAULT_TOO_LIKELY = range(4)
+REASONS = (
+    "Demande approuvée",
+    "Les critères de base ne sont pas respectés",
+    "Niveau de risque évalué trop élevé",
+    "Probabilité de défaut élevée",
+)
+
+
+def _risk_score(cs, dti, pv, loan):
+    """Score de risque borné à [0, 100] ; un ratio prêt/valeur non fini (valeur de bien nulle) compte pour 100."""
+    risk_score = 100 - (cs / 8.5)
+    risk_score += dti * 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        loan_to_value_ratio = np.where(pv > 0, loan / pv, np.inf)
+    risk_score += loan_to_value_ratio * 60
+    risk_score = np.nan_to_num(risk_score, nan=100.0, posinf=100.0, neginf=0.0)
+    return np.minimum(np.maximum(risk_score, 0), 100)
+
+
+def score_batch(credit_score, debt_to_income_ratio, property_value, loan_amount, policy):
+    """Évalue un lot de demandes sur des colonnes NumPy et retourne un dictionnaire de tableaux.
+
+    Les opérations reprennent exactement l'ordre des calculs scalaires de aprobation_service afin de
+    produire des résultats identiques au bit près. Seule différence : une valeur de bien nulle ou
+    négative donne un risque de 100 (refus pour risque trop élevé), là où le calcul scalaire lève une
+    ZeroDivisionError.
+    """
+    cs = np.asarray(credit_score, dtype=np.float64)
+    dti = np.asarray(debt_to_income_ratio, dtype=np.float64)
+    pv = np.asarray(property_value, dtype=np.float64)
+    loan = np.asarray(loan_amount, dtype=np.float64)
+
+    meets_policies = ((cs >= policy.min_credit_score)
+                      & (dti <= policy.max_debt_to_income_ratio)
+                      & (pv >= loan * policy.min_property_value_to_loan_ratio))
+
+    risk_score = _risk_score(cs, dti, pv, loan)
+
+    default_probability = np.maximum(0, np.minimum(1, ((850 - cs) / 850 + dti) / 2))
+
+    reason_code = np.full(cs.shape, APPROVED, dtype=np.int8)
+    reason_code[default_probability > policy.max_default_probability] = DEFAULT_TOO_LIKELY
+    reason_code[risk_score > policy.max_risk_score] = RISK_TOO_HIGH
+    reason_code[~meets_policies] = POLICY_NOT_MET
+    approved = reason_code == APPROVED
+
+    # round() de Python et np.round ne coïncident pas toujours : l'arrondi est fait comme dans le chemin scalaire
+    interest_rate = np.full(cs.shape, np.nan)
+    taux_bruts = policy.base_rate + (750 - cs[approved]) / 1100
+    interest_rate[approved] = [round(taux, 4) for taux in taux_bruts.tolist()]
+
+    return {
+        'approved': approved,
+        'reason_code': reason_code,
+        'risk_score': risk_score,
+        'default_probability': default_probability,
+        'interest_rate': interest_rate,
+        'loan_amount': loan,
+        'term_years': np.where(approved, policy.term_years, 0),
+    }
+
+
+def iter_decisions(result, client_names=None):
+    """Convertit les tableaux de `score_batch` en dictionnaires au format de `make_decision`."""
+    colonnes = {cle: valeurs.tolist() for cle, valeurs in result.items()}
+    for i, approved in enumerate(colonnes['approved']):
+        terms = None
+        if approved:
+            terms = {
+                "loan_amount": colonnes['loan_amount'][i],
+                "interest_rate": colonnes['interest_rate'][i],
+                "term_years": colonnes['term_years'][i],
+            }
+        yield {
+            "client_name": client_names[i] if client_names is not None else None,
+            "approved": approved,
+            "reason": REASONS[colonnes['reason_code'][i]],
+            "risk_score": colonnes['risk_score'][i],
+            "default_probability": colonnes['default_probability'][i],
+            "loan_terms": terms,
+        }
+
+
+# Colonnes d'un portefeuille préparé pour les scénarios de politique
+BOOK_COLUMNS = ('credit_score', 'debt_to_income_ratio', 'property_value', 'loan_amount', 'risk_score',
+                'default_probability', 'rate_adjustment', 'expected_loss')
+
+
+def prepare_book(credit_score, debt_to_income_ratio, property_value, loan_amount):
+    """Colonnes du portefeuille et grandeurs qui ne dépendent pas de la politique, calculées une seule fois.
+
+    Le risque et la probabilité de défaut sont calculés comme dans `score_batch` ; `rate_adjustment` est
+    l'ajustement du taux selon le score et `expected_loss` le montant exposé au défaut (probabilité × prêt).
+    """
+    cs = np.ascontiguousarray(credit_score, dtype=np.float64)
+    dti = np.ascontiguousarray(debt_to_income_ratio, dtype=np.float64)
+    pv = np.ascontiguousarray(property_value, dtype=np.float64)
+    loan = np.ascontiguousarray(loan_amount, dtype=np.float64)
+
+    risk_score = _risk_score(cs, dti, pv, loan)
+    default_probability = np.maximum(0, np.minimum(1, ((850 - cs) / 850 + dti) / 2))
+
+    return {
+        'credit_score': cs,
+        'debt_to_income_ratio': dti,
+        'property_value': pv,
+        'loan_amount': loan,
+        'risk_score': risk_score,
+        'default_probability': default_probability,
+        'rate_adjustment': (750 - cs) / 1100,
+        'expected_loss': default_probability * loan,
+    }
+
+
+def evaluate_policy(book, policy, chunk_size=1 << 16):
+    """Agrégats d'une politique sur un portefeuille préparé : mêmes décisions que `score_batch`.
+
+    Le portefeuille est parcouru par blocs de `chunk_size` lignes pour que les tableaux intermédiaires
+    restent dans le cache du processeur. Le taux moyen est calculé sans l'arrondi à 4 décimales des
+    conditions de prêt individuelles.
+    """
+    n = len(book['credit_score'])
+    approuves = 0
+    montant_approuve = ajustement = probabilite = perte = 0.0
+    for debut in range(0, n, chunk_size):
+        bloc = slice(debut, debut + chunk_size)
+        loan = book['loan_amount'][bloc]
+        approved = ((book['credit_score'][bloc] >= policy.min_credit_score)
+                    & (book['debt_to_income_ratio'][bloc] <= policy.max_debt_to_income_ratio)
+                    & (book['property_value'][bloc] >= loan * policy.min_property_value_to_loan_ratio))
+        approved &= ~(book['risk_score'][bloc] > policy.max_risk_score)
+        approved &= ~(book['default_probability'][bloc] > policy.max_default_probability)
+        approuves += int(np.count_nonzero(approved))
+        montant_approuve += float(np.sum(loan, where=approved))
+        ajustement += float(np.sum(book['rate_adjustment'][bloc], where=approved))
+        probabilite += float(np.sum(book['default_probability'][bloc], where=approved))
+        perte += float(np.sum(book['expected_loss'][bloc], where=approved))
+
+    return {
+        'applicants': n,
+        'approved': approuves,
+        'approval_rate': approuves / n if n else 0.0,
+        'approved_amount': montant_approuve,
+        'avg_interest_rate': policy.base_rate + ajustement / approuves if approuves else None,
+        'avg_default_probability': probabilite / approuves if approuves else None,
+        'expected_default_amount': perte,
+    }
@@ -0,0 +1,145 @@
+import os
+import re
+
+# Montants : "20 000", "20.000", "20000" (les espaces insécables sont tolérés)
+_NOMBRE = r"(\d{1,3}(?:[ \u00a0\u202f.]\d{3})+|\d+)"
+
+# En dessous de ce niveau de confiance, l'extraction par règles cède la place au modèle
+# (seuil commun au service d'extraction et au composite, qui arrête la lecture des PDF en conséquence)
+MIN_CONFIDENCE = float(os.getenv('RULE_EXTRACTOR_MIN_CONFIDENCE', '1.0'))
+
+REQUIRED_FIELDS = (
+    "name", "customerId", "surfaceArea", "town", "completeAddress",
+    "loanAmount", "monthlyIncome", "monthlyExpenses", "propertyPrice",
+)
+
+
+class RuleExtractor:
+    """Extraction déterministe des champs d'une lettre suivant notre modèle de demande de prêt.
+
+    Les motifs tolèrent l'absence d'accents et de symboles (le composite retire les caractères
+    non ASCII avant l'envoi) : "dépenses" peut arriver sous la forme "dpenses", "m²" sous la forme "m".
+    """
+
+    _client_id = re.compile(r"\b(client-\d+)\b", re.IGNORECASE)
+    _prix = re.compile(r"(?:prix\s+d\W?\s*achat|somme\s+pour\s+l\W?\s*achat|prix\s+du\s+bien)[^0-9]{0,80}?" + _NOMBRE,
+                       re.IGNORECASE)
+    # Montant du prêt : un mot-clé suivi d'un nombre dans la même phrase, retenu si la phrase parle du
+    # prêt ou de l'emprunt et pas d'un autre montant (apport, revenu, mensualité...)
+    _montant_pret = re.compile(r"\b(?:montant|somme|pr\w?ts?|emprunt\w*)\b[^0-9.!?;]{0,60}?" + _NOMBRE, re.IGNORECASE)
+    _mention_pret = re.compile(r"\bpr\w?ts?\b|\bemprunt", re.IGNORECASE)
+    _autre_montant = re.compile(r"\bapport|revenu|salaire|d\w*penses|\bprix\b|mensualit", re.IGNORECASE)
+    _fin_phrase = re.compile(r"[.!?;]\s|\n")
+    _revenu = re.compile(r"(?:revenus?|salaire)\s+mensuels?[^0-9]{0,60}?" + _NOMBRE, re.IGNORECASE)
+    _depenses = re.compile(r"d\w*penses\s+mensuelles[^0-9]{0,60}?" + _NOMBRE, re.IGNORECASE)
+    _surface = re.compile(r"(\d+)\s*m(?:2|²)?(?![a-z0-9])", re.IGNORECASE)
+    _adresse = re.compile(r"situ\w*\s+(?:[^.\n]*\s)?(?:dans|au|à)\s+(?:le\s+|la\s+|l'\s*)?([^.,;\n]+)",
+                          re.IGNORECASE)
+    _code_postal_ville = re.compile(r"\b(\d{5})\s*[-–]?\s*([A-Z][\w'-]+(?:[ -][A-Z][\w'-]+)*)")
+    _ville = re.compile(r"([A-Z][\w'-]+(?:[ -][A-Z][\w'-]+)*)\s*$")
+    _nom = re.compile(r"^([A-Z][a-zA-Z'-]+(?:\s+[A-Z][a-zA-Z'-]+){1,3})\s*$")
+    _nom_en_tete = re.compile(r"^\s*([A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+){1,3})")
+    _telephone = re.compile(r"(\+\d{2,3}(?:[ .]?\d{1,3}){4,6}|\b0\d(?:[ .]?\d{2}){4})")
+    _email = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+
+    @staticmethod
+    def _montant(match):
+        return int(re.sub(r"\D", "", match.group(1))) if match else None
+
+    @classmethod
+    def _extraire_montant_pret(cls, letter):
+        """Retourne (montant du prêt, ambigu) ; ambigu si plusieurs montants différents conviennent
+        ou si aucun n'est rattaché au prêt dans sa phrase."""
+        ancres, autres = [], []
+        for match in cls._montant_pret.finditer(letter):
+            debut = match.start()
+            phrase = cls._fin_phrase.split(letter[max(0, debut - 80):debut])[-1]
+            contexte = phrase + letter[debut:match.start(1)]
+            if cls._autre_montant.search(contexte):
+                continue
+            (ancres if cls._mention_pret.search(contexte) else autres).append(cls._montant(match))
+        candidats = list(dict.fromkeys(ancres or autres))
+        if not candidats:
+            return None, False
+        return candidats[0], len(candidats) > 1 or not ancres
+
+    @classmethod
+    def _extraire_nom(cls, letter):
+        lignes = [ligne.strip() for ligne in letter.splitlines() if ligne.strip()]
+        # La signature (dernière ligne) est la source la plus fiable, puis l'en-tête
+        for ligne in lignes[-1:] + lignes[:1]:
+            match = cls._nom.match(ligne)
+            if match:
+                return match.group(1)
+        match = cls._nom_en_tete.match(letter)
+        return match.group(1) if match else None
+
+    @classmethod
+    def _extraire_adresse(cls, letter):
+        match = cls._adresse.search(letter)
+        if not match:
+            return None, None, ""
+        adresse = match.group(1).strip()
+        code = cls._code_postal_ville.search(adresse)
+        if code:
+            return adresse, code.group(2), code.group(1)
+        ville = cls._ville.search(adresse)
+        return adresse, ville.group(1) if ville else None, ""
+
+    @classmethod
+    def extraire(cls, letter):
+        """Retourne (informations au format du prompt, confiance entre 0 et 1, champs manquants)."""
+        client_id = cls._client_id.search(letter)
+        surface = cls._surface.search(letter)
+        adresse, ville, code_postal = cls._extraire_adresse(letter)
+        telephone = cls._telephone.search(letter)
+        email = cls._email.search(letter)
+        montant_pret, montant_ambigu = cls._extraire_montant_pret(letter)
+        type_logement = "home" if re.search(r"\bmaison\b", letter, re.IGNORECASE) else (
+            "apartment" if re.search(r"\bappartement\b", letter, re.IGNORECASE) else "")
+
+        infos = {
+            "name": cls._extraire_nom(letter),
+            "customerId": client_id.group(1).lower() if client_id else None,
+            "description": {
+                "accommodationType": type_logement,
+                "surfaceArea": f"{surface.group(1)}m2" if surface else None,
+                "address": {
+                    "town": ville,
+                    "postalCode": code_postal,
+                    "completeAddress": adresse
+                }
+            },
+            "contact": {
+                "phone": telephone.group(1).strip() if telephone else "",
+                "email": email.group(0) if email else ""
+            },
+            "loanAmount": montant_pret,
+            "monthlyIncome": cls._montant(cls._revenu.search(letter)),
+            "monthlyExpenses": cls._montant(cls._depenses.search(letter)),
+            "propertyPrice": cls._montant(cls._prix.search(letter)),
+        }
+
+        champs = {
+            "name": infos["name"],
+            "customerId": infos["customerId"],
+            "surfaceArea": infos["description"]["surfaceArea"],
+            "town": ville,
+            "completeAddress": adresse,
+            "loanAmount": infos["loanAmount"],
+            "monthlyIncome": infos["monthlyIncome"],
+            "monthlyExpenses": infos["monthlyExpenses"],
+            "propertyPrice": infos["propertyPrice"],
+        }
+        manquants = [champ for champ in REQUIRED_FIELDS if not champs[champ]]
+        confiance = 1 - len(manquants) / len(REQUIRED_FIELDS)
+
+        # Incohérences typiques d'un mauvais appariement des motifs : la confiance est divisée par deux
+        if not manquants and (infos["loanAmount"] > infos["propertyPrice"]
+                              or infos["monthlyExpenses"] > 10 * infos["monthlyIncome"]):
+            confiance /= 2
+        # Plusieurs montants possibles pour le prêt : le modèle tranchera
+        if montant_ambigu:
+            confiance /= 2
+
+        return infos, confiance, manquants
@@ -0,0 +1,256 @@
+"""Identifiant de requête propagé entre le composite et les services, spans et métriques Prometheus.
+
+Le composite attribue un identifiant à chaque requête (ou reprend l'en-tête `X-Request-ID` reçu) et le
+transmet aux services dans le même en-tête HTTP. Chaque étape mesurée avec `span()` alimente
+l'histogramme `pipeline_stage_seconds{service, stage}` du processus, exposé au format texte de
+Prometheus par `metrics_app` (chemin `/metrics`). Avec plusieurs workers gunicorn, chaque worker
+expose ses propres compteurs.
+"""
+import time
+import uuid
+import logging
+import weakref
+import threading
+import contextvars
+from contextlib import contextmanager
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_ENVIRON_KEY = 'HTTP_X_REQUEST_ID'
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger(__name__)
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_spans = contextvars.ContextVar('spans', default=None)
+_current_service = contextvars.ContextVar('service', default=None)
+_service = 'inconnu'
+
+
+class Histogram:
+    """Histogramme Prometheus (cumulatif) avec étiquettes, sûr entre threads."""
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # valeurs des étiquettes -> [compteurs par seau, somme, nombre]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        cle = tuple(str(labels.get(nom, '')) for nom in self.labelnames)
+        with self._lock:
+            serie = self._series.get(cle)
+            if serie is None:
+                serie = self._series[cle] = [[0] * len(self.buckets), 0.0, 0]
+            for i, borne in enumerate(self.buckets):
+                if value <= borne:
+                    serie[0][i] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def expose(self):
+        lignes = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((cle, ([*compteurs], somme, nombre)) for cle, (compteurs, somme, nombre)
+                            in self._series.items())
+        for cle, (compteurs, somme, nombre) in series:
+            etiquettes = ','.join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in zip(self.labelnames, cle))
+            for borne, compteur in zip(self.buckets, compteurs):
+                lignes.append(f'{self.name}_bucket{{{etiquettes},le="{borne}"}} {compteur}')
+            lignes.append(f'{self.name}_bucket{{{etiquettes},le="+Inf"}} {nombre}')
+            lignes.append(f'{self.name}_sum{{{etiquettes}}} {somme}')
+            lignes.append(f'{self.name}_count{{{etiquettes}}} {nombre}')
+        return '\n'.join(lignes)
+
+
+def _echapper(valeur):
+    return valeur.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+stage_seconds = Histogram('pipeline_stage_seconds', "Durée des étapes du traitement d'une demande",
+                          ('service', 'stage'))
+METRICS = [stage_seconds]
+
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
+
+
+def configure(service):
+    """Nomme le processus dans les métriques et ajoute l'identifiant de requête aux journaux."""
+    global _service
+    _service = service
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, _RequestIdFilter) for f in handler.filters):
+            handler.addFilter(_RequestIdFilter())
+            handler.setFormatter(logging.Formatter('%(levelname)s [%(request_id)s] %(name)s: %(message)s'))
+
+
+def _service_name(service=None):
+    return service or _current_service.get() or _service
+
+
+def request_id():
+    return _request_id.get()
+
+
+def headers():
+    """En-têtes à ajouter aux appels sortants pour propager l'identifiant de la requête courante."""
+    valeur = _request_id.get()
+    return {REQUEST_ID_HEADER: valeur} if valeur else {}
+
+
+@contextmanager
+def request(request_id=None, service=None):
+    """Contexte d'une requête : identifiant (reçu ou nouveau), span `requete` et résumé des étapes en fin de requête."""
+    jeton_id = _request_id.set(request_id or uuid.uuid4().hex)
+    jeton_spans = _spans.set([])
+    jeton_service = _current_service.set(service or _current_service.get())
+    debut = time.perf_counter()
+    try:
+        yield _request_id.get()
+    finally:
+        duree = time.perf_counter() - debut
+        stage_seconds.observe(duree, service=_service_name(service), stage='requete')
+        etapes = _spans.get()
+        if etapes:
+            logger.info("Requête terminée en %.1f ms : %s", duree * 1000,
+                        ', '.join(f"{nom} {ms:.1f} ms" for nom, ms in etapes))
+        _current_service.reset(jeton_service)
+        _spans.reset(jeton_spans)
+        _request_id.reset(jeton_id)
+
+
+@contextmanager
+def span(stage, service=None):
+    """Mesure une étape de la requête courante."""
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - debut, service)
+
+
+def record(stage, duree, service=None):
+    stage_seconds.observe(duree, service=_service_name(service), stage=stage)
+    etapes = _spans.get()
+    if etapes is not None:
+        etapes.append((stage, duree * 1000))  # list.append est atomique : partagé sans verrou entre threads
+
+
+def run_in_context(fn):
+    """Enveloppe `fn` pour qu'elle s'exécute dans le contexte de la requête courante (pools de threads)."""
+    contexte = contextvars.copy_context()
+    return lambda *args, **kwargs: contexte.run(fn, *args, **kwargs)
+
+
+def expose():
+    return '\n'.join(metric.expose() for metric in METRICS) + '\n'
+
+
+def metrics_app(environ, start_response):
+    """Application WSGI servant les métriques au format texte de Prometheus."""
+    body = expose().encode('utf-8')
+    start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
+
+
+class TracingMiddleware:
+    """Middleware WSGI : ouvre le contexte de requête avec l'identifiant reçu et le renvoie en réponse.
+
+    L'application et la lecture de sa réponse s'exécutent dans un contexte propre à la requête, ce qui
+    couvre aussi les réponses produites au fil de l'eau. Sert `/metrics`, ce qui équipe un service monté
+    à la racine sans routage supplémentaire.
+    """
+
+    def __init__(self, app, service=None):
+        self.app = app
+        self.service = service
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') == '/metrics':
+            return metrics_app(environ, start_response)
+        identifiant = environ.get(_ENVIRON_KEY) or uuid.uuid4().hex
+        contexte = contextvars.copy_context()
+        gestionnaire = request(identifiant, self.service)
+        contexte.run(gestionnaire.__enter__)
+
+        def start_response_trace(status, response_headers, exc_info=None):
+            return start_response(status, list(response_headers) + [(REQUEST_ID_HEADER, identifiant)], exc_info)
+
+        try:
+            reponse = contexte.run(self.app, environ, start_response_trace)
+        except BaseException:
+            contexte.run(gestionnaire.__exit__, None, None, None)
+            raise
+        return _TracedResponse(reponse, contexte, gestionnaire)
+
+
+class _TracedResponse:
+    def __init__(self, reponse, contexte, gestionnaire):
+        self.reponse = reponse
+        self.contexte = contexte
+        self.gestionnaire = gestionnaire
+
+    def __iter__(self):
+        iterateur = iter(self.reponse)
+        while True:
+            try:
+                morceau = self.contexte.run(next, iterateur)
+            except StopIteration:
+                return
+            yield morceau
+
+    def close(self):
+        try:
+            if hasattr(self.reponse, 'close'):
+                self.contexte.run(self.reponse.close)
+        finally:
+            self.contexte.run(self.gestionnaire.__exit__, None, None, None)
+
+
+def instrument_spyne(application, service=None):
+    """Mesure, pour une application Spyne, l'analyse et la validation de la requête, le traitement et la sérialisation.
+
+    Le contexte de méthode de Spyne refuse les attributs supplémentaires : les instants de passage sont
+    conservés à part, le temps de vie du contexte.
+    """
+    instants = weakref.WeakKeyDictionary()
+    verrou = threading.Lock()
+
+    def marquer(ctx, etape_precedente, etape):
+        maintenant = time.perf_counter()
+        with verrou:
+            marques = instants.setdefault(ctx, {})
+            debut = marques.get(etape_precedente)
+            marques[etape] = maintenant
+        return None if debut is None else maintenant - debut
+
+    def contexte_cree(ctx):
+        marquer(ctx, None, 'creation')
+
+    def appel(ctx):
+        duree = marquer(ctx, 'creation', 'appel')
+        if duree is not None:
+            record('spyne_analyse_validation', duree, service)
+
+    def retour_objet(ctx):
+        duree = marquer(ctx, 'appel', 'retour')
+        if duree is not None:
+            record('logique_metier', duree, service)
+
+    def retour_texte(ctx):
+        duree = marquer(ctx, 'retour', 'serialise')
+        if duree is not None:
+            record('spyne_serialisation', duree, service)
+
+    application.event_manager.add_listener('method_context_created', contexte_cree)
+    application.event_manager.add_listener('method_call', appel)
+    application.event_manager.add_listener('method_return_object', retour_objet)
+    application.event_manager.add_listener('method_return_string', retour_texte)
+    return application
@@ -1,10 +1,14 @@
-from spyne.util.wsgi_wrapper import run_twisted
 from spyne.server.wsgi import WsgiApplication
 from spyne.protocol.soap import Soap11
-from spyne import Application, rpc, ServiceBase, Unicode, Iterable
+from spyne import Application, rpc, ServiceBase, Unicode, Integer, Iterable, Array
+import os
 import sys
+import json
 import logging
 from utils import database
+from utils.cache import ReadThroughCache, SharedInvalidations
+from utils import tracing
+from utils.json_transport import JsonApplication
 
 # Configuration du niveau de journalisation
 logging.basicConfig(level=logging.DEBUG)
@@ -12,10 +16,12 @@ logging.basicConfig(level=logging.DEBUG)
 class ClientSolvency:
     """Classe représentant l'évaluation de la solvabilité d'un client."""
 
-    def __init__(self, client_id):
+    def __init__(self, client_id, record=None):
         self.client_id = client_id
-        self.credit_data = database.CreditBureauDatabase.get_client_credit_data(client_id)
-        self.revenu_mensuel, self.depense_mensuel = database.clientFinancialDatabase.get_client_financial_data(client_id)
+        # Une seule lecture combinée (crédit + finances) ; `record` évite la lecture lors d'un traitement par lot
+        record = record or database.default_store().get(client_id)
+        self.credit_data = record.credit_data
+        self.revenu_mensuel, self.depense_mensuel = record.revenu_mensuel, record.depense_mensuel
 
     def calculate_score(self):
         """Calcule le score de solvabilité basé sur les données de crédit du client."""
@@ -40,14 +46,69 @@ class ClientSolvency:
             'score': self.calculate_score()
         }
 
+def calculer_solvabilite(clientId):
+    client_solvency = ClientSolvency(clientId)
+    return client_solvency.get_solvency_info()
+
+
+def calculer_solvabilite_lot(clientIds):
+    records = database.default_store().get_many(clientIds)
+    return {client_id: ClientSolvency(client_id, record).get_solvency_info() for client_id, record in records.items()}
+
+
+# Les données du bureau de crédit changent au plus une fois par jour : les résultats sont mis en cache.
+# Chaque worker a son cache ; les invalidations passent par une table SQLite commune aux workers de l'hôte
+solvency_cache = ReadThroughCache(
+    calculer_solvabilite,
+    max_entries=int(os.getenv('SOLVENCY_CACHE_SIZE', '100000')),
+    ttl=int(os.getenv('SOLVENCY_CACHE_TTL', '3600')),
+    invalidations=SharedInvalidations(os.getenv('SOLVENCY_INVALIDATIONS_DB', 'solvency_invalidations.sqlite3'),
+                                      poll_interval=float(os.getenv('SOLVENCY_INVALIDATIONS_POLL', '0.1')))
+)
+
+
+def evaluer_solvabilite(clientId):
+    """Étudie la solvabilité d'un client et retourne les informations calculées."""
+    return solvency_cache.get(clientId)
+
+
+def evaluer_solvabilite_lot(clientIds):
+    """Solvabilité d'un lot de clients ; les absents du cache sont lus en une seule requête groupée."""
+    return solvency_cache.get_many(clientIds, calculer_solvabilite_lot)
+
+
+def invalider_solvabilite(clientIds=None):
+    """Invalide le cache pour les clients dont les données ont changé (tous si aucun n'est précisé).
+
+    L'invalidation est publiée aux autres workers, qui l'appliquent avant leur prochaine lecture.
+    """
+    if not clientIds:
+        solvency_cache.invalidate_all()
+        return 0
+    return solvency_cache.invalidate(clientIds)
+
+
 class SolvabiliteService(ServiceBase):
     @rpc(Unicode, _returns=Iterable(Unicode))
     def etudier_solvabilite(ctx, clientId):
         """Étudie la solvabilité d'un client et retourne les informations calculées."""
-        client_solvency = ClientSolvency(clientId)
-        solvency_info = client_solvency.get_solvency_info()
+        solvency_info = evaluer_solvabilite(clientId)
         yield f'{solvency_info}'
 
+    @rpc(Array(Unicode), _returns=Unicode)
+    def etudier_solvabilite_lot(ctx, clientIds):
+        """Étudie la solvabilité d'un lot de clients ; retourne un objet JSON indexé par identifiant."""
+        return json.dumps(evaluer_solvabilite_lot(clientIds or []))
+
+    @rpc(Array(Unicode), _returns=Integer)
+    def invalider_solvabilite(ctx, clientIds):
+        """Invalide le cache de solvabilité après une mise à jour des données du bureau de crédit."""
+        return invalider_solvabilite(clientIds)
+
+    @rpc(_returns=Unicode)
+    def statistiques_solvabilite(ctx):
+        return json.dumps(solvency_cache.stats())
+
 # Configuration de l'application Spyne
 application = Application(
     [SolvabiliteService],
@@ -55,11 +116,27 @@ application = Application(
     in_protocol=Soap11(validator='lxml'),
     out_protocol=Soap11()
 )
+# Durées d'analyse, de traitement et de sérialisation des appels, exposées sur /metrics
+tracing.instrument_spyne(application, 'solvabilite')
+# Application WSGI construite une seule fois, partagée par serve.py et le lancement direct
+wsgi_application = WsgiApplication(application)
+
+# Transport JSON : mêmes traitements, résultats structurés
+json_application = JsonApplication({
+    'etudier_solvabilite': evaluer_solvabilite,
+    'etudier_solvabilite_lot': evaluer_solvabilite_lot,
+    'invalider_solvabilite': invalider_solvabilite,
+    'statistiques_solvabilite': solvency_cache.stats,
+})
 
 if __name__ == '__main__':
     # Création et démarrage de l'application WSGI
-    wsgi_app = WsgiApplication(application)
-    twisted_apps = [(wsgi_app, b'solvabiliteService')]
+    tracing.configure('solvabilite')
+    wsgi_app = tracing.TracingMiddleware(wsgi_application, 'solvabilite')
+    twisted_apps = [(wsgi_app, b'solvabiliteService'),
+                    (tracing.TracingMiddleware(json_application, 'solvabilite'), b'solvabiliteServiceJson'),
+                    (tracing.metrics_app, b'metrics')]
 
     # Démarrage du serveur sur le port 8003
+    from spyne.util.wsgi_wrapper import run_twisted
     sys.exit(run_twisted(twisted_apps, 8003))
@@ -0,0 +1,318 @@
+"""Client HTTP mutualisé pour les appels SOAP du composite.
+
+Chaque service dispose de sa propre session `requests` avec un pool de
+connexions keep-alive, des délais de connexion et de lecture distincts et
+une reprise avec backoff sur les erreurs de connexion. Les services qui
+l'exposent peuvent aussi être appelés en JSON (même session, même pool).
+
+Un disjoncteur par service refuse immédiatement les appels (CircuitOpen)
+tant que le service échoue ou répond trop lentement, au lieu d'attendre
+le délai de lecture à chaque requête. Seules les pannes du service comptent :
+une demande refusée (4xx, faute SOAP Client.*) ou un service saturé qui le
+signale (503, faute SOAP Server.Overloaded) ne sont pas des échecs.
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+SOAP_HEADERS = {'content-type': 'application/soap+xml; charset=utf-8'}
+JSON_HEADERS = {'content-type': 'application/json; charset=utf-8'}
+SOAP_FAUTE_SATURATION = b'Server.Overloaded'
+# Faute SOAP imputable à la demande (faultcode Client.*), répondue en 500 comme toutes les fautes SOAP 1.1
+SOAP_FAUTE_CLIENT = re.compile(rb'<(?:[\w.-]+:)?faultcode>\s*(?:[\w.-]+:)?Client\b')
+
+
+class TransportNotSupported(Exception):
+    """Le service n'expose pas le transport demandé."""
+
+
+class CircuitOpen(Exception):
+    """Le circuit du service est ouvert : l'appel est refusé sans contacter le service."""
+
+    def __init__(self, nom, retry_after):
+        super().__init__(f"Service {nom} momentanément indisponible, nouvel essai dans {retry_after:.0f} s")
+        self.nom = nom
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Disjoncteur d'un service : fermé, ouvert (appels refusés) puis semi-ouvert (appels d'essai).
+
+    Le circuit s'ouvre quand la part d'échecs (erreurs et appels plus lents que `slow_call` secondes)
+    parmi les `window` derniers appels atteint `failure_rate`, à partir de `min_calls` appels. Après
+    `reset_timeout` secondes, `half_open_calls` appels d'essai passent : un succès referme le circuit,
+    un échec le rouvre pour `reset_timeout` secondes.
+    """
+
+    CLOSED = 'ferme'
+    OPEN = 'ouvert'
+    HALF_OPEN = 'semi-ouvert'
+
+    def __init__(self, name, window=20, failure_rate=0.5, min_calls=5, reset_timeout=30.0, half_open_calls=1,
+                 slow_call=None):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.slow_call = slow_call
+        self.state = self.CLOSED
+        self._resultats = deque(maxlen=window)
+        self._ouvert_depuis = 0.0
+        self._essais = 0
+        self._lock = threading.Lock()
+        self._compteurs = {'refuses': 0, 'ouvertures': 0}
+
+    def allow(self):
+        """Indique si un appel peut être tenté ; chaque appel autorisé doit être suivi de `record()`."""
+        with self._lock:
+            maintenant = time.monotonic()
+            if self.state == self.OPEN:
+                if maintenant - self._ouvert_depuis < self.reset_timeout:
+                    self._compteurs['refuses'] += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._ouvert_depuis = maintenant
+                self._essais = 0
+            if self.state == self.HALF_OPEN:
+                # Un essai resté sans réponse au-delà de reset_timeout ne bloque pas le circuit indéfiniment
+                if self._essais >= self.half_open_calls and maintenant - self._ouvert_depuis < self.reset_timeout:
+                    self._compteurs['refuses'] += 1
+                    return False
+                if self._essais >= self.half_open_calls:
+                    self._ouvert_depuis = maintenant
+                    self._essais = 0
+                self._essais += 1
+            return True
+
+    def record(self, succes, duree=None):
+        """Enregistre l'issue d'un appel autorisé ; un appel trop lent compte comme un échec."""
+        if succes and self.slow_call is not None and duree is not None and duree > self.slow_call:
+            succes = False
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if succes:
+                    self.state = self.CLOSED
+                    self._resultats.clear()
+                    logger.info(f"Circuit du service {self.name} refermé après un appel d'essai réussi")
+                else:
+                    self._ouvrir()
+                return
+            if self.state == self.OPEN:
+                return
+            self._resultats.append(succes)
+            echecs = self._resultats.count(False)
+            if len(self._resultats) >= self.min_calls and echecs / len(self._resultats) >= self.failure_rate:
+                self._ouvrir()
+
+    def _ouvrir(self):
+        logger.warning(f"Circuit du service {self.name} ouvert pour {self.reset_timeout:.0f} s")
+        self.state = self.OPEN
+        self._ouvert_depuis = time.monotonic()
+        self._resultats.clear()
+        self._compteurs['ouvertures'] += 1
+
+    def retry_after(self):
+        """Secondes avant le prochain appel d'essai (0 si le circuit n'est pas ouvert)."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._ouvert_depuis))
+
+    def is_open(self):
+        return self.retry_after() > 0
+
+    def stats(self):
+        with self._lock:
+            return dict(self._compteurs, state=self.state, window_calls=len(self._resultats),
+                        window_failures=self._resultats.count(False))
+
+
+class ServiceConfig:
+    """Paramètres de connexion d'un service distant."""
+
+    def __init__(self, url, pool_size=10, connect_timeout=2.0, read_timeout=10.0, retries=3, backoff_factor=0.2,
+                 json_url=None, breaker_window=20, breaker_failure_rate=0.5, breaker_min_calls=5,
+                 breaker_reset_timeout=30.0, breaker_slow_call=None):
+        self.url = url
+        self.json_url = json_url or f"{url}Json"
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.breaker_window = breaker_window
+        self.breaker_failure_rate = breaker_failure_rate
+        self.breaker_min_calls = breaker_min_calls
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self.breaker_slow_call = breaker_slow_call
+
+    @classmethod
+    def from_env(cls, nom, url, slow_call=None):
+        """Construit la configuration à partir des variables SOAP_* (surcharge possible par service).
+
+        Le seuil d'appel lent dépend de la durée normale d'un appel : il est propre à chaque service
+        (`slow_call`, surchargé par SOAP_BREAKER_SLOW_CALL_<SERVICE>, 0 pour le désactiver).
+        """
+        def lire(cle, defaut, conversion):
+            valeur = os.getenv(f'{cle}_{nom.upper()}') or os.getenv(cle)
+            return conversion(valeur) if valeur else defaut
+
+        seuil_lent = os.getenv(f'SOAP_BREAKER_SLOW_CALL_{nom.upper()}')
+        if seuil_lent:
+            slow_call = float(seuil_lent) or None
+
+        return cls(
+            url,
+            pool_size=lire('SOAP_POOL_SIZE', 10, int),
+            connect_timeout=lire('SOAP_CONNECT_TIMEOUT', 2.0, float),
+            read_timeout=lire('SOAP_READ_TIMEOUT', 10.0, float),
+            retries=lire('SOAP_RETRIES', 3, int),
+            backoff_factor=lire('SOAP_BACKOFF', 0.2, float),
+            breaker_window=lire('SOAP_BREAKER_WINDOW', 20, int),
+            breaker_failure_rate=lire('SOAP_BREAKER_FAILURE_RATE', 0.5, float),
+            breaker_min_calls=lire('SOAP_BREAKER_MIN_CALLS', 5, int),
+            breaker_reset_timeout=lire('SOAP_BREAKER_RESET_TIMEOUT', 30.0, float),
+            breaker_slow_call=slow_call,
+        )
+
+    def build_breaker(self, nom):
+        return CircuitBreaker(nom, window=self.breaker_window, failure_rate=self.breaker_failure_rate,
+                              min_calls=self.breaker_min_calls, reset_timeout=self.breaker_reset_timeout,
+                              slow_call=self.breaker_slow_call)
+
+
+class SoapClient:
+    """Client partagé : une session keep-alive, un pool de connexions et un disjoncteur par service."""
+
+    def __init__(self, services):
+        self.services = services
+        self._sessions = {}
+        self.breakers = {}
+        self._lock = threading.Lock()
+        for nom, config in services.items():
+            self._sessions[nom] = self._build_session(config)
+            self.breakers[nom] = config.build_breaker(nom)
+
+    @staticmethod
+    def _build_session(config):
+        # Seules les erreurs de connexion sont rejouées : un POST déjà reçu par le service n'est pas renvoyé
+        retry = Retry(total=config.retries, connect=config.retries, read=0, status=0, other=0,
+                      backoff_factor=config.backoff_factor, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _autoriser(self, nom):
+        breaker = self.breakers[nom]
+        if not breaker.allow():
+            raise CircuitOpen(nom, breaker.retry_after())
+        return breaker
+
+    @staticmethod
+    def _echec_service(response):
+        """Vrai si la réponse d'erreur traduit une panne du service (5xx hors saturation et fautes client)."""
+        if response is None:
+            return True
+        if response.status_code < 500 or response.status_code == 503:
+            return False
+        contenu = response.content
+        return SOAP_FAUTE_SATURATION not in contenu and not SOAP_FAUTE_CLIENT.search(contenu)
+
+    def post(self, nom, demande, headers=None):
+        """Envoie une requête au service `nom` et retourne le corps (bytes) de la réponse, ou None en cas d'erreur.
+
+        `headers` complète les en-têtes SOAP (propagation de l'identifiant de requête par exemple).
+        Lève CircuitOpen, sans contacter le service, si son circuit est ouvert.
+        """
+        config = self.services[nom]
+        breaker = self._autoriser(nom)
+        debut = time.monotonic()
+        try:
+            response = self._sessions[nom].post(config.url, data=demande,
+                                                headers=dict(SOAP_HEADERS, **(headers or {})),
+                                                timeout=(config.connect_timeout, config.read_timeout))
+            response.raise_for_status()
+            breaker.record(True, time.monotonic() - debut)
+            # Octets bruts : l'analyseur XML décode selon l'encodage déclaré, sans copie intermédiaire
+            return response.content
+        except requests.HTTPError as e:
+            breaker.record(not self._echec_service(e.response))
+            logger.error(f"Erreur lors de la requête au service {config.url}: {e}")
+            return None
+        except requests.RequestException as e:
+            breaker.record(False)
+            logger.error(f"Erreur lors de la requête au service {config.url}: {e}")
+            return None
+
+    def post_json(self, nom, method, params, headers=None):
+        """Appelle `method` en JSON et retourne le résultat structuré, ou None en cas d'erreur.
+
+        Lève TransportNotSupported si le service n'expose pas de point d'accès JSON, CircuitOpen si son
+        circuit est ouvert.
+        """
+        config = self.services[nom]
+        breaker = self._autoriser(nom)
+        debut = time.monotonic()
+        try:
+            response = self._sessions[nom].post(config.json_url, headers=dict(JSON_HEADERS, **(headers or {})),
+                                                data=json.dumps({'method': method, 'params': params}),
+                                                timeout=(config.connect_timeout, config.read_timeout))
+            if response.status_code in (404, 405) and 'application/json' not in response.headers.get('content-type', ''):
+                breaker.record(True)
+                raise TransportNotSupported(nom)
+            response.raise_for_status()
+            resultat = response.json()['result']
+            breaker.record(True, time.monotonic() - debut)
+            return resultat
+        except requests.HTTPError as e:
+            # Un 4xx vise la demande et un 503 signale une file pleine : seules les pannes comptent
+            breaker.record(not self._echec_service(e.response))
+            logger.error(f"Erreur lors de la requête JSON au service {config.json_url}: {e}")
+            return None
+        except (requests.RequestException, ValueError, KeyError) as e:
+            breaker.record(False)
+            logger.error(f"Erreur lors de la requête JSON au service {config.json_url}: {e}")
+            return None
+
+    def unavailable(self, noms=None):
+        """Services (parmi `noms`) dont le circuit est ouvert : {nom: secondes avant le prochain essai}."""
+        return {nom: breaker.retry_after() for nom, breaker in self.breakers.items()
+                if (noms is None or nom in noms) and breaker.is_open()}
+
+    def circuit_stats(self):
+        return {nom: breaker.stats() for nom, breaker in self.breakers.items()}
+
+    def pool_stats(self):
+        """Compteurs de réutilisation des connexions par service (hits = connexion réutilisée)."""
+        stats = {}
+        with self._lock:
+            for nom, session in self._sessions.items():
+                requetes = connexions = 0
+                pools = session.get_adapter(self.services[nom].url).poolmanager.pools
+                for cle in pools.keys():
+                    pool = pools[cle]
+                    requetes += pool.num_requests
+                    connexions += pool.num_connections
+                stats[nom] = {
+                    'requests': requetes,
+                    'hits': max(requetes - connexions, 0),
+                    'misses': connexions,
+                    'pool_size': self.services[nom].pool_size,
+                }
+        return stats
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
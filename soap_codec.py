@@ -0,0 +1,91 @@
+"""Encodage des requêtes SOAP du composite et lecture incrémentale des réponses.
+
+Les enveloppes sont construites à partir de modèles précompilés (un par méthode
+et par liste de paramètres) ; les valeurs sont échappées pour XML et les
+caractères de contrôle interdits par XML 1.0 (saut de page de pdftotext par
+exemple) sont remplacés par des espaces. Les réponses sont lues au fil de l'eau : la lecture
+s'arrête au premier élément `tns:string`, sans construire l'arbre complet.
+"""
+import logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+SOAP_ENV_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+DEFAULT_TNS = 'spyne.examples.hello'
+
+# Caractères de contrôle interdits dans un document XML 1.0 (tabulation et fins de ligne exceptées) ;
+# chercher chacun avec `in` est bien plus rapide qu'une expression régulière sur un long texte
+_CARACTERES_INTERDITS = tuple(chr(c) for c in (*range(0x09), 0x0b, 0x0c, *range(0x0e, 0x20), 0xfffe, 0xffff))
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def escape_text(valeur):
+    """Texte d'un élément XML : échappement de `&`, `<`, `>` et retrait des caractères interdits."""
+    if valeur is True or valeur is False:
+        return 'true' if valeur else 'false'
+    texte = valeur if isinstance(valeur, str) else str(valeur)
+    for caractere in _CARACTERES_INTERDITS:
+        if caractere in texte:
+            texte = texte.replace(caractere, ' ')
+    return texte.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+class EnvelopeTemplate:
+    """Enveloppe SOAP d'une méthode, découpée une fois pour toutes autour des valeurs des paramètres."""
+
+    def __init__(self, method, fields, tns=DEFAULT_TNS):
+        self.method = method
+        self.fields = tuple(fields)
+        self._debut = (f'<soapenv:Envelope xmlns:soapenv="{SOAP_ENV_NS}" xmlns:spy="{tns}">'
+                       f'<soapenv:Header/><soapenv:Body><spy:{method}>')
+        self._fin = f'</spy:{method}></soapenv:Body></soapenv:Envelope>'
+        self._balises = [(nom, f'<spy:{nom}>', f'</spy:{nom}>') for nom in self.fields]
+
+    def render(self, params):
+        """Enveloppe avec les valeurs de `params` ; un paramètre absent ou None est omis."""
+        morceaux = [self._debut]
+        for nom, ouverture, fermeture in self._balises:
+            valeur = params.get(nom)
+            if valeur is not None:
+                morceaux += (ouverture, escape_text(valeur), fermeture)
+        morceaux.append(self._fin)
+        return ''.join(morceaux)
+
+
+_templates = {}
+
+
+def build_envelope(method, params, tns=DEFAULT_TNS):
+    """Enveloppe SOAP d'un appel à `method`, paramètres dans l'ordre de `params` (modèle mis en cache)."""
+    cle = (method, tuple(params), tns)
+    template = _templates.get(cle)
+    if template is None:
+        template = _templates.setdefault(cle, EnvelopeTemplate(method, cle[1], tns))
+    return template.render(params)
+
+
+def read_result(data, tns=DEFAULT_TNS, tag='string'):
+    """Texte du premier élément `tns:string` de la réponse, ou None (faute SOAP, réponse vide ou illisible).
+
+    La réponse (str ou bytes) est analysée par morceaux et la lecture s'arrête dès l'élément trouvé.
+    """
+    cible = f'{{{tns}}}{tag}'
+    faute = f'{{{SOAP_ENV_NS}}}Fault'
+    parser = ET.XMLPullParser(events=('end',))
+    try:
+        for debut in range(0, len(data), READ_CHUNK_SIZE):
+            parser.feed(data[debut:debut + READ_CHUNK_SIZE])
+            for _, element in parser.read_events():
+                if element.tag == cible:
+                    return element.text or ''
+                if element.tag == faute:
+                    logger.warning(f"Faute SOAP reçue: {element.findtext('faultstring')}")
+                    return None
+        parser.close()
+    except ET.ParseError as e:
+        logger.error(f"Erreur lors de l'analyse XML: {e}")
+        return None
+    logger.warning("Élément de réponse non trouvé dans le XML")
+    return None
@@ -0,0 +1,103 @@
+"""Cache du texte extrait et nettoyé, indexé par l'empreinte SHA-256 du fichier.
+
+Un dépôt identique (même contenu binaire) réutilise le texte déjà extrait
+sans repasser par l'analyse du document. Le tier mémoire est borné par un
+budget en octets (éviction LRU) ; un tier disque optionnel conserve le texte
+entre deux redémarrages.
+"""
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(file_path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for bloc in iter(lambda: f.read(chunk_size), b''):
+            digest.update(bloc)
+    return digest.hexdigest()
+
+
+class TextCache:
+    def __init__(self, memory_budget_bytes, disk_dir=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # empreinte -> (texte, taille en octets)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, digest):
+        return os.path.join(self.disk_dir, f"{digest}.txt")
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry[0]
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(digest), 'r', encoding='utf-8') as f:
+                    text = f.read()
+            except OSError:
+                text = None
+            if text is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._put_memory(digest, text)
+                return text
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, digest, text):
+        self._put_memory(digest, text)
+        if self.disk_dir:
+            path = self._disk_path(digest)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Écriture du cache de texte impossible: {e}")
+
+    def _put_memory(self, digest, text):
+        taille = len(text.encode('utf-8'))
+        if taille > self.memory_budget_bytes:
+            return
+        with self._lock:
+            ancien = self._entries.pop(digest, None)
+            if ancien is not None:
+                self._size -= ancien[1]
+            self._entries[digest] = (text, taille)
+            self._size += taille
+            while self._size > self.memory_budget_bytes:
+                _, (_, taille_evincee) = self._entries.popitem(last=False)
+                self._size -= taille_evincee
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            requetes = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'budget_bytes': self.memory_budget_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.disk_hits) / requetes, 4) if requetes else 0.0,
+                'evictions': self.evictions,
+            }